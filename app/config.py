@@ -15,10 +15,23 @@ class Settings(BaseSettings):
     # API Configuration
     GROQ_API_KEY: str = "test_groq_key"
     SECRET_KEY: str = "test_secret_key"
+    GROQ_BASE_URL: Optional[str] = None  # defaults to the public Groq API
+
+    # Groq HTTP Client
+    GROQ_MAX_CONNECTIONS: int = 20
+    GROQ_MAX_KEEPALIVE: int = 10
+    GROQ_KEEPALIVE_EXPIRY: float = 30.0  # seconds
+    GROQ_CONNECT_TIMEOUT: float = 5.0  # seconds
+    GROQ_READ_TIMEOUT: float = 60.0  # seconds
+    GROQ_MIN_CONCURRENCY: int = 1  # adaptive in-flight completion limit per worker
+    GROQ_INITIAL_CONCURRENCY: int = 8
+    GROQ_MAX_CONCURRENCY: int = 20
+    GROQ_LATENCY_TOLERANCE: float = 3.0  # back off above this multiple of the minimum latency
+    GROQ_BACKOFF_RATIO: float = 0.5
     
     # Model Configuration
     PRIMARY_MODEL: str = "mixtral-8x7b-32768"
-    FALLBACK_MODEL: str = "whisper-turbo"
+    FALLBACK_MODEL: str = "llama-3.1-8b-instant"
     USE_FALLBACK: bool = True
     
     # API Limits
@@ -30,10 +43,57 @@ class Settings(BaseSettings):
     GROQ_CALL_INTERVAL: int = 60  # seconds
     WEBSOCKET_MESSAGE_LIMIT: int = 100
     WEBSOCKET_MESSAGE_INTERVAL: int = 60  # seconds
+    CURSOR_MESSAGE_LIMIT: int = 1200
+    CURSOR_MESSAGE_INTERVAL: int = 60  # seconds
+    RATE_LIMIT_MAX_KEYS: int = 100000  # tracked clients per limit
+    RATE_LIMIT_STORE: str = "memory"  # "memory" (per worker) or "sqlite" (shared)
+    RATE_LIMIT_SQLITE_PATH: str = "data/rate_limits.db"
     
     # Model Parameters
     MAX_TOKENS: int = 2048
     TEMPERATURE: float = 0.7
+    STREAM_SUGGESTIONS: bool = True
+    STREAM_FLUSH_INTERVAL_MS: int = 50  # min gap between partial suggestion frames
+
+    # Suggestion Cache
+    SUGGESTION_CACHE_SIZE: int = 2048  # entries kept in memory
+    SUGGESTION_CACHE_TTL: int = 86400  # seconds
+    SUGGESTION_CACHE_PATH: Optional[str] = None  # e.g. data/suggestion_cache.db
+
+    # Redline Diffs
+    DIFF_CACHE_SIZE: int = 1024  # (original, new) pairs
+
+    # Paragraph Locks
+    PARAGRAPH_LEASE_TTL: float = 30.0  # seconds without a heartbeat before a lock is released
+    MERGE_WINDOW: int = 256  # revisions an edit's base version may lag and still be merged
+
+    # Change Appendix
+    APPENDIX_CHUNK_CHARS: int = 16384  # size of streamed appendix frames
+
+    # Document Sessions
+    SESSION_MEMORY_BUDGET_MB: int = 64  # per worker, least recently used documents evicted
+    SESSION_IDLE_TTL: int = 3600  # seconds
+
+    # Voice Streaming
+    AUDIO_RING_BUFFER_KB: int = 256  # per stream; the client is slowed down when full
+    AUDIO_CHUNK_MS: int = 100  # audio handed to processing at a time
+    MAX_UTTERANCE_SECONDS: int = 30
+    VOICE_ENDPOINT_SILENCE_MS: int = 800  # pause after speech that ends an utterance; 0 waits for voice_end
+
+    # Transcription
+    TRANSCRIPTION_BACKEND: str = "auto"  # "local" (offline, CPU), "remote" (Groq) or "auto"
+    TRANSCRIPTION_MODEL: str = "base.en"  # local faster-whisper model name or path
+    TRANSCRIPTION_REMOTE_MODEL: str = "whisper-large-v3-turbo"
+    TRANSCRIPTION_LANGUAGE: str = "en"
+    TRANSCRIPTION_WORKERS: int = 2  # utterances decoded at once
+    TRANSCRIPTION_CPU_THREADS: int = 2  # per worker
+    TRANSCRIPTION_MAX_PENDING: int = 16  # further utterances are refused
+
+    # Suggestion Batching (whole-document review)
+    SUGGESTION_BATCH_SIZE: int = 20  # paragraphs per upstream call
+    SUGGESTION_BATCH_WAIT_MS: int = 20  # milliseconds
+    SUGGESTION_BATCH_MAX_CHARS: int = 24000  # prompt budget, well inside the model context
+    SUGGESTION_BATCH_MAX_TOKENS: int = 8192
     
     # Document Settings
     MAX_DOCUMENT_SIZE: int = 10  # MB
@@ -42,6 +102,20 @@ class Settings(BaseSettings):
     # Retry Configuration
     RETRY_ATTEMPTS: int = 3
     RETRY_DELAY: int = 1  # seconds
+    RETRY_MAX_DELAY: float = 8.0  # seconds, cap for exponential backoff
+    UPSTREAM_DEADLINE: float = 30.0  # seconds, across all retries and failover
+    CIRCUIT_BREAKER_THRESHOLD: int = 5  # consecutive failures before a model is skipped
+    CIRCUIT_BREAKER_COOLDOWN: float = 30.0  # seconds before a skipped model is probed
+
+    # WebSocket Broadcast
+    BROADCAST_QUEUE_SIZE: int = 64  # messages buffered per socket
+    BROADCAST_SEND_TIMEOUT: float = 5.0  # seconds
+    CURSOR_FLUSH_INTERVAL_MS: int = 50  # milliseconds
+
+    # Cross-worker Backplane
+    BACKPLANE: str = "memory"  # "memory" (single worker) or "unix"
+    BACKPLANE_SOCKET_PATH: str = "/tmp/voice_redline_backplane.sock"
+    BACKPLANE_MAX_FRAME_SIZE: int = 16 * 1024 * 1024  # bytes
 
     model_config = ConfigDict(
         env_prefix="APP_",
@@ -3,10 +3,17 @@ from fastapi import FastAPI, WebSocket, UploadFile, File, HTTPException, Depends
 from fastapi.middleware.cors import CORSMiddleware
 from typing import Dict, Any, List, Optional
 import asyncio
+import base64
+import json
 from datetime import datetime
 
 from app.services.ai_processor import AIProcessor
 from app.services.document_editor import DocumentEditor
+from app.services.connection_manager import ConnectionManager
+from app.services.cursor_coalescer import CursorCoalescer
+from app.services.audio_stream import VoiceStreams
+from app.services.command_handler import CommandHandler
+from app.services.transcription import TranscriptionService, create_backend
 from app.middleware.rate_limit import RateLimiter
 from tests.constants.test_messages import MessageType
 from tests.constants.message_loader import MessageLoader
@@ -23,6 +30,8 @@ ai_processor = AIProcessor()
 document_editor = DocumentEditor()
 rate_limiter = RateLimiter()
 message_loader = MessageLoader()
+# The remote transcription backend shares the pooled Groq client
+command_handler = CommandHandler(TranscriptionService(create_backend(client=ai_processor.client)))
 
 # Add rate limiting middleware
 @app.middleware("http")
@@ -40,43 +49,34 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# WebSocket connection manager with enhanced error handling
-class ConnectionManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
-        self.document_sessions: Dict[str, List[WebSocket]] = {}
-        self.user_cursors: Dict[str, Dict[str, int]] = {}  # track cursor positions
-
-    async def connect(self, websocket: WebSocket, document_id: str, user_id: str):
-        await websocket.accept()
-        self.active_connections.append(websocket)
-        if document_id not in self.document_sessions:
-            self.document_sessions[document_id] = []
-        self.document_sessions[document_id].append(websocket)
-        self.user_cursors[user_id] = {"document_id": document_id, "position": 0}
-        
-        # Broadcast user joined message
-        await self.broadcast_to_document(
-            document_id,
-            {"type": "user_joined", "user_id": user_id}
-        )
-
-    def disconnect(self, websocket: WebSocket, document_id: Optional[str] = None):
-        self.active_connections.remove(websocket)
-        if document_id and document_id in self.document_sessions:
-            self.document_sessions[document_id].remove(websocket)
-        logger.info(f"WebSocket connection closed for document: {document_id}")
-
-    async def broadcast_to_document(self, document_id: str, message: Dict[str, Any]):
-        """Broadcast to all clients viewing the same document"""
-        if document_id in self.document_sessions:
-            for connection in self.document_sessions[document_id]:
-                try:
-                    await connection.send_json(message)
-                except Exception as e:
-                    logger.error(f"Document broadcast error: {str(e)}")
-
+# WebSocket connection manager
 manager = ConnectionManager()
+cursor_coalescer = CursorCoalescer(manager.broadcast_to_document)
+
+async def recognize_utterance(document_id: str, user_id: str, stream):
+    """Recognize the command spoken in a finished voice stream and tell the room"""
+    # Only the spoken part goes on to recognition
+    speech = stream.speech()
+    if not len(speech):
+        return
+    result = await command_handler.handle_voice_command(speech, stream.format)
+    await manager.broadcast_to_document(document_id, result)
+
+# Streams recognize a command as soon as the speaker pauses, before voice_end
+voice_streams = VoiceStreams(on_end=recognize_utterance)
+
+@app.on_event("startup")
+async def startup():
+    """Join the cross-worker backplane before accepting connections"""
+    await manager.start()
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Flush pending cursor updates, leave the backplane and close upstream pools"""
+    await cursor_coalescer.close()
+    await manager.stop()
+    await ai_processor.close()
+    command_handler.transcriber.close()
 
 @app.get("/")
 async def root():
@@ -102,29 +102,99 @@ async def websocket_endpoint(
     user_id: str
 ):
     """Handle WebSocket connections for real-time collaboration"""
+    lock_waits = set()  # lock requests waiting in line for a paragraph
+    leases: Dict[str, str] = {}  # paragraph_id: token of leases taken on this socket
     try:
         await manager.connect(websocket, document_id, user_id)
-        await rate_limiter.check_websocket_limit(user_id)
         
         while True:
-            data = await websocket.receive_json()
+            message = await websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                break
+
+            # Binary frames carry audio for the user's current voice stream;
+            # feeding waits while its buffer is full, pausing this reader
+            if message.get("bytes") is not None:
+                try:
+                    await voice_streams.feed(document_id, user_id, message["bytes"])
+                except ValueError as e:
+                    manager.send_to_socket(websocket, {
+                        "type": "error",
+                        "error": message_loader.get_message(
+                            MessageType.ERROR_INVALID_AUDIO,
+                            error=str(e)
+                        )
+                    })
+                continue
+
+            data = json.loads(message["text"])
+
+            # Per-frame limits answer with an error frame and keep the socket open.
+            # Replies to one socket go through its outbound queue, like
+            # broadcasts, so a slow client never stalls this receive loop
+            limited = await rate_limiter.check_websocket_message(document_id, user_id, data.get("type"))
+            if limited:
+                manager.send_to_socket(websocket, limited)
+                continue
             
             # Handle different message types
             if data["type"] == "voice_command":
-                await rate_limiter.check_voice_limit(websocket)
-                result = await ai_processor.process_command(data["command"])
+                if "audio" in data:
+                    # A whole recorded command, as base64 WAV
+                    result = await command_handler.handle_voice_command(base64.b64decode(data["audio"]))
+                else:
+                    result = await ai_processor.process_command(data["command"])
+            elif data["type"] == "voice_start":
+                # Raw PCM needs its format announced; WAV streams carry their own
+                voice_streams.start(document_id, user_id, data.get("format"))
+                continue
+            elif data["type"] == "voice_end":
+                stream = await voice_streams.finish(document_id, user_id)
+                # An utterance that ended on a pause has been handled already
+                if stream is not None and not stream.endpointed:
+                    await recognize_utterance(document_id, user_id, stream)
+                continue
+            elif data["type"] == "lock":
+                # Waiting in line runs beside this loop so heartbeats for
+                # leases already held keep flowing
+                wait = asyncio.create_task(lock_paragraph(
+                    websocket, document_id, data["paragraph_id"], user_id,
+                    data.get("timeout", 0), leases
+                ))
+                lock_waits.add(wait)
+                wait.add_done_callback(lock_waits.discard)
+                continue
+            elif data["type"] == "heartbeat":
+                # Lease replies carry the token, so they go to this socket only
+                manager.send_to_socket(websocket, {
+                    "type": "heartbeat",
+                    "paragraph_id": data["paragraph_id"],
+                    "held": document_editor.heartbeat_paragraph(
+                        document_id, data["paragraph_id"], data["token"]
+                    )
+                })
+                continue
+            elif data["type"] == "unlock":
+                leases.pop(data["paragraph_id"], None)
+                manager.send_to_socket(websocket, {
+                    "type": "unlock",
+                    "paragraph_id": data["paragraph_id"],
+                    "released": document_editor.unlock_paragraph(
+                        document_id, data["paragraph_id"], data["token"]
+                    )
+                })
+                continue
             elif data["type"] == "cursor_move":
-                result = await document_editor.update_cursor(
-                    document_id,
-                    user_id,
-                    data["position"]
-                )
+                # Cursor moves are batched and broadcast on the coalescer tick
+                manager.update_cursor(document_id, user_id, data["position"])
+                cursor_coalescer.update(document_id, user_id, data["position"])
+                continue
             elif data["type"] == "suggestion":
-                await rate_limiter.check_groq_limit(websocket)
                 result = await ai_processor.process_suggestion(
                     document_id,
                     data["text"],
-                    data["paragraph_id"]
+                    data["paragraph_id"],
+                    publish=lambda frame: manager.broadcast_to_document(document_id, frame)
                 )
             
             # Broadcast updates to all users
@@ -132,15 +202,33 @@ async def websocket_endpoint(
             
     except Exception as e:
         logger.error(f"WebSocket error: {str(e)}")
-        await websocket.send_json({
+        # Queued behind frames already on their way, then given a moment to
+        # go out before disconnecting discards the queue
+        manager.send_to_socket(websocket, {
             "error": message_loader.get_message(
                 MessageType.ERROR_PROCESSING,
                 error=str(e)
             )
         })
+        await manager.flush_socket(websocket)
     finally:
+        for wait in lock_waits:
+            wait.cancel()
+        # Leases left behind would lock others out until they expire
+        for paragraph_id, token in leases.items():
+            document_editor.unlock_paragraph(document_id, paragraph_id, token)
+        voice_streams.abort(document_id, user_id)
         manager.disconnect(websocket, document_id)
 
+async def lock_paragraph(websocket: WebSocket, document_id: str, paragraph_id: str,
+                         user_id: str, timeout: Optional[float], leases: Dict[str, str]):
+    """Take a paragraph lease for a socket, note it in the socket's leases
+    and send it the lease or the error"""
+    result = await document_editor.lock_paragraph(document_id, paragraph_id, user_id, timeout)
+    if "lease" in result:
+        leases[paragraph_id] = result["lease"]["token"]
+    manager.send_to_socket(websocket, {"type": "lock", "paragraph_id": paragraph_id, **result})
+
 @app.post("/process-command/{document_id}")
 async def process_command(document_id: str, command: Dict[str, Any]) -> Dict[str, Any]:
     """Process manual commands"""
@@ -154,21 +242,68 @@ async def process_command(document_id: str, command: Dict[str, Any]) -> Dict[str
 
 @app.post("/apply-changes/{document_id}")
 async def apply_changes(document_id: str, changes: Dict[str, Any]) -> Dict[str, Any]:
-    """Apply document changes"""
+    """Apply an edit to one paragraph.
+
+    The body names the "paragraph_id" and "user_id" and carries the edit:
+    the "original" text, then the full "new" text or an "op", optionally
+    with the "base_version" it was made on so concurrent edits are merged.
+    Edits refused because of another editor's lease answer 423, edits that
+    cannot be merged 409.
+    """
+    changes = dict(changes)
+    paragraph_id = changes.pop("paragraph_id", None)
+    user_id = changes.pop("user_id", None)
+    if paragraph_id is None or user_id is None:
+        raise HTTPException(status_code=422, detail="paragraph_id and user_id are required")
     try:
-        result = await document_editor.apply_changes(document_id, changes)
-        
-        await manager.broadcast_to_document(document_id, {
-            "type": "document_update",
-            "changes": result
-        })
+        if document_id not in document_editor.documents:
+            await document_editor.init_document(document_id, changes.pop("doc_type", "google_docs"))
+        result = await document_editor.apply_changes(document_id, paragraph_id, changes, user_id)
         
-        logger.info(f"Changes applied and broadcasted for document: {document_id}")
-        return result
+        # A refused edit changed nothing, so the room is not told about it
+        if "error" not in result:
+            await manager.broadcast_to_document(document_id, {
+                "type": "document_update",
+                "paragraph_id": paragraph_id,
+                "changes": result
+            })
+            logger.info(f"Changes applied and broadcasted for document: {document_id}")
     except Exception as e:
         logger.error(f"Change application error: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+    if "error" in result:
+        # 423 while someone else holds the lease, 409 for an edit that cannot
+        # be merged; the detail carries the current text to rebase on
+        if result.get("conflict"):
+            status_code = 409
+        elif "holder" in result:
+            status_code = 423
+        else:
+            status_code = 500
+        raise HTTPException(status_code=status_code, detail=result)
+    return result
+
+@app.post("/suggest-document/{document_id}")
+async def suggest_document(document_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+    """Get suggestions for every paragraph of a document in batched calls"""
+    try:
+        result = await ai_processor.suggest_document(document_id, body.get("paragraphs", {}))
+        logger.info(f"Document suggestions generated for: {document_id}")
+        return result
+    except Exception as e:
+        logger.error(f"Document suggestion error: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/metrics")
+async def get_metrics() -> Dict[str, Any]:
+    """Upstream concurrency, retry and cache counters and transcription latency for this worker"""
+    return {
+        "upstream": ai_processor.metrics(),
+        "transcription": command_handler.transcriber.stats(),
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.get("/status/{document_id}")
 async def get_status(document_id: str) -> Dict[str, Any]:
     """Get system status for specific document"""
@@ -176,7 +311,8 @@ async def get_status(document_id: str) -> Dict[str, Any]:
         return {
             "document_id": document_id,
             "is_listening": ai_processor.is_listening,
-            "active_connections": len(manager.document_sessions.get(document_id, [])),
+            "active_connections": manager.connection_count(document_id),
+            "active_users": manager.user_count(document_id),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
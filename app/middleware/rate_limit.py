@@ -1,92 +1,128 @@
 from fastapi import Request, HTTPException
 from app.config import settings
 import time
-from collections import defaultdict
+from typing import Any, Dict, Optional
+from app.middleware.rate_limit_store import (
+    MemoryRateLimitStore,
+    RateLimitStore,
+    create_rate_limit_store,
+)
 from tests.constants.test_messages import MessageType
 from tests.constants.message_loader import MessageLoader
 import logging
 
 logger = logging.getLogger(__name__)
 
+class SlidingWindowLimiter:
+    """Approximate sliding-window counter for one named bucket.
+
+    Each key keeps only the counts for the current and previous fixed
+    windows; the previous count is weighted by how much of it still
+    overlaps the sliding window. Counters live in a RateLimitStore so
+    they can be shared between worker processes.
+    """
+
+    def __init__(self, limit: int, interval: float, max_keys: Optional[int] = None,
+                 store: Optional[RateLimitStore] = None, bucket: str = "default"):
+        self.limit = limit
+        self.interval = interval
+        self.store = store or MemoryRateLimitStore(max_keys)
+        self.bucket = bucket
+
+    def hit(self, key: str, now: Optional[float] = None) -> bool:
+        """Count one call for key; returns False if it is over the limit"""
+        if now is None:
+            now = time.time()
+        return self.store.hit(self.bucket, key, self.limit, self.interval, now)
+
+    async def hit_async(self, key: str, now: Optional[float] = None) -> bool:
+        """``hit`` without blocking the event loop on a shared store"""
+        if now is None:
+            now = time.time()
+        return await self.store.hit_async(self.bucket, key, self.limit, self.interval, now)
+
+    def __len__(self) -> int:
+        return self.store.key_count(self.bucket)
+
 class RateLimiter:
-    def __init__(self):
-        self.calls = defaultdict(list)
-        self.voice_calls = defaultdict(list)
-        self.groq_calls = defaultdict(list)
-        self.websocket_calls = defaultdict(list)
+    def __init__(self, store: Optional[RateLimitStore] = None):
+        self.store = store or create_rate_limit_store()
+        self.calls = self._bucket("api", settings.API_CALL_LIMIT, settings.API_CALL_INTERVAL)
+        self.voice_calls = self._bucket("voice", settings.VOICE_CALL_LIMIT, settings.VOICE_CALL_INTERVAL)
+        self.groq_calls = self._bucket("groq", settings.GROQ_CALL_LIMIT, settings.GROQ_CALL_INTERVAL)
+        self.websocket_calls = self._bucket(
+            "websocket", settings.WEBSOCKET_MESSAGE_LIMIT, settings.WEBSOCKET_MESSAGE_INTERVAL
+        )
+        self.cursor_calls = self._bucket(
+            "cursor", settings.CURSOR_MESSAGE_LIMIT, settings.CURSOR_MESSAGE_INTERVAL
+        )
         self.message_loader = MessageLoader()
-    
+
+    def _bucket(self, name: str, limit: int, interval: float) -> SlidingWindowLimiter:
+        return SlidingWindowLimiter(limit, interval, store=self.store, bucket=name)
+
     async def check_rate_limit(self, request: Request):
         """Check general API rate limit"""
-        client_ip = request.client.host
-        now = time.time()
-        
-        # Clean old calls
-        self.calls[client_ip] = [
-            call_time for call_time in self.calls[client_ip]
-            if now - call_time < settings.API_CALL_INTERVAL
-        ]
-        
-        if len(self.calls[client_ip]) >= settings.API_CALL_LIMIT:
+        if not await self.calls.hit_async(request.client.host):
             raise HTTPException(
                 status_code=429,
                 detail=self.message_loader.get_message(MessageType.ERROR_RATE_LIMIT)
             )
-        
-        self.calls[client_ip].append(now)
 
     async def check_voice_limit(self, request: Request):
         """Check voice command rate limit"""
-        client_ip = request.client.host
-        now = time.time()
-        
-        # Clean old voice calls
-        self.voice_calls[client_ip] = [
-            call_time for call_time in self.voice_calls[client_ip]
-            if now - call_time < settings.VOICE_CALL_INTERVAL
-        ]
-        
-        if len(self.voice_calls[client_ip]) >= settings.VOICE_CALL_LIMIT:
+        if not await self.voice_calls.hit_async(request.client.host):
             raise HTTPException(
                 status_code=429,
                 detail=self.message_loader.get_message(MessageType.ERROR_VOICE_COOLDOWN)
             )
-        
-        self.voice_calls[client_ip].append(now)
 
     async def check_groq_limit(self, request: Request):
         """Check Groq API rate limit"""
-        client_ip = request.client.host
-        now = time.time()
-        
-        # Clean old Groq API calls
-        self.groq_calls[client_ip] = [
-            call_time for call_time in self.groq_calls[client_ip]
-            if now - call_time < settings.GROQ_CALL_INTERVAL
-        ]
-        
-        if len(self.groq_calls[client_ip]) >= settings.GROQ_CALL_LIMIT:
+        if not await self.groq_calls.hit_async(request.client.host):
             raise HTTPException(
                 status_code=429,
                 detail=self.message_loader.get_message(MessageType.ERROR_API_LIMIT)
             )
-        
-        self.groq_calls[client_ip].append(now)
 
     async def check_websocket_limit(self, client_ip: str):
         """Check WebSocket message rate limit"""
-        now = time.time()
-        
-        # Clean old WebSocket calls
-        self.websocket_calls[client_ip] = [
-            call_time for call_time in self.websocket_calls[client_ip]
-            if now - call_time < settings.WEBSOCKET_MESSAGE_INTERVAL
-        ]
-        
-        if len(self.websocket_calls[client_ip]) >= settings.WEBSOCKET_MESSAGE_LIMIT:
+        if not await self.websocket_calls.hit_async(client_ip):
             raise HTTPException(
                 status_code=429,
                 detail=self.message_loader.get_message(MessageType.ERROR_WEBSOCKET_LIMIT)
             )
-        
-        self.websocket_calls[client_ip].append(now) 
\ No newline at end of file
+
+    async def check_websocket_message(self, document_id: str, user_id: str,
+                                      message_type: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Check per-frame WebSocket limits keyed by document and user.
+
+        Returns None if the frame may be processed, otherwise an error frame
+        to send back to the client; the socket itself is left open.
+        """
+        key = f"{document_id}:{user_id}"
+        now = time.time()
+
+        # Cursor chatter has its own, much larger budget
+        if message_type == "cursor_move":
+            if await self.cursor_calls.hit_async(key, now):
+                return None
+            return self._limit_frame(message_type, MessageType.ERROR_WEBSOCKET_LIMIT)
+
+        if not await self.websocket_calls.hit_async(key, now):
+            return self._limit_frame(message_type, MessageType.ERROR_WEBSOCKET_LIMIT)
+        if message_type in ("voice_command", "voice_start"):
+            if not await self.voice_calls.hit_async(key, now):
+                return self._limit_frame(message_type, MessageType.ERROR_VOICE_COOLDOWN)
+        elif message_type == "suggestion" and not await self.groq_calls.hit_async(key, now):
+            return self._limit_frame(message_type, MessageType.ERROR_API_LIMIT)
+        return None
+
+    def _limit_frame(self, message_type: Optional[str], error: MessageType) -> Dict[str, Any]:
+        """Build the error frame sent to a rate limited WebSocket client"""
+        return {
+            "type": "error",
+            "status": 429,
+            "message_type": message_type,
+            "error": self.message_loader.get_message(error)
+        }
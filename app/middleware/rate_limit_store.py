@@ -0,0 +1,208 @@
+"""Storage backends for sliding-window rate limit counters"""
+import asyncio
+import os
+import sqlite3
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+from app.config import settings
+
+# Upper bound on idle keys evicted per check, keeps each check O(1)
+EVICTION_BATCH = 8
+
+# How many checks on a bucket between idle-key sweeps in SQLite
+SQLITE_SWEEP_EVERY = 1024
+
+
+def window_overlap(now: float, interval: float) -> float:
+    """Fraction of the previous fixed window still inside the sliding window"""
+    return 1.0 - (now % interval) / interval
+
+
+class RateLimitStore(ABC):
+    """Holds sliding-window counters for any number of named buckets.
+
+    Implementations must make ``hit`` an atomic check-and-increment: a call
+    is only counted if it was allowed, and concurrent callers can never
+    both take the last slot.
+    """
+
+    @abstractmethod
+    def hit(self, bucket: str, key: str, limit: int, interval: float, now: float) -> bool:
+        """Count one call for key in bucket; returns False if over the limit"""
+
+    async def hit_async(self, bucket: str, key: str, limit: int, interval: float,
+                        now: float) -> bool:
+        """``hit`` for callers on the event loop; stores that may block
+        override it to keep the loop free"""
+        return self.hit(bucket, key, limit, interval, now)
+
+    @abstractmethod
+    def key_count(self, bucket: str) -> int:
+        """Number of keys currently tracked for a bucket"""
+
+    def close(self) -> None:
+        """Release any resources held by the store"""
+
+
+class _WindowCounter:
+    """Per-key state for the sliding window counter"""
+    __slots__ = ("window", "current", "previous", "last_seen")
+
+    def __init__(self, window: int, now: float):
+        self.window = window
+        self.current = 0
+        self.previous = 0
+        self.last_seen = now
+
+
+class MemoryRateLimitStore(RateLimitStore):
+    """Per-process store; keys are kept in least-recently-seen order so
+    idle ones can be evicted from the front a few at a time."""
+
+    def __init__(self, max_keys: Optional[int] = None):
+        self.max_keys = max_keys or settings.RATE_LIMIT_MAX_KEYS
+        self.buckets: Dict[str, "OrderedDict[str, _WindowCounter]"] = {}
+
+    def hit(self, bucket: str, key: str, limit: int, interval: float, now: float) -> bool:
+        counters = self.buckets.setdefault(bucket, OrderedDict())
+        window = int(now // interval)
+
+        counter = counters.get(key)
+        if counter is None:
+            counter = counters[key] = _WindowCounter(window, now)
+        else:
+            counters.move_to_end(key)
+            if counter.window != window:
+                counter.previous = counter.current if window == counter.window + 1 else 0
+                counter.current = 0
+                counter.window = window
+        counter.last_seen = now
+
+        allowed = counter.previous * window_overlap(now, interval) + counter.current < limit
+        if allowed:
+            counter.current += 1
+
+        self._evict(counters, now - 2 * interval)
+        return allowed
+
+    def _evict(self, counters: "OrderedDict[str, _WindowCounter]", cutoff: float):
+        """Drop idle keys, and the least recently seen ones when over max_keys"""
+        # A key idle for two intervals has no calls left in either window
+        for _ in range(EVICTION_BATCH):
+            if not counters:
+                return
+            key = next(iter(counters))
+            if counters[key].last_seen > cutoff and len(counters) <= self.max_keys:
+                return
+            counters.popitem(last=False)
+
+    def key_count(self, bucket: str) -> int:
+        return len(self.buckets.get(bucket, ()))
+
+
+# Old-row expressions for the counters after rolling into :window
+_PREVIOUS = "(CASE window WHEN :window THEN previous WHEN :window - 1 THEN current ELSE 0 END)"
+_CURRENT = "(CASE window WHEN :window THEN current ELSE 0 END)"
+_ALLOWED = f"({_PREVIOUS} * :overlap + {_CURRENT} < :limit)"
+
+_HIT_SQL = f"""
+INSERT INTO rate_limits (bucket, key, window, current, previous, last_seen, allowed)
+VALUES (:bucket, :key, :window, 1, 0, :now, 1)
+ON CONFLICT (bucket, key) DO UPDATE SET
+    previous = {_PREVIOUS},
+    current = {_CURRENT} + {_ALLOWED},
+    allowed = {_ALLOWED},
+    window = :window,
+    last_seen = :now
+RETURNING allowed
+"""
+
+
+class SQLiteRateLimitStore(RateLimitStore):
+    """Store shared by every worker process on one host.
+
+    Each check is a single UPSERT statement, which SQLite executes
+    atomically, so workers never need a lock of their own and only
+    contend for the few microseconds the write takes. Waiting on that
+    lock can still take up to the busy timeout, so ``hit_async`` runs
+    checks on one worker thread of the store's own, off the event loop.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or settings.RATE_LIMIT_SQLITE_PATH
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(
+            self.path, timeout=5.0, isolation_level=None, check_same_thread=False
+        )
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS rate_limits (
+                bucket TEXT NOT NULL,
+                key TEXT NOT NULL,
+                window INTEGER NOT NULL,
+                current INTEGER NOT NULL,
+                previous INTEGER NOT NULL,
+                last_seen REAL NOT NULL,
+                allowed INTEGER NOT NULL,
+                PRIMARY KEY (bucket, key)
+            ) WITHOUT ROWID
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS rate_limits_idle ON rate_limits (bucket, last_seen)"
+        )
+        self._checks: Dict[str, int] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rate-limit")
+
+    def hit(self, bucket: str, key: str, limit: int, interval: float, now: float) -> bool:
+        row = self.conn.execute(_HIT_SQL, {
+            "bucket": bucket,
+            "key": key,
+            "window": int(now // interval),
+            "overlap": window_overlap(now, interval),
+            "limit": limit,
+            "now": now,
+        }).fetchone()
+
+        checks = self._checks.get(bucket, 0) + 1
+        self._checks[bucket] = checks
+        if checks % SQLITE_SWEEP_EVERY == 0:
+            self._sweep(bucket, now - 2 * interval)
+        return bool(row[0])
+
+    async def hit_async(self, bucket: str, key: str, limit: int, interval: float,
+                        now: float) -> bool:
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, self.hit, bucket, key, limit, interval, now
+        )
+
+    def _sweep(self, bucket: str, cutoff: float):
+        """Delete keys that have been idle for two full intervals"""
+        self.conn.execute(
+            "DELETE FROM rate_limits WHERE bucket = ? AND last_seen < ?",
+            (bucket, cutoff)
+        )
+
+    def key_count(self, bucket: str) -> int:
+        row = self.conn.execute(
+            "SELECT COUNT(*) FROM rate_limits WHERE bucket = ?", (bucket,)
+        ).fetchone()
+        return row[0]
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+        self.conn.close()
+
+
+def create_rate_limit_store(kind: Optional[str] = None) -> RateLimitStore:
+    """Build the store selected by settings.RATE_LIMIT_STORE"""
+    kind = (kind or settings.RATE_LIMIT_STORE).lower()
+    if kind == "memory":
+        return MemoryRateLimitStore()
+    if kind == "sqlite":
+        return SQLiteRateLimitStore()
+    raise ValueError(f"Unknown rate limit store: {kind}")
@@ -1,33 +1,103 @@
 """AI Processing Service"""
+import asyncio
 import logging
+import time
 import groq
-from typing import Optional, Callable, Dict, Any, List
+import httpx
+from typing import Optional, Callable, Awaitable, AsyncIterator, Dict, Any, Iterator, List, Tuple
 from app.config import settings
+from app.services.suggestion_cache import SuggestionCache, suggestion_cache_key
+from app.services.single_flight import SingleFlight
+from app.services.suggestion_batcher import SuggestionBatcher
+from app.services.resilience import ResilientCaller
+from app.services.concurrency_limiter import (
+    AdaptiveLimiter, INTERACTIVE, BACKGROUND, BATCH_KIND, STREAM_KIND
+)
+from app.services.session_store import SessionStore, ChangeRecord, DEFAULT_DOCUMENT
+from app.services import redline_diff
 from tests.constants.test_messages import MessageType
 from tests.constants.message_loader import MessageLoader
 
 logger = logging.getLogger(__name__)
 
+# Bump PROMPT_VERSION whenever SUGGESTION_PROMPT changes so cached
+# suggestions from the old prompt are not reused
+SUGGESTION_PROMPT = "Suggest improvements for: {text}"
+PROMPT_VERSION = "1"
+BATCH_PROMPT_VERSION = "batch-1"
+
 class AIProcessor:
     """AI Processing Service using Groq."""
     
     def __init__(self):
-        """Initialize AI processor with Groq client"""
-        self.client = groq.Client(api_key=settings.GROQ_API_KEY)
+        """Initialize AI processor with an async Groq client on a pooled connection"""
+        self.http_client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=settings.GROQ_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.GROQ_MAX_KEEPALIVE,
+                keepalive_expiry=settings.GROQ_KEEPALIVE_EXPIRY
+            ),
+            timeout=httpx.Timeout(
+                settings.GROQ_READ_TIMEOUT,
+                connect=settings.GROQ_CONNECT_TIMEOUT
+            )
+        )
+        self.client = groq.AsyncGroq(
+            api_key=settings.GROQ_API_KEY,
+            base_url=settings.GROQ_BASE_URL,
+            http_client=self.http_client,
+            max_retries=0  # retries and failover are handled by self.resilience
+        )
+        self.upstream_limiter = AdaptiveLimiter()
+        self.resilience = ResilientCaller()
+        self.suggestion_cache = SuggestionCache()
+        self.inflight = SingleFlight()  # shares identical concurrent upstream calls
+        # Fallback answers come from the single-paragraph prompt and are
+        # cached under its key by _get_groq_suggestions itself; their miss
+        # was already counted by _batched_suggestions
+        self.batcher = SuggestionBatcher(
+            self._complete_batch,
+            lambda text: self._get_groq_suggestions(text, priority=BACKGROUND, count_miss=False),
+            on_batched=lambda text, suggestions, model: self.suggestion_cache.set(
+                self._suggestion_key(text, BATCH_PROMPT_VERSION, model), suggestions
+            )
+        )
         self.message_loader = MessageLoader()
         self.command_callback: Optional[Callable] = None
         self.is_listening = False
         self.max_size = 10  # MB
         self.conversation_buffer = []
-        self.change_history: List[Dict[str, Any]] = []
         self.current_paragraph = ""
-        self.original_text = {}  # Store original text for each paragraph
-        self.active_users = {}  # Track active users
-        self.cursor_positions = {}  # Track cursor positions
-        self.highlighting = {}  # Track highlights
-        self.preview_suggestions = {}  # Track real-time previews
+        # Originals, changes, cursors, users, highlights and previews per document
+        self.sessions = SessionStore()
         logger.info("Groq client initialized successfully")
 
+    def metrics(self) -> Dict[str, Any]:
+        """Counters for the upstream call path"""
+        return {
+            "concurrency": self.upstream_limiter.stats(),
+            "resilience": self.resilience.stats(),
+            "cache": self.suggestion_cache.stats(),
+            "sessions": self.sessions.stats(),
+            "diff_cache": redline_diff.cache_stats(),
+            "in_flight_calls": self.inflight.in_flight(),
+            "batches_sent": self.batcher.batches_sent,
+            "batch_fallbacks": self.batcher.fallbacks
+        }
+
+    def snapshot_session(self, document_id: str) -> Optional[Dict[str, Any]]:
+        """Serializable copy of a document's session state, or None if not held"""
+        return self.sessions.snapshot(document_id)
+
+    def restore_session(self, snapshot: Dict[str, Any]):
+        """Reload a document's session state from snapshot_session output"""
+        self.sessions.restore(snapshot)
+
+    async def close(self):
+        """Close the pooled HTTP connections to Groq and the suggestion cache"""
+        await self.http_client.aclose()
+        self.suggestion_cache.close()
+
     async def start_listening(self, document_id: str) -> Dict[str, Any]:
         """Start listening for conversation"""
         self.is_listening = True
@@ -44,7 +114,8 @@ class AIProcessor:
             "message": self.message_loader.get_message(MessageType.COMMAND_STOP)
         }
 
-    async def process_conversation(self, text: str, paragraph_id: str) -> Dict[str, Any]:
+    async def process_conversation(self, text: str, paragraph_id: str,
+                                   document_id: str = DEFAULT_DOCUMENT) -> Dict[str, Any]:
         """Process conversation and generate suggestions"""
         if not self.is_listening:
             return {
@@ -53,15 +124,14 @@ class AIProcessor:
 
         try:
             # Store original text if not already stored
-            if paragraph_id not in self.original_text:
-                self.original_text[paragraph_id] = text
+            original = self.sessions.get(document_id).remember_original(paragraph_id, text)
 
             suggestions = await self._get_groq_suggestions(text)
             
             return {
                 "message": self.message_loader.get_message(MessageType.SUCCESS_PROCESS),
                 "suggestions": suggestions,
-                "original_text": self.original_text[paragraph_id],
+                "original_text": original,
                 "paragraph_id": paragraph_id
             }
         except Exception as e:
@@ -73,18 +143,99 @@ class AIProcessor:
                 )
             }
 
-    async def apply_suggestion(self, paragraph_id: str, suggestion: str) -> Dict[str, Any]:
+    async def process_suggestion(self, document_id: str, text: str, paragraph_id: str,
+                                 publish: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+                                 ) -> Dict[str, Any]:
+        """Generate suggestions for a paragraph.
+
+        When publish is given and streaming is enabled, partial suggestion
+        frames are published while tokens arrive. Each carries only the
+        spans by which the text so far differs from the paragraph's
+        original; the returned dict is the final consolidated frame.
+        """
+        try:
+            original = self.sessions.get(document_id).remember_original(paragraph_id, text)
+
+            if publish is not None and settings.STREAM_SUGGESTIONS:
+                async def on_partial(partial_text: str):
+                    await publish({
+                        "type": "suggestion_partial",
+                        "document_id": document_id,
+                        "paragraph_id": paragraph_id,
+                        "preview": self._build_preview(paragraph_id, partial_text, partial=True,
+                                                       document_id=document_id)
+                    })
+                suggestions = await self._stream_groq_suggestions(text, on_partial)
+            else:
+                suggestions = await self._get_groq_suggestions(text)
+
+            return {
+                "type": "suggestions",
+                "message": self.message_loader.get_message(MessageType.SUCCESS_PROCESS),
+                "document_id": document_id,
+                "paragraph_id": paragraph_id,
+                "suggestions": suggestions,
+                "original_text": original
+            }
+        except Exception as e:
+            # Upstream failures, including exhausted retries and failover,
+            # become an error frame rather than closing the caller's socket
+            logger.error(f"Error processing suggestion: {str(e)}")
+            return {
+                "type": "error",
+                "document_id": document_id,
+                "paragraph_id": paragraph_id,
+                "error": self.message_loader.get_message(
+                    MessageType.ERROR_PROCESSING,
+                    error=str(e)
+                )
+            }
+
+    async def suggest_document(self, document_id: str,
+                               paragraphs: Dict[str, str]) -> Dict[str, Any]:
+        """Get suggestions for many paragraphs at once.
+
+        Uncached paragraphs are micro-batched so a whole document costs a
+        handful of upstream calls instead of one per paragraph.
+        """
+        paragraph_ids = list(paragraphs)
+        results = await asyncio.gather(
+            *(self._batched_suggestions(pid, paragraphs[pid]) for pid in paragraph_ids),
+            return_exceptions=True
+        )
+
+        suggestions, errors = {}, {}
+        for paragraph_id, result in zip(paragraph_ids, results):
+            if isinstance(result, Exception):
+                errors[paragraph_id] = str(result)
+            else:
+                suggestions[paragraph_id] = result
+        return {
+            "type": "document_suggestions",
+            "document_id": document_id,
+            "suggestions": suggestions,
+            "errors": errors
+        }
+
+    async def _batched_suggestions(self, paragraph_id: str, text: str) -> List[Dict[str, Any]]:
+        # Answers from either prompt will do; the batcher caches what it gets.
+        # A paragraph found under neither key counts as a single miss
+        cached = self.suggestion_cache.get(self._suggestion_key(text, BATCH_PROMPT_VERSION))
+        if cached is None:
+            cached = self.suggestion_cache.get(self._suggestion_key(text), count_miss=False)
+        if cached is not None:
+            return cached
+        return await self.batcher.submit(paragraph_id, text)
+
+    async def apply_suggestion(self, paragraph_id: str, suggestion: str,
+                               document_id: str = DEFAULT_DOCUMENT) -> Dict[str, Any]:
         """Apply a suggestion to the text"""
         try:
-            original = self.original_text.get(paragraph_id, "")
+            session = self.sessions.get(document_id)
+            original = session.original(paragraph_id) or ""
             
             # Log change in history
-            self.change_history.append({
-                "paragraph_id": paragraph_id,
-                "original": original,
-                "suggestion": suggestion,
-                "timestamp": "timestamp_here"
-            })
+            session.add_change(ChangeRecord(paragraph_id, original, suggestion, "timestamp_here"))
 
             return {
                 "message": self.message_loader.get_message(MessageType.SUCCESS_CHANGE),
@@ -100,10 +251,11 @@ class AIProcessor:
                 )
             }
 
-    async def clear_changes(self, paragraph_id: str) -> Dict[str, Any]:
+    async def clear_changes(self, paragraph_id: str,
+                            document_id: str = DEFAULT_DOCUMENT) -> Dict[str, Any]:
         """Clear changes and restore original text"""
         try:
-            original = self.original_text.get(paragraph_id)
+            original = self.sessions.get(document_id).original(paragraph_id)
             if not original:
                 return {
                     "error": self.message_loader.get_message(MessageType.ERROR_NO_ORIGINAL)
@@ -122,15 +274,32 @@ class AIProcessor:
                 )
             }
 
-    async def accept_all_changes(self) -> Dict[str, Any]:
-        """Accept all changes and generate appendix"""
+    async def accept_all_changes(self, document_id: str = DEFAULT_DOCUMENT,
+                                 publish: Optional[Callable[[Dict[str, Any]], Awaitable[None]]] = None
+                                 ) -> Dict[str, Any]:
+        """Accept all changes and generate appendix.
+
+        When publish is given, the appendix is also sent as
+        "appendix_chunk" frames while it is being assembled.
+        """
         try:
-            appendix = self._generate_change_appendix()
+            if publish is not None:
+                parts = []
+                async for chunk in self.stream_change_appendix(document_id):
+                    parts.append(chunk)
+                    await publish({
+                        "type": "appendix_chunk",
+                        "document_id": document_id,
+                        "text": chunk
+                    })
+                appendix = "".join(parts)
+            else:
+                appendix = self._generate_change_appendix(document_id)
             
             return {
                 "message": self.message_loader.get_message(MessageType.COMMAND_ACCEPT_ALL),
                 "appendix": appendix,
-                "changes": self.change_history
+                "changes": [change.to_dict() for change in self.sessions.get(document_id).changes]
             }
         except Exception as e:
             return {
@@ -140,40 +309,180 @@ class AIProcessor:
                 )
             }
 
-    async def _get_groq_suggestions(self, text: str) -> List[Dict[str, Any]]:
-        """Get suggestions from Groq API"""
+    def _suggestion_key(self, text: str, prompt_version: str = PROMPT_VERSION,
+                        model: Optional[str] = None) -> str:
+        """Cache key for an answer from model, by default the primary one.
+        Lookups use the primary model, so answers from a fallback model
+        are never served once the primary has recovered."""
+        return suggestion_cache_key(
+            text, model or settings.PRIMARY_MODEL, settings.TEMPERATURE, prompt_version
+        )
+
+    async def _complete_batch(self, prompt: str) -> Tuple[str, str]:
+        """Make the upstream completion call for a batched prompt; returns
+        the completion and the model that answered"""
+        async def attempt(model: str) -> Tuple[str, str]:
+            async with self.upstream_limiter.slot(BACKGROUND, BATCH_KIND):
+                completion = await self.client.chat.completions.create(
+                    messages=[{"role": "user", "content": prompt}],
+                    model=model,
+                    temperature=settings.TEMPERATURE,
+                    max_tokens=settings.SUGGESTION_BATCH_MAX_TOKENS
+                )
+            return completion.choices[0].message.content, model
+
+        return await self.resilience.call(attempt)
+
+    async def _get_groq_suggestions(self, text: str, priority: int = INTERACTIVE,
+                                    count_miss: bool = True) -> List[Dict[str, Any]]:
+        """Get suggestions from Groq API, reusing cached results for the same text"""
+        key = self._suggestion_key(text)
+        cached = self.suggestion_cache.get(key, count_miss=count_miss)
+        if cached is not None:
+            return cached
+        # Lanes are kept apart so an interactive request never waits on a
+        # shared call queued in the background lane
+        return await self.inflight.do(
+            ("suggestion", key, priority), lambda: self._request_suggestions(text, priority)
+        )
+
+    async def _request_suggestions(self, text: str,
+                                   priority: int = INTERACTIVE) -> List[Dict[str, Any]]:
+        """Make the upstream completion call for a suggestion and cache it
+        under the model that answered"""
+        async def attempt(model: str) -> Tuple[str, str]:
+            async with self.upstream_limiter.slot(priority):
+                completion = await self.client.chat.completions.create(
+                    messages=[{
+                        "role": "user",
+                        "content": SUGGESTION_PROMPT.format(text=text)
+                    }],
+                    model=model,
+                    temperature=settings.TEMPERATURE,
+                    max_tokens=settings.MAX_TOKENS
+                )
+            return completion.choices[0].message.content, model
+
         try:
-            completion = await self.client.chat.completions.create(
-                messages=[{
-                    "role": "user",
-                    "content": f"Suggest improvements for: {text}"
-                }],
-                model="mixtral-8x7b-32768",
-                temperature=0.7,
-                max_tokens=2048
-            )
-            
-            suggestions = completion.choices[0].message.content.split('\n')
-            return [{"text": s, "confidence": 0.9} for s in suggestions if s.strip()]
+            content, model = await self.resilience.call(attempt)
+            suggestions = self._parse_suggestions(content)
+            self.suggestion_cache.set(self._suggestion_key(text, model=model), suggestions)
+            return suggestions
             
         except Exception as e:
             logger.error(f"Groq API error: {str(e)}")
             raise
 
-    def _generate_change_appendix(self) -> str:
+    async def _stream_groq_suggestions(self, text: str,
+                                       on_partial: Callable[[str], Awaitable[None]]
+                                       ) -> List[Dict[str, Any]]:
+        """Stream suggestions from Groq API, reporting accumulated text as it grows.
+
+        Cached results are returned straight away without partial frames. A
+        request that joins an identical stream already in flight only gets
+        the final result; partial frames go to the room that started it.
+        """
+        key = self._suggestion_key(text)
+        cached = self.suggestion_cache.get(key)
+        if cached is not None:
+            return cached
+        return await self.inflight.do(
+            ("suggestion", key, INTERACTIVE),
+            lambda: self._request_streamed_suggestions(text, on_partial)
+        )
+
+    async def _request_streamed_suggestions(self, text: str,
+                                            on_partial: Callable[[str], Awaitable[None]]
+                                            ) -> List[Dict[str, Any]]:
+        """Make the upstream streaming call for a suggestion and cache it
+        under the model that answered"""
+        interval = settings.STREAM_FLUSH_INTERVAL_MS / 1000
+        parts: List[str] = []
+        flushed = 0
+
+        async def attempt(model: str) -> str:
+            nonlocal parts, flushed
+            # Partial frames carry the full text so far, so a retry can start over
+            parts, flushed = [], 0
+            last_flush = 0.0
+            async with self.upstream_limiter.slot(INTERACTIVE, STREAM_KIND):
+                stream = await self.client.chat.completions.create(
+                    messages=[{
+                        "role": "user",
+                        "content": SUGGESTION_PROMPT.format(text=text)
+                    }],
+                    model=model,
+                    temperature=settings.TEMPERATURE,
+                    max_tokens=settings.MAX_TOKENS,
+                    stream=True
+                )
+                async for chunk in stream:
+                    if not chunk.choices or not chunk.choices[0].delta.content:
+                        continue
+                    parts.append(chunk.choices[0].delta.content)
+
+                    # Throttle partial frames so each token is not its own broadcast
+                    now = time.monotonic()
+                    if now - last_flush >= interval:
+                        await self._emit_partial(on_partial, "".join(parts))
+                        last_flush = now
+                        flushed = len(parts)
+            return model
+
+        try:
+            model = await self.resilience.call(attempt)
+            content = "".join(parts)
+            if flushed != len(parts):
+                await self._emit_partial(on_partial, content)
+            suggestions = self._parse_suggestions(content)
+            self.suggestion_cache.set(self._suggestion_key(text, model=model), suggestions)
+            return suggestions
+
+        except Exception as e:
+            logger.error(f"Groq API streaming error: {str(e)}")
+            raise
+
+    async def _emit_partial(self, on_partial: Callable[[str], Awaitable[None]], text: str):
+        """Partial frames are best effort and must not fail a shared call"""
+        try:
+            await on_partial(text)
+        except Exception as e:
+            logger.warning(f"Partial suggestion publish failed: {str(e)}")
+
+    def _parse_suggestions(self, content: str) -> List[Dict[str, Any]]:
+        """Split a completion into one suggestion per non-empty line"""
+        suggestions = content.split('\n')
+        return [{"text": s, "confidence": 0.9} for s in suggestions if s.strip()]
+
+    def _generate_change_appendix(self, document_id: str = DEFAULT_DOCUMENT) -> str:
         """Generate appendix of all changes"""
-        appendix = ["# Document Change History"]
-        
-        for change in self.change_history:
-            appendix.append(f"\n## Paragraph {change['paragraph_id']}")
-            appendix.append(f"Original: {change['original']}")
-            appendix.append(f"Changed to: {change['suggestion']}")
-            appendix.append(f"Timestamp: {change['timestamp']}")
-            
-        return "\n".join(appendix)
+        return "".join(self._iter_change_appendix(document_id))
+
+    def _iter_change_appendix(self, document_id: str) -> Iterator[str]:
+        # Sections are cached on the session; only changes added since the
+        # last call are rendered
+        yield "# Document Change History"
+        for section in self.sessions.get(document_id).appendix_sections():
+            yield "\n" + section
+
+    async def stream_change_appendix(self, document_id: str = DEFAULT_DOCUMENT
+                                     ) -> AsyncIterator[str]:
+        """Yield the appendix in chunks of about APPENDIX_CHUNK_CHARS,
+        giving other tasks a turn between chunks"""
+        buffer, size = [], 0
+        for part in self._iter_change_appendix(document_id):
+            buffer.append(part)
+            size += len(part)
+            if size >= settings.APPENDIX_CHUNK_CHARS:
+                yield "".join(buffer)
+                buffer, size = [], 0
+                await asyncio.sleep(0)
+        if buffer:
+            yield "".join(buffer)
 
     async def handle_cursor_movement(self, user_id: str, command: str, 
-                                  current_position: int) -> Dict[str, Any]:
+                                  current_position: int,
+                                  document_id: str = DEFAULT_DOCUMENT) -> Dict[str, Any]:
         """Handle cursor movement commands"""
         try:
             new_position = current_position
@@ -190,7 +499,7 @@ class AIProcessor:
                 # Logic to find position of target text
                 pass
 
-            self.cursor_positions[user_id] = new_position
+            self.sessions.get(document_id).set_cursor(user_id, new_position)
             return {
                 "message": self.message_loader.get_message(MessageType.COMMAND_MOVE),
                 "position": new_position
@@ -203,29 +512,32 @@ class AIProcessor:
                 )
             }
 
-    async def add_user(self, user_id: str) -> Dict[str, Any]:
+    async def add_user(self, user_id: str,
+                       document_id: str = DEFAULT_DOCUMENT) -> Dict[str, Any]:
         """Add user to collaboration session"""
-        self.active_users[user_id] = {
+        self.sessions.get(document_id).add_user(user_id, {
             "timestamp": "current_time",
             "cursor_position": 0,
             "changes": []
-        }
+        })
         return {
             "message": self.message_loader.get_message(MessageType.USER_JOINED)
         }
 
     async def update_highlighting(self, paragraph_id: str, 
-                                changes: Dict[str, Any]) -> Dict[str, Any]:
+                                changes: Dict[str, Any],
+                                document_id: str = DEFAULT_DOCUMENT) -> Dict[str, Any]:
         """Update visual highlighting"""
         try:
-            self.highlighting[paragraph_id] = {
+            highlight = {
                 "original": f"<strike>{changes['original']}</strike>",
                 "new": f"<highlight>{changes['new']}</highlight>",
                 "timestamp": "current_time"
             }
+            self.sessions.get(document_id).set_highlight(paragraph_id, highlight)
             return {
                 "message": self.message_loader.get_message(MessageType.HIGHLIGHT_UPDATED),
-                "highlighting": self.highlighting[paragraph_id]
+                "highlighting": highlight
             }
         except Exception as e:
             return {
@@ -236,18 +548,13 @@ class AIProcessor:
             }
 
     async def preview_suggestion(self, paragraph_id: str, 
-                               suggestion: str) -> Dict[str, Any]:
-        """Generate real-time preview of suggestion"""
+                               suggestion: str, partial: bool = False,
+                               document_id: str = DEFAULT_DOCUMENT) -> Dict[str, Any]:
+        """Generate real-time preview of suggestion; partial previews render
+        text that is still streaming in"""
         try:
-            preview = {
-                "original": self.original_text.get(paragraph_id, ""),
-                "suggested": suggestion,
-                "preview_html": self._generate_preview_html(
-                    self.original_text.get(paragraph_id, ""),
-                    suggestion
-                )
-            }
-            self.preview_suggestions[paragraph_id] = preview
+            preview = self._build_preview(paragraph_id, suggestion, partial, document_id)
+            self.sessions.get(document_id).set_preview(paragraph_id, preview)
             return {
                 "message": self.message_loader.get_message(MessageType.PREVIEW_READY),
                 "preview": preview
@@ -260,11 +567,28 @@ class AIProcessor:
                 )
             }
 
+    def _build_preview(self, paragraph_id: str, suggestion: str, partial: bool = False,
+                       document_id: str = DEFAULT_DOCUMENT) -> Dict[str, Any]:
+        """Build the preview payload for a (possibly partial) suggestion.
+        Partial previews are published many times a second while text
+        streams in, so they carry only the changed spans."""
+        original = self.sessions.get(document_id).original(paragraph_id) or ""
+        # Partial texts are seen once, so keep them out of the diff cache
+        spans = redline_diff.diff_text(original, suggestion, cache=not partial)
+        changes = redline_diff.changed_spans(spans)
+        if partial:
+            return {"partial": True, "changes": changes}
+        return {
+            "original": original,
+            "suggested": suggestion,
+            "partial": False,
+            "changes": changes,
+            "preview_html": self._render_preview_html(spans)
+        }
+
     def _generate_preview_html(self, original: str, suggestion: str) -> str:
-        """Generate HTML preview with highlighting"""
-        return f"""
-        <div class="preview-container">
-            <div class="original"><strike>{original}</strike></div>
-            <div class="suggestion"><highlight>{suggestion}</highlight></div>
-        </div>
-        """
\ No newline at end of file
+        """Generate HTML preview with only the changed spans marked up"""
+        return self._render_preview_html(redline_diff.diff_text(original, suggestion))
+
+    def _render_preview_html(self, spans) -> str:
+        return f'<div class="preview-container">{redline_diff.render_redline(spans)}</div>'
@@ -0,0 +1,300 @@
+"""Streaming ingestion of voice audio sent as binary WebSocket frames"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from app.config import settings
+from app.utils.audio import (
+    DEFAULT_AUDIO_FORMAT, AudioConverter, Endpointer, frame_size, read_wav_header, trim_silence
+)
+
+logger = logging.getLogger(__name__)
+
+# A WAV header, including any metadata chunks before the data, larger
+# than this is treated as garbage rather than buffered further
+MAX_HEADER_BYTES = 64 * 1024
+
+StreamKey = Tuple[str, str]  # (document_id, user_id)
+UtteranceHandler = Callable[["AudioStream"], Awaitable[None]]
+
+
+class AudioRingBuffer:
+    """Fixed-size byte ring between the socket reader and the audio consumer.
+
+    ``put`` waits while the ring is full. That stops the reader taking
+    further frames off the socket, so TCP flow control slows the client
+    down instead of the server buffering without bound.
+    """
+
+    def __init__(self, capacity: int):
+        self.buffer = bytearray(capacity)
+        self.capacity = capacity
+        self.start = 0
+        self.size = 0
+        self.closed = False
+        self._changed = asyncio.Condition()
+
+    @property
+    def free(self) -> int:
+        return self.capacity - self.size
+
+    def _write(self, data: memoryview) -> int:
+        count = min(len(data), self.free)
+        position = (self.start + self.size) % self.capacity
+        first = min(count, self.capacity - position)
+        self.buffer[position:position + first] = data[:first]
+        self.buffer[:count - first] = data[first:count]
+        self.size += count
+        return count
+
+    def _read(self, count: int) -> bytes:
+        first = min(count, self.capacity - self.start)
+        data = bytes(self.buffer[self.start:self.start + first]) + bytes(self.buffer[:count - first])
+        self.start = (self.start + count) % self.capacity
+        self.size -= count
+        return data
+
+    async def put(self, data: bytes):
+        """Write all of data, waiting for room as needed; dropped once closed"""
+        view = memoryview(data)
+        async with self._changed:
+            while view and not self.closed:
+                written = self._write(view)
+                view = view[written:]
+                if written:
+                    self._changed.notify_all()
+                if view:
+                    await self._changed.wait_for(lambda: self.free or self.closed)
+
+    async def read(self, count: int) -> bytes:
+        """Wait for count bytes; fewer only once closed, and b"" when drained"""
+        async with self._changed:
+            await self._changed.wait_for(lambda: self.size >= count or self.closed)
+            data = self._read(min(count, self.size))
+            self._changed.notify_all()
+            return data
+
+    async def close(self):
+        async with self._changed:
+            self.closed = True
+            self._changed.notify_all()
+
+
+class AudioStream:
+    """One utterance arriving as a sequence of binary frames.
+
+    The first frame may start with a WAV header, which is parsed as soon
+    as enough of it has arrived; otherwise the stream is raw PCM in the
+    format announced with ``voice_start``. Audio passes through a ring
+    buffer and is consumed in ``chunk_ms`` pieces while the user is still
+    speaking; each piece is converted to 16 kHz mono 16-bit PCM as it
+    arrives. At most ``max_seconds`` of audio are kept.
+
+    Each piece is also checked for speech. Once ``endpoint_ms`` of
+    silence follows speech the utterance is over: further audio is
+    dropped and ``on_end`` is called with the stream, without waiting for
+    the client to say it has stopped.
+    """
+
+    def __init__(self, audio_format: Optional[Dict[str, Any]] = None,
+                 buffer_bytes: Optional[int] = None, chunk_ms: Optional[int] = None,
+                 max_seconds: Optional[float] = None, endpoint_ms: Optional[int] = None,
+                 on_end: Optional[UtteranceHandler] = None):
+        self.source_format = audio_format
+        self.format: Optional[Dict[str, Any]] = None  # of pcm, once the stream has started
+        self.buffer_bytes = buffer_bytes or settings.AUDIO_RING_BUFFER_KB * 1024
+        self.chunk_ms = chunk_ms or settings.AUDIO_CHUNK_MS
+        self.max_seconds = max_seconds or settings.MAX_UTTERANCE_SECONDS
+        self.endpoint_ms = settings.VOICE_ENDPOINT_SILENCE_MS if endpoint_ms is None else endpoint_ms
+        self.on_end = on_end
+        self.ring: Optional[AudioRingBuffer] = None
+        self.converter: Optional[AudioConverter] = None
+        self.endpointer: Optional[Endpointer] = None
+        self.pcm = bytearray()
+        self.received = 0
+        self.truncated = False
+        self.endpointed = False  # the speaker stopped before the client said so
+        self.failed: Optional[Exception] = None
+        self._analysed = 0  # bytes of pcm already checked for speech
+        self._finished = False
+        self._header: Optional[bytearray] = None
+        self._task: Optional[asyncio.Task] = None
+        self._end_task: Optional[asyncio.Task] = None
+        self._close_task: Optional[asyncio.Task] = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds of audio consumed so far"""
+        if self.format is None:
+            return 0.0
+        return len(self.pcm) / (frame_size(self.format) * self.format["sample_rate"])
+
+    async def feed(self, data: bytes):
+        """Accept one binary frame; waits while the ring buffer is full"""
+        self.received += len(data)
+        if self.ring is None:
+            if self._header is None and not data.startswith(b"RIFF"):
+                # Raw PCM
+                self._open(self.source_format or DEFAULT_AUDIO_FORMAT)
+            else:
+                data = self._take_header(data)
+                if data is None:
+                    return
+        await self.ring.put(data)
+        if self.failed is not None:
+            raise ValueError(f"Audio processing failed: {str(self.failed)}")
+
+    def _take_header(self, data: bytes) -> Optional[bytes]:
+        """Buffer data until the WAV header is complete, then return the PCM after it"""
+        if self._header is None:
+            self._header = bytearray()
+        self._header += data
+        parsed = read_wav_header(self._header)
+        if parsed is None:
+            if len(self._header) > MAX_HEADER_BYTES:
+                raise ValueError("WAV header too large")
+            return None
+        audio_format, offset = parsed
+        self._open(audio_format)
+        pcm = bytes(self._header[offset:])
+        self._header = None
+        return pcm
+
+    def _open(self, audio_format: Dict[str, Any]):
+        audio_format = {key: audio_format.get(key, value) for key, value in DEFAULT_AUDIO_FORMAT.items()}
+        self.source_format = audio_format
+        block = frame_size(audio_format)
+        if block <= 0 or audio_format["sample_rate"] <= 0:
+            raise ValueError(f"Invalid audio format {audio_format}")
+        chunk_frames = max(1, audio_format["sample_rate"] * self.chunk_ms // 1000)
+        self.chunk_bytes = chunk_frames * block
+        if audio_format != DEFAULT_AUDIO_FORMAT:
+            self.converter = AudioConverter(audio_format, DEFAULT_AUDIO_FORMAT,
+                                            max_chunk_frames=chunk_frames)
+        self.format = DEFAULT_AUDIO_FORMAT
+        self.max_bytes = int(self.max_seconds * self.format["sample_rate"]) * frame_size(self.format)
+        if self.endpoint_ms:
+            self.endpointer = Endpointer(self.format, self.endpoint_ms)
+        # The ring must hold at least one whole chunk for the consumer to make progress
+        self.ring = AudioRingBuffer(max(self.buffer_bytes, self.chunk_bytes))
+        self._task = asyncio.create_task(self._consume())
+
+    async def _consume(self):
+        try:
+            while not self.endpointed:
+                chunk = await self.ring.read(self.chunk_bytes)
+                if not chunk:
+                    return
+                self.process_chunk(chunk if self.converter is None else self.converter.process(chunk))
+        except Exception as e:
+            logger.error(f"Audio stream processing failed: {str(e)}")
+            self.failed = e
+        finally:
+            # Wake a writer waiting for room; anything still to come is dropped
+            await self.ring.close()
+
+        if self.endpointed:
+            self._finish()
+            if self.on_end is not None:
+                self._end_task = asyncio.create_task(self._run_on_end())
+
+    async def _run_on_end(self):
+        try:
+            await self.on_end(self)
+        except Exception as e:
+            logger.error(f"Handling end of utterance failed: {str(e)}")
+
+    def process_chunk(self, chunk: bytes):
+        """Handle the next piece of audio as it arrives"""
+        room = self.max_bytes - len(self.pcm)
+        if len(chunk) > room:
+            if not self.truncated:
+                logger.warning(f"Utterance longer than {self.max_seconds}s, dropping the rest")
+            self.truncated = True
+            chunk = chunk[:room]
+        self.pcm += chunk
+
+        if self.endpointer is not None and not self.endpointed:
+            # Whole VAD frames only; the rest is checked with the next chunk
+            end = len(self.pcm) - (len(self.pcm) - self._analysed) % self.endpointer.frame_bytes
+            if end > self._analysed:
+                self.endpointed = self.endpointer.feed(self.pcm[self._analysed:end])
+                self._analysed = end
+
+    async def finish(self) -> "AudioStream":
+        """End of utterance: wait until everything received has been consumed"""
+        if self.ring is not None:
+            await self.ring.close()
+            await self._task
+        self._finish()
+        return self
+
+    def _finish(self):
+        if self._finished or self.format is None:
+            return
+        self._finished = True
+        if self.converter is not None:
+            self.process_chunk(self.converter.flush())
+        # A trailing partial sample frame cannot be played back
+        del self.pcm[len(self.pcm) - len(self.pcm) % frame_size(self.format):]
+
+    def speech(self) -> memoryview:
+        """The finished utterance without leading and trailing silence (no copy)"""
+        if self.format is None:
+            return memoryview(b"")
+        return trim_silence(self.pcm, self.format)
+
+    def abort(self):
+        """Drop the utterance, waking a writer blocked on a full ring.
+        A command already recognized from it is still delivered."""
+        if self._task is not None:
+            self._task.cancel()
+        if self.ring is not None and not self.ring.closed:
+            self._close_task = asyncio.ensure_future(self.ring.close())
+
+
+class VoiceStreams:
+    """Open audio streams, one per (document, user).
+
+    ``on_end(document_id, user_id, stream)`` is called when a stream
+    detects the end of an utterance by itself.
+    """
+
+    def __init__(self, on_end: Optional[Callable[[str, str, AudioStream], Awaitable[None]]] = None):
+        self.streams: Dict[StreamKey, AudioStream] = {}
+        self.on_end = on_end
+
+    def start(self, document_id: str, user_id: str,
+              audio_format: Optional[Dict[str, Any]] = None) -> AudioStream:
+        """Begin a new utterance, abandoning any unfinished one"""
+        self.abort(document_id, user_id)
+        on_end = None
+        if self.on_end is not None:
+            on_end = lambda stream: self.on_end(document_id, user_id, stream)
+        stream = self.streams[(document_id, user_id)] = AudioStream(audio_format, on_end=on_end)
+        return stream
+
+    async def feed(self, document_id: str, user_id: str, data: bytes):
+        """Add a binary frame, starting a stream if audio arrives without voice_start"""
+        stream = self.streams.get((document_id, user_id))
+        if stream is None:
+            stream = self.start(document_id, user_id)
+        elif stream.endpointed:
+            # Audio after an utterance ended on its own begins the next one
+            stream = self.start(document_id, user_id, stream.source_format)
+        try:
+            await stream.feed(data)
+        except ValueError:
+            self.abort(document_id, user_id)
+            raise
+
+    async def finish(self, document_id: str, user_id: str) -> Optional[AudioStream]:
+        stream = self.streams.pop((document_id, user_id), None)
+        return await stream.finish() if stream is not None else None
+
+    def abort(self, document_id: str, user_id: str):
+        stream = self.streams.pop((document_id, user_id), None)
+        if stream is not None:
+            stream.abort()
+
+    def __len__(self) -> int:
+        return len(self.streams)
@@ -0,0 +1,207 @@
+"""Pub/sub backplane so document rooms span worker processes"""
+import asyncio
+import fcntl
+import json
+import logging
+import os
+from abc import ABC, abstractmethod
+from typing import Callable, Optional, Set
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# handler(document_id, serialized_message)
+DeliveryHandler = Callable[[str, str], None]
+
+
+class Backplane(ABC):
+    """Deliver serialized room messages to every worker, this one included"""
+
+    def __init__(self):
+        self.handler: Optional[DeliveryHandler] = None
+
+    @abstractmethod
+    async def start(self, handler: DeliveryHandler) -> None:
+        """Begin receiving messages; handler is called for each delivery"""
+
+    @abstractmethod
+    async def publish(self, document_id: str, payload: str) -> None:
+        """Send a serialized message to the document's room in every worker"""
+
+    async def stop(self) -> None:
+        """Release any resources held by the backplane"""
+        self.handler = None
+
+
+class InProcessBackplane(Backplane):
+    """Single-worker backplane that delivers straight to the local handler"""
+
+    async def start(self, handler: DeliveryHandler) -> None:
+        self.handler = handler
+
+    async def publish(self, document_id: str, payload: str) -> None:
+        if self.handler:
+            self.handler(document_id, payload)
+
+
+class UnixSocketBackplane(Backplane):
+    """Share rooms between workers on one host through a Unix socket hub.
+
+    Whichever worker holds the lock file hosts the hub; every worker,
+    including the host, connects to it as a client. Publishers deliver to
+    their own sockets directly and the hub relays each frame to all other
+    clients. If the hosting worker exits, the next one to reconnect takes
+    over. Delivery is best effort: frames published while reconnecting are
+    lost, just like frames to a dropped WebSocket.
+    """
+
+    def __init__(self, path: Optional[str] = None,
+                 max_frame_size: Optional[int] = None):
+        super().__init__()
+        self.path = path or settings.BACKPLANE_SOCKET_PATH
+        self.max_frame_size = max_frame_size or settings.BACKPLANE_MAX_FRAME_SIZE
+        self._lock_fd: Optional[int] = None
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._hub_clients: Set[asyncio.StreamWriter] = set()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._listener: Optional[asyncio.Task] = None
+        self._closing = False
+
+    @property
+    def is_hub(self) -> bool:
+        return self._server is not None
+
+    async def start(self, handler: DeliveryHandler) -> None:
+        self.handler = handler
+        self._closing = False
+        self._reader, self._writer = await self._open()
+        self._listener = asyncio.create_task(self._listen())
+
+    async def publish(self, document_id: str, payload: str) -> None:
+        if self.handler:
+            self.handler(document_id, payload)
+
+        writer = self._writer
+        if writer is None or writer.is_closing():
+            return
+        try:
+            writer.write(json.dumps([document_id, payload]).encode() + b"\n")
+            await writer.drain()
+        except ConnectionError as e:
+            logger.warning(f"Backplane publish failed: {str(e)}")
+
+    async def stop(self) -> None:
+        self._closing = True
+        if self._listener:
+            self._listener.cancel()
+            self._listener = None
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        for writer in list(self._hub_clients):
+            writer.close()
+        self._hub_clients.clear()
+        if self._server:
+            self._server.close()
+            self._server = None
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+        if self._lock_fd is not None:
+            os.close(self._lock_fd)
+            self._lock_fd = None
+        await super().stop()
+
+    # Client side
+
+    async def _open(self):
+        """Connect to the hub, hosting it ourselves if nobody else does"""
+        delay = 0.05
+        while True:
+            if not self.is_hub and self._acquire_hub_lock():
+                await self._start_hub()
+            try:
+                return await asyncio.open_unix_connection(
+                    self.path, limit=self.max_frame_size
+                )
+            except (FileNotFoundError, ConnectionRefusedError):
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 1.0)
+
+    async def _listen(self):
+        while not self._closing:
+            try:
+                line = await self._reader.readline()
+            except (ConnectionError, ValueError) as e:
+                logger.warning(f"Backplane read error: {str(e)}")
+                line = b""
+
+            if not line:
+                if self._closing:
+                    return
+                logger.warning("Backplane hub connection lost, reconnecting")
+                self._writer.close()
+                self._reader, self._writer = await self._open()
+                continue
+
+            try:
+                document_id, payload = json.loads(line)
+            except ValueError as e:
+                logger.error(f"Malformed backplane frame: {str(e)}")
+                continue
+            if self.handler:
+                self.handler(document_id, payload)
+
+    # Hub side
+
+    def _acquire_hub_lock(self) -> bool:
+        fd = os.open(self.path + ".lock", os.O_CREAT | os.O_RDWR, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            return False
+        self._lock_fd = fd
+        return True
+
+    async def _start_hub(self):
+        # Holding the lock means any existing socket file is stale
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(
+            self._serve_client, path=self.path, limit=self.max_frame_size
+        )
+        logger.info(f"Backplane hub listening on {self.path}")
+
+    async def _serve_client(self, reader: asyncio.StreamReader,
+                            writer: asyncio.StreamWriter):
+        self._hub_clients.add(writer)
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                for client in list(self._hub_clients):
+                    if client is writer:
+                        continue
+                    if client.transport.get_write_buffer_size() > self.max_frame_size:
+                        logger.warning("Backplane client is not keeping up, disconnecting")
+                        self._hub_clients.discard(client)
+                        client.close()
+                        continue
+                    client.write(line)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Backplane hub client error: {str(e)}")
+        finally:
+            self._hub_clients.discard(writer)
+            writer.close()
+
+
+def create_backplane(kind: Optional[str] = None) -> Backplane:
+    """Build the backplane selected by settings.BACKPLANE"""
+    kind = (kind or settings.BACKPLANE).lower()
+    if kind == "memory":
+        return InProcessBackplane()
+    if kind == "unix":
+        return UnixSocketBackplane()
+    raise ValueError(f"Unknown backplane: {kind}")
@@ -0,0 +1,157 @@
+"""WebSocket broadcast engine"""
+import asyncio
+import json
+import logging
+from typing import Any, Callable, Dict, Iterable, Optional, Set
+from fastapi import WebSocket
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+def serialize_message(message: Dict[str, Any]) -> str:
+    """Serialize a message once, the same way WebSocket.send_json does"""
+    return json.dumps(message, separators=(",", ":"), ensure_ascii=False)
+
+
+class SocketChannel:
+    """Bounded outbound queue and sender task for a single WebSocket"""
+
+    def __init__(self, websocket: WebSocket, queue_size: int, send_timeout: float,
+                 on_stuck: Callable[[WebSocket], None]):
+        self.websocket = websocket
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.send_timeout = send_timeout
+        self.on_stuck = on_stuck
+        self.closed = False
+        self.task = asyncio.create_task(self._sender())
+
+    def offer(self, payload: str) -> bool:
+        """Queue a payload without waiting; False if the queue is full"""
+        if self.closed:
+            return False
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def _sender(self):
+        """Drain the queue, giving each send at most send_timeout seconds"""
+        while True:
+            payload = await self.queue.get()
+            try:
+                await asyncio.wait_for(
+                    self.websocket.send_text(payload),
+                    timeout=self.send_timeout
+                )
+            except asyncio.TimeoutError:
+                logger.warning("WebSocket send timed out, dropping connection")
+                self.on_stuck(self.websocket)
+                return
+            except Exception as e:
+                logger.error(f"WebSocket send error: {str(e)}")
+                self.on_stuck(self.websocket)
+                return
+            finally:
+                self.queue.task_done()
+
+    async def drain(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for queued payloads to be sent; False if
+        they were not, or the sender stopped first"""
+        sent = asyncio.ensure_future(self.queue.join())
+        done, _ = await asyncio.wait(
+            {sent, self.task}, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+        )
+        sent.cancel()
+        return sent in done
+
+    def close(self):
+        """Stop the sender task and discard queued payloads"""
+        self.closed = True
+        if self.task is not asyncio.current_task():
+            self.task.cancel()
+
+
+class BroadcastEngine:
+    """Fan out messages to many WebSockets concurrently.
+
+    Every registered socket gets its own bounded queue and sender task, so a
+    slow client only ever delays itself. Sockets whose queue overflows or
+    whose send exceeds the timeout are dropped and reported via on_drop.
+    """
+
+    def __init__(self, queue_size: Optional[int] = None,
+                 send_timeout: Optional[float] = None,
+                 on_drop: Optional[Callable[[WebSocket], None]] = None):
+        self.queue_size = queue_size or settings.BROADCAST_QUEUE_SIZE
+        self.send_timeout = send_timeout or settings.BROADCAST_SEND_TIMEOUT
+        self.on_drop = on_drop
+        self.channels: Dict[WebSocket, SocketChannel] = {}
+        self._closing: Set[asyncio.Task] = set()  # closes of dropped sockets
+
+    def register(self, websocket: WebSocket) -> None:
+        """Start an outbound channel for a newly accepted socket"""
+        if websocket not in self.channels:
+            self.channels[websocket] = SocketChannel(
+                websocket, self.queue_size, self.send_timeout, self.drop
+            )
+
+    def unregister(self, websocket: WebSocket) -> None:
+        """Stop the outbound channel of a socket that has gone away"""
+        channel = self.channels.pop(websocket, None)
+        if channel:
+            channel.close()
+
+    def drop(self, websocket: WebSocket) -> None:
+        """Forcefully remove a stuck socket and close it in the background"""
+        if websocket not in self.channels:
+            return
+        self.unregister(websocket)
+        task = asyncio.create_task(self._close_socket(websocket))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+        if self.on_drop:
+            self.on_drop(websocket)
+
+    async def flush(self, websocket: WebSocket) -> bool:
+        """Wait for a socket's queued messages to go out, at most send_timeout"""
+        channel = self.channels.get(websocket)
+        if channel is None:
+            return False
+        return await channel.drain(self.send_timeout)
+
+    async def _close_socket(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1011), timeout=self.send_timeout)
+        except Exception as e:
+            logger.debug(f"Error closing dropped WebSocket: {str(e)}")
+
+    def broadcast(self, websockets: Iterable[WebSocket], message: Dict[str, Any]) -> int:
+        """Serialize a message once and queue it for every socket"""
+        return self.broadcast_payload(websockets, serialize_message(message))
+
+    def broadcast_payload(self, websockets: Iterable[WebSocket], payload: str) -> int:
+        """Queue an already serialized payload; returns the number of sockets reached"""
+        delivered = 0
+        stuck = []
+        for websocket in websockets:
+            channel = self.channels.get(websocket)
+            if channel is None:
+                continue
+            if channel.offer(payload):
+                delivered += 1
+            else:
+                stuck.append(websocket)
+
+        for websocket in stuck:
+            logger.warning("WebSocket outbound queue full, dropping connection")
+            self.drop(websocket)
+        return delivered
+
+    async def close(self):
+        """Stop all sender tasks and finish closing dropped sockets"""
+        for websocket in list(self.channels):
+            self.unregister(websocket)
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
@@ -1,10 +1,13 @@
-from typing import Dict, Any
+from typing import Dict, Any, Optional
 from tests.constants.test_messages import MessageType
 from tests.constants.message_loader import MessageLoader
+from app.services.transcription import TranscriptionService
+from app.utils.audio import parse_wav, validate_audio_format
 
 class CommandHandler:
-    def __init__(self):
+    def __init__(self, transcriber: Optional[TranscriptionService] = None):
         self.message_loader = MessageLoader()
+        self.transcriber = transcriber or TranscriptionService()
         self.supported_commands = [
             # Basic editing commands
             "delete", "insert", "replace", "undo",
@@ -20,6 +23,8 @@ class CommandHandler:
         ]
         self.is_redlining = False
         self.current_position = 0
+        # Priming the recognizer with the command vocabulary improves accuracy
+        self.command_prompt = ", ".join(self.supported_commands)
 
     def process_command(self, command: str) -> Dict[str, Any]:
         """Process text command"""
@@ -97,17 +102,24 @@ class CommandHandler:
                 )
             }
 
-    def handle_voice_command(self, audio: bytes) -> Dict[str, Any]:
-        """Handle voice command"""
+    async def handle_voice_command(self, audio: bytes,
+                                   audio_format: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Handle voice command: a WAV file, or raw PCM in audio_format
+        (16 kHz mono 16-bit by default)"""
         if not audio:
             return {
                 "error": self.message_loader.get_message(MessageType.ERROR_NO_SELECTION)
             }
 
         try:
-            # Process audio to text (placeholder)
-            command = "sample command from voice"
-            return self.process_command(command)
+            if validate_audio_format(audio):
+                wav = parse_wav(audio)
+                audio, audio_format = wav.pcm, wav.format
+            transcript = await self.transcriber.transcribe(audio, audio_format,
+                                                           prompt=self.command_prompt)
+            result = dict(self.process_command(transcript.text) or {})
+            result["transcript"] = transcript.to_dict()
+            return result
         except Exception as e:
             return {
                 "error": self.message_loader.get_message(
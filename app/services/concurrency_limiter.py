@@ -0,0 +1,202 @@
+"""Adaptive concurrency limit with priority lanes for upstream LLM calls"""
+import asyncio
+import logging
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+import groq
+import httpx
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Lanes, highest priority first
+INTERACTIVE = 0
+BACKGROUND = 1
+LANE_NAMES = ("interactive", "background")
+
+# Kinds of call with their own latency baseline
+DEFAULT_KIND = "single"
+STREAM_KIND = "stream"
+BATCH_KIND = "batch"
+
+
+def is_overload(error: BaseException) -> bool:
+    """Whether an error means upstream is pushing back on our request rate"""
+    # An httpx read timeout reaches us wrapped as groq.APITimeoutError,
+    # which is not an asyncio.TimeoutError
+    if isinstance(error, (asyncio.TimeoutError, groq.APITimeoutError, httpx.TimeoutException)):
+        return True
+    return isinstance(error, groq.APIStatusError) and error.status_code in (429, 503)
+
+
+class _LatencyBaseline:
+    """Recent minimum latency of one kind of call, re-measured every window samples"""
+    __slots__ = ("minimum", "window_min", "samples")
+
+    def __init__(self):
+        self.minimum: Optional[float] = None
+        self.window_min: Optional[float] = None
+        self.samples = 0
+
+    def record(self, latency: float, window: int) -> float:
+        """Add a sample and return the minimum to compare it with"""
+        self.samples += 1
+        if self.window_min is None or latency < self.window_min:
+            self.window_min = latency
+        if self.minimum is None or latency < self.minimum:
+            self.minimum = latency
+        if self.samples % window == 0:
+            self.minimum, self.window_min = self.window_min, None
+        return self.minimum
+
+
+class _Slot:
+    __slots__ = ("limiter", "priority", "kind", "started")
+
+    def __init__(self, limiter: "AdaptiveLimiter", priority: int, kind: str):
+        self.limiter = limiter
+        self.priority = priority
+        self.kind = kind
+        self.started = 0.0
+
+    async def __aenter__(self):
+        await self.limiter.acquire(self.priority)
+        self.started = time.monotonic()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        latency = time.monotonic() - self.started
+        if exc is None:
+            self.limiter.on_success(latency, self.started, self.kind)
+        elif is_overload(exc):
+            self.limiter.on_overload(self.started)
+        self.limiter.release()
+        return False
+
+
+class AdaptiveLimiter:
+    """AIMD concurrency limit driven by latency and upstream pushback.
+
+    Every successful call whose latency stays within ``latency_tolerance``
+    times the recent minimum grows the limit by one per limit's worth of
+    calls; a slower call, a 429/503 or a timeout multiplies it by
+    ``backoff_ratio``. The minimum is kept per kind of call, so a large
+    batched or streamed call is only compared with others like it, and is
+    re-measured every ``window`` samples so it can follow upstream
+    drifting slower. Calls that started before the last decrease do not
+    trigger another one, so a burst of slow responses backs off once
+    rather than per response.
+
+    Callers queue in priority lanes and a freed slot always goes to the
+    oldest waiter of the highest-priority non-empty lane.
+    """
+
+    def __init__(self, min_limit: Optional[int] = None, max_limit: Optional[int] = None,
+                 initial_limit: Optional[int] = None,
+                 latency_tolerance: Optional[float] = None,
+                 backoff_ratio: Optional[float] = None,
+                 window: int = 100):
+        self.min_limit = min_limit or settings.GROQ_MIN_CONCURRENCY
+        self.max_limit = max_limit or settings.GROQ_MAX_CONCURRENCY
+        initial = initial_limit or settings.GROQ_INITIAL_CONCURRENCY
+        self.limit = float(max(self.min_limit, min(self.max_limit, initial)))
+        self.latency_tolerance = latency_tolerance or settings.GROQ_LATENCY_TOLERANCE
+        self.backoff_ratio = backoff_ratio or settings.GROQ_BACKOFF_RATIO
+        self.window = window
+        self.in_flight = 0
+        self.lanes: List[Deque[asyncio.Future]] = [deque() for _ in LANE_NAMES]
+        self.baselines: Dict[str, _LatencyBaseline] = {}
+        self._last_decrease = 0.0
+        self.decreases = 0
+
+    @property
+    def capacity(self) -> int:
+        return int(self.limit)
+
+    def slot(self, priority: int = INTERACTIVE, kind: str = DEFAULT_KIND) -> _Slot:
+        """Async context manager holding one upstream slot for the given lane;
+        kind names the latency baseline the call is measured against"""
+        return _Slot(self, priority, kind)
+
+    async def acquire(self, priority: int = INTERACTIVE):
+        """Wait for a slot; higher-priority lanes are served first"""
+        # Queued waiters are only left behind when every slot is taken
+        if self.in_flight < self.capacity:
+            self.in_flight += 1
+            return
+
+        future = asyncio.get_running_loop().create_future()
+        self.lanes[priority].append(future)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed over just as we were cancelled
+                self.release()
+            else:
+                self.lanes[priority].remove(future)
+            raise
+
+    def release(self):
+        self.in_flight -= 1
+        self._wake()
+
+    def _wake(self):
+        while self.in_flight < self.capacity:
+            future = self._next_waiter()
+            if future is None:
+                return
+            self.in_flight += 1
+            future.set_result(None)
+
+    def _next_waiter(self) -> Optional[asyncio.Future]:
+        for lane in self.lanes:
+            while lane:
+                future = lane.popleft()
+                if not future.done():
+                    return future
+        return None
+
+    def on_success(self, latency: float, started: float = 0.0, kind: str = DEFAULT_KIND):
+        """Record a completed call and adjust the limit"""
+        baseline = self.baselines.get(kind)
+        if baseline is None:
+            baseline = self.baselines[kind] = _LatencyBaseline()
+        min_latency = baseline.record(latency, self.window)
+
+        if latency > min_latency * self.latency_tolerance:
+            self._decrease("latency", started)
+        elif self.in_flight >= self.capacity:
+            # Only grow when the current limit is actually being used
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+            self._wake()
+
+    def on_overload(self, started: float = 0.0):
+        """Upstream rejected or timed out a call: back off"""
+        self._decrease("overload", started)
+
+    def _decrease(self, reason: str, started: float):
+        if started and started < self._last_decrease:
+            return
+        self._last_decrease = time.monotonic()
+        limit = max(self.min_limit, self.limit * self.backoff_ratio)
+        if int(limit) < self.capacity:
+            logger.info(f"Upstream concurrency limit {self.capacity} -> {int(limit)} ({reason})")
+        if limit < self.limit:
+            self.decreases += 1
+        self.limit = limit
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        """Callers waiting for a slot, in one lane or overall"""
+        lanes = self.lanes if priority is None else [self.lanes[priority]]
+        return sum(1 for lane in lanes for future in lane if not future.done())
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.capacity,
+            "in_flight": self.in_flight,
+            "queued": {name: self.queue_depth(lane) for lane, name in enumerate(LANE_NAMES)},
+            "min_latency": {kind: baseline.minimum for kind, baseline in self.baselines.items()},
+            "decreases": self.decreases
+        }
@@ -0,0 +1,138 @@
+"""WebSocket connection bookkeeping for document rooms"""
+import asyncio
+import logging
+from typing import Any, Dict, Optional, Set, Tuple
+from fastapi import WebSocket
+from app.services.backplane import Backplane, create_backplane
+from app.services.broadcast import BroadcastEngine, serialize_message
+
+logger = logging.getLogger(__name__)
+
+
+class ConnectionManager:
+    """Index open WebSockets by document and user.
+
+    All bookkeeping is dict/set based so connect and disconnect stay
+    constant-time regardless of how many sockets are open. Broadcasts go
+    through a backplane so rooms span every worker process.
+    """
+
+    def __init__(self, backplane: Optional[Backplane] = None):
+        self.connections: Dict[WebSocket, Tuple[str, str]] = {}  # socket: (document_id, user_id)
+        self.document_sessions: Dict[str, Set[WebSocket]] = {}
+        self.document_users: Dict[str, Dict[str, int]] = {}  # document_id: {user_id: open sockets}
+        self.user_documents: Dict[str, Set[str]] = {}
+        self.user_cursors: Dict[str, Dict[str, int]] = {}  # document_id: {user_id: position}
+        self.broadcaster = BroadcastEngine(on_drop=self.disconnect)
+        self.backplane = backplane or create_backplane()
+        self._backplane_ready: Optional[asyncio.Future] = None
+
+    async def start(self):
+        """Subscribe to the backplane; called lazily on first use"""
+        if self._backplane_ready is None:
+            self._backplane_ready = asyncio.ensure_future(
+                self.backplane.start(self._deliver_local)
+            )
+        await self._backplane_ready
+
+    async def stop(self):
+        """Close every outbound channel and leave the backplane"""
+        await self.broadcaster.close()
+        if self._backplane_ready is not None:
+            await self.backplane.stop()
+            self._backplane_ready = None
+
+    async def connect(self, websocket: WebSocket, document_id: str, user_id: str):
+        await self.start()
+        await websocket.accept()
+        self.connections[websocket] = (document_id, user_id)
+        self.document_sessions.setdefault(document_id, set()).add(websocket)
+
+        users = self.document_users.setdefault(document_id, {})
+        users[user_id] = users.get(user_id, 0) + 1
+        self.user_documents.setdefault(user_id, set()).add(document_id)
+        self.user_cursors.setdefault(document_id, {}).setdefault(user_id, 0)
+        self.broadcaster.register(websocket)
+
+        # Broadcast user joined message
+        await self.broadcast_to_document(
+            document_id,
+            {"type": "user_joined", "user_id": user_id}
+        )
+
+    def disconnect(self, websocket: WebSocket, document_id: Optional[str] = None):
+        """Remove a socket from every index; safe to call more than once"""
+        self.broadcaster.unregister(websocket)
+        entry = self.connections.pop(websocket, None)
+        if entry is None:
+            return
+        document_id, user_id = entry
+
+        sessions = self.document_sessions.get(document_id)
+        if sessions is not None:
+            sessions.discard(websocket)
+            if not sessions:
+                del self.document_sessions[document_id]
+
+        users = self.document_users.get(document_id)
+        if users is not None and user_id in users:
+            users[user_id] -= 1
+            if users[user_id] <= 0:
+                del users[user_id]
+                self._forget_user(document_id, user_id)
+            if not users:
+                del self.document_users[document_id]
+
+        logger.info(f"WebSocket connection closed for document: {document_id}")
+
+    def _forget_user(self, document_id: str, user_id: str):
+        """Drop per-user state once a user has no sockets left in a document"""
+        cursors = self.user_cursors.get(document_id)
+        if cursors is not None:
+            cursors.pop(user_id, None)
+            if not cursors:
+                del self.user_cursors[document_id]
+
+        documents = self.user_documents.get(user_id)
+        if documents is not None:
+            documents.discard(document_id)
+            if not documents:
+                del self.user_documents[user_id]
+
+    def get_connection(self, websocket: WebSocket) -> Optional[Tuple[str, str]]:
+        """Reverse lookup of (document_id, user_id) for a socket"""
+        return self.connections.get(websocket)
+
+    def connection_count(self, document_id: str) -> int:
+        """Number of sockets open on a document"""
+        return len(self.document_sessions.get(document_id, ()))
+
+    def user_count(self, document_id: str) -> int:
+        """Number of distinct users with a document open"""
+        return len(self.document_users.get(document_id, ()))
+
+    def update_cursor(self, document_id: str, user_id: str, position: int):
+        """Record a user's cursor position within a document"""
+        if user_id in self.document_users.get(document_id, ()):
+            self.user_cursors.setdefault(document_id, {})[user_id] = position
+
+    def send_to_socket(self, websocket: WebSocket, message: Dict[str, Any]) -> bool:
+        """Queue a message for one local socket only, such as an error frame
+        answering that socket's own request; False if it was not delivered"""
+        return self.broadcaster.broadcast([websocket], message) == 1
+
+    async def flush_socket(self, websocket: WebSocket) -> bool:
+        """Wait briefly for a socket's queued messages to be sent, such as a
+        last error frame before the socket is closed"""
+        return await self.broadcaster.flush(websocket)
+
+    async def broadcast_to_document(self, document_id: str, message: Dict[str, Any]):
+        """Broadcast to all clients viewing the same document, in any worker"""
+        await self.start()
+        await self.backplane.publish(document_id, serialize_message(message))
+
+    def _deliver_local(self, document_id: str, payload: str):
+        """Backplane handler: fan a serialized message out to local sockets"""
+        sessions = self.document_sessions.get(document_id)
+        if sessions:
+            self.broadcaster.broadcast_payload(sessions, payload)
@@ -0,0 +1,56 @@
+"""Coalescing of high-frequency cursor updates"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class CursorCoalescer:
+    """Keep only the latest cursor position per user and flush on a tick.
+
+    Each flush emits one ``cursors`` frame per document containing every
+    position that changed since the previous tick. The ticker only runs
+    while there is something pending.
+    """
+
+    def __init__(self, publish: Callable[[str, Dict[str, Any]], Awaitable[None]],
+                 interval_ms: Optional[int] = None):
+        self.publish = publish
+        self.interval = (interval_ms or settings.CURSOR_FLUSH_INTERVAL_MS) / 1000
+        self.pending: Dict[str, Dict[str, int]] = {}  # document_id: {user_id: position}
+        self.task: Optional[asyncio.Task] = None
+
+    def update(self, document_id: str, user_id: str, position: int):
+        """Record a cursor move; overwrites any unflushed position for the user"""
+        self.pending.setdefault(document_id, {})[user_id] = position
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+
+    async def flush(self):
+        """Send one batched frame per document with pending cursor moves"""
+        pending, self.pending = self.pending, {}
+        for document_id, cursors in pending.items():
+            try:
+                await self.publish(document_id, {
+                    "type": "cursors",
+                    "document_id": document_id,
+                    "cursors": cursors
+                })
+            except Exception as e:
+                logger.error(f"Cursor flush error: {str(e)}")
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            if not self.pending:
+                return
+            await self.flush()
+
+    async def close(self):
+        """Flush anything pending and stop the ticker"""
+        if self.task is not None:
+            self.task.cancel()
+            self.task = None
+        await self.flush()
@@ -1,10 +1,20 @@
-from typing import Dict, Any, List, Optional
+import asyncio
+from typing import Dict, Any, Iterator, List, Optional
 from tests.constants.test_messages import MessageType
 from tests.constants.message_loader import MessageLoader
+from app.services.paragraph_store import Paragraph, TextPool
+from app.services.redline_diff import diff_text, changed_spans, render_redline
+from app.services.lock_manager import ParagraphLockManager
+from app.services.text_merge import (
+    MergeConflict, apply_op, decode_op, merge_edit, op_from_texts, revision_ops
+)
+from app.config import settings
 import logging
 
 logger = logging.getLogger(__name__)
 
+APPENDIX_HEADER = "# Document Change History\n"
+
 class DocumentEditor:
     def __init__(self):
         self.message_loader = MessageLoader()
@@ -12,7 +22,7 @@ class DocumentEditor:
         self.document_states: Dict[str, str] = {}
         self.change_history: Dict[str, List[Dict[str, Any]]] = {}
         self.active_users: Dict[str, Dict[str, Any]] = {}
-        self.paragraph_locks: Dict[str, str] = {}  # paragraph_id: user_id
+        self.locks = ParagraphLockManager()  # edit leases per (doc_id, paragraph_id)
         self.preview_states: Dict[str, Dict[str, Any]] = {}
 
     async def init_document(self, doc_id: str, doc_type: str) -> Dict[str, Any]:
@@ -28,7 +38,8 @@ class DocumentEditor:
             
             self.documents[doc_id] = {
                 "type": doc_type,
-                "paragraphs": {},
+                "paragraphs": {},  # paragraph_id: Paragraph
+                "pool": TextPool(),  # text shared by the document's paragraphs
                 "users": [],
                 "changes": []
             }
@@ -63,7 +74,13 @@ class DocumentEditor:
 
     async def apply_changes(self, doc_id: str, paragraph_id: str, 
                           changes: Dict[str, Any], user_id: str) -> Dict[str, Any]:
-        """Apply changes to document"""
+        """Apply changes to document.
+
+        changes carries either the full "new" text or a compact "op"
+        ([position, deleted, inserted]). With a "base_version", an edit made
+        on an older version is merged with the revisions applied since;
+        without one the edit replaces the current text.
+        """
         try:
             # Check document exists
             if doc_id not in self.documents:
@@ -71,35 +88,50 @@ class DocumentEditor:
                     "error": self.message_loader.get_message(MessageType.ERROR_DOC_NOT_FOUND)
                 }
 
-            # Check paragraph lock
-            if paragraph_id in self.paragraph_locks and self.paragraph_locks[paragraph_id] != user_id:
+            # Check paragraph lock; nothing below awaits, so check and write are atomic
+            holder = self.locks.holder(doc_id, paragraph_id)
+            if holder is not None and holder != user_id:
                 return {
                     "error": self.message_loader.get_message(
                         MessageType.ERROR_PARAGRAPH_LOCKED,
-                        user=self.paragraph_locks[paragraph_id]
-                    )
+                        user=holder
+                    ),
+                    "holder": holder
                 }
 
             # Store original if first change
-            if paragraph_id not in self.documents[doc_id]["paragraphs"]:
-                self.documents[doc_id]["paragraphs"][paragraph_id] = {
-                    "original": changes["original"],
-                    "current": changes["original"],
-                    "history": []
+            doc = self.documents[doc_id]
+            paragraph = doc["paragraphs"].get(paragraph_id)
+            if paragraph is None:
+                paragraph = doc["paragraphs"][paragraph_id] = Paragraph(
+                    changes["original"], doc["pool"]
+                )
+
+            try:
+                new_text = self._resolve_edit(paragraph, changes)
+            except MergeConflict as e:
+                logger.info(f"Edit conflict on paragraph {paragraph_id} of {doc_id}: {str(e)}")
+                return {
+                    "error": self.message_loader.get_message(MessageType.ERROR_EDIT_CONFLICT),
+                    "conflict": True,
+                    "text": paragraph.current,
+                    "version": paragraph.version
                 }
 
-            # Apply changes
-            self.documents[doc_id]["paragraphs"][paragraph_id]["current"] = changes["new"]
-            self.documents[doc_id]["paragraphs"][paragraph_id]["history"].append({
-                "user_id": user_id,
-                "timestamp": "current_time",
-                "change": changes["new"],
-                "original": changes["original"]
-            })
+            # Apply changes; history keeps only the delta from the previous version
+            if new_text is not None:
+                paragraph.apply(new_text, user_id, "current_time",
+                                changes.get("original", paragraph.current))
+                if paragraph.appendix is not None:
+                    # Extend the cached appendix section rather than rebuilding it
+                    paragraph.appendix += "\n" + self._appendix_line(
+                        new_text, user_id, "current_time"
+                    )
 
             return {
                 "message": self.message_loader.get_message(MessageType.CHANGES_APPLIED),
-                "html": self._generate_paragraph_html(doc_id, paragraph_id)
+                "version": paragraph.version,
+                "changes": self._paragraph_changes(doc_id, paragraph_id)
             }
         except Exception as e:
             return {
@@ -109,21 +141,66 @@ class DocumentEditor:
                 )
             }
 
+    def _resolve_edit(self, paragraph: Paragraph, changes: Dict[str, Any]) -> Optional[str]:
+        """Full text after an edit, or None if the edit is already in it"""
+        base_version = changes.get("base_version")
+        if base_version is None:
+            if "op" in changes:
+                return apply_op(paragraph.current, decode_op(changes["op"]))
+            return changes["new"]
+
+        behind = paragraph.version - base_version
+        if behind < 0 or behind > settings.MERGE_WINDOW:
+            raise MergeConflict(f"Base version {base_version} is outside the merge window")
+        base = paragraph.text_at(base_version)
+        if "op" in changes:
+            op = decode_op(changes["op"])
+        else:
+            op = op_from_texts(base, changes["new"])
+        applied = revision_ops(len(base), paragraph.deltas_since(base_version))
+        merged = merge_edit(base, op, applied)
+        return apply_op(paragraph.current, merged) if merged is not None else None
+
+    async def lock_paragraph(self, doc_id: str, paragraph_id: str, user_id: str,
+                             timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Take the edit lease on a paragraph, waiting in line up to timeout seconds.
+        The lease must be renewed with heartbeat_paragraph before it expires."""
+        try:
+            if timeout == 0:
+                lease = self.locks.try_acquire(doc_id, paragraph_id, user_id)
+                if lease is None:
+                    raise asyncio.TimeoutError()
+            else:
+                lease = await self.locks.acquire(doc_id, paragraph_id, user_id, timeout)
+            return {"lease": lease.to_dict()}
+        except asyncio.TimeoutError:
+            return {
+                "error": self.message_loader.get_message(
+                    MessageType.ERROR_PARAGRAPH_LOCKED,
+                    user=self.locks.holder(doc_id, paragraph_id)
+                )
+            }
+
+    def heartbeat_paragraph(self, doc_id: str, paragraph_id: str, token: str) -> bool:
+        """Keep a paragraph lease alive; False if it has been lost"""
+        return self.locks.heartbeat(doc_id, paragraph_id, token)
+
+    def unlock_paragraph(self, doc_id: str, paragraph_id: str, token: str) -> bool:
+        """Give up a paragraph lease, handing it to the next editor in line"""
+        return self.locks.release(doc_id, paragraph_id, token)
+
     async def preview_changes(self, doc_id: str, paragraph_id: str, 
                             suggestion: str) -> Dict[str, Any]:
         """Generate preview of changes"""
         try:
-            original = self.documents[doc_id]["paragraphs"][paragraph_id]["current"]
-            preview_html = f"""
-            <div class="preview-panel">
-                <div class="original"><strike>{original}</strike></div>
-                <div class="suggestion"><highlight>{suggestion}</highlight></div>
-            </div>
-            """
+            original = self.documents[doc_id]["paragraphs"][paragraph_id].current
+            spans = diff_text(original, suggestion)
+            preview_html = f'<div class="preview-panel">{render_redline(spans)}</div>'
             
             self.preview_states[paragraph_id] = {
                 "original": original,
                 "suggestion": suggestion,
+                "changes": changed_spans(spans),
                 "html": preview_html
             }
             
@@ -142,22 +219,9 @@ class DocumentEditor:
     async def generate_appendix(self, doc_id: str) -> Dict[str, Any]:
         """Generate change history appendix"""
         try:
-            appendix = ["# Document Change History\n"]
-            doc = self.documents[doc_id]
-            
-            for para_id, para_data in doc["paragraphs"].items():
-                if para_data["history"]:
-                    appendix.append(f"\n## Paragraph {para_id}")
-                    appendix.append(f"Original: {para_data['original']}")
-                    for change in para_data["history"]:
-                        appendix.append(
-                            f"Changed to: {change['change']} "
-                            f"(by user {change['user_id']} at {change['timestamp']})"
-                        )
-            
             return {
                 "message": self.message_loader.get_message(MessageType.APPENDIX_GENERATED),
-                "appendix": "\n".join(appendix)
+                "appendix": "".join(self.iter_appendix(doc_id))
             }
         except Exception as e:
             return {
@@ -167,12 +231,38 @@ class DocumentEditor:
                 )
             }
 
-    def _generate_paragraph_html(self, doc_id: str, paragraph_id: str) -> str:
-        """Generate HTML for paragraph with changes"""
-        para_data = self.documents[doc_id]["paragraphs"][paragraph_id]
-        return f"""
-        <div class="paragraph" id="{paragraph_id}">
-            <div class="original"><strike>{para_data['original']}</strike></div>
-            <div class="current"><highlight>{para_data['current']}</highlight></div>
-        </div>
-        """ 
\ No newline at end of file
+    def iter_appendix(self, doc_id: str) -> Iterator[str]:
+        """Yield the change history appendix piece by piece.
+
+        Each paragraph's section is cached, so only paragraphs never
+        rendered before are built, and only as the caller reaches them.
+        """
+        paragraphs = self.documents[doc_id]["paragraphs"]
+        yield APPENDIX_HEADER
+        for para_id, paragraph in list(paragraphs.items()):
+            if paragraph.revisions:
+                yield "\n" + self._appendix_section(para_id, paragraph)
+
+    def _appendix_section(self, para_id: str, paragraph: Paragraph) -> str:
+        if paragraph.appendix is None:
+            lines = [f"\n## Paragraph {para_id}", f"Original: {paragraph.original}"]
+            lines.extend(
+                self._appendix_line(change["change"], change["user_id"], change["timestamp"])
+                for change in paragraph.history()
+            )
+            paragraph.appendix = "\n".join(lines)
+        return paragraph.appendix
+
+    @staticmethod
+    def _appendix_line(text: str, user_id: str, timestamp: str) -> str:
+        return f"Changed to: {text} (by user {user_id} at {timestamp})"
+
+    def get_paragraph_version(self, doc_id: str, paragraph_id: str, version: int) -> str:
+        """Text of a paragraph at a version; 0 is the original"""
+        return self.documents[doc_id]["paragraphs"][paragraph_id].text_at(version)
+
+    def _paragraph_changes(self, doc_id: str, paragraph_id: str) -> List[Dict[str, Any]]:
+        """Redline of a paragraph as changed spans against its original"""
+        paragraph = self.documents[doc_id]["paragraphs"][paragraph_id]
+        return changed_spans(diff_text(paragraph.original, paragraph.current))
+
@@ -0,0 +1,190 @@
+"""Per-paragraph edit leases with heartbeats and fair waiting"""
+import asyncio
+import logging
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Deque, Dict, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# How many acquisitions between sweeps of expired, unwatched leases
+SWEEP_EVERY = 256
+
+LockKey = Tuple[str, str]  # (document_id, paragraph_id)
+
+
+class Lease:
+    __slots__ = ("document_id", "paragraph_id", "holder", "token", "expires_at", "clock")
+
+    def __init__(self, document_id: str, paragraph_id: str, holder: str, ttl: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self.document_id = document_id
+        self.paragraph_id = paragraph_id
+        self.holder = holder
+        self.token = uuid.uuid4().hex
+        self.clock = clock
+        self.expires_at = clock() + ttl
+
+    def expired(self, now: float) -> bool:
+        return now >= self.expires_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "document_id": self.document_id,
+            "paragraph_id": self.paragraph_id,
+            "holder": self.holder,
+            "token": self.token,
+            "expires_in": max(0.0, self.expires_at - self.clock())
+        }
+
+
+class _LockEntry:
+    __slots__ = ("lease", "waiters")
+
+    def __init__(self):
+        self.lease: Optional[Lease] = None
+        self.waiters: Deque[Tuple[str, asyncio.Future]] = deque()
+
+
+class ParagraphLockManager:
+    """Edit leases keyed by (document, paragraph).
+
+    A lease is held by one user for ``lease_ttl`` seconds and must be kept
+    alive with heartbeats; a holder that stops heartbeating (a crashed
+    client) simply loses it. Users waiting for a paragraph are served in
+    arrival order. Each key has its own entry, created on first use and
+    dropped once it is free with nobody waiting, so editors of different
+    paragraphs never wait on each other. ``clock`` gives the current time
+    in seconds; it can be replaced to expire leases without waiting.
+    """
+
+    def __init__(self, lease_ttl: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.lease_ttl = lease_ttl or settings.PARAGRAPH_LEASE_TTL
+        self.clock = clock
+        self.entries: Dict[LockKey, _LockEntry] = {}
+        self.expirations = 0
+        self._acquisitions = 0
+
+    def holder(self, document_id: str, paragraph_id: str) -> Optional[str]:
+        """User currently holding the paragraph, if any"""
+        lease = self._live_lease((document_id, paragraph_id))
+        return lease.holder if lease is not None else None
+
+    def try_acquire(self, document_id: str, paragraph_id: str, holder: str) -> Optional[Lease]:
+        """Take or renew the lease without waiting; None if someone else has it"""
+        key = (document_id, paragraph_id)
+        self._acquisitions += 1
+        if self._acquisitions % SWEEP_EVERY == 0:
+            self.sweep()
+
+        lease = self._live_lease(key)
+        if lease is not None:
+            if lease.holder != holder:
+                return None
+            lease.expires_at = self.clock() + self.lease_ttl
+            return lease
+
+        entry = self.entries.get(key)
+        if entry is not None and entry.waiters:
+            # Free, but already promised to whoever is first in line
+            return None
+        entry = self.entries.setdefault(key, _LockEntry())
+        entry.lease = Lease(document_id, paragraph_id, holder, self.lease_ttl, self.clock)
+        return entry.lease
+
+    async def acquire(self, document_id: str, paragraph_id: str, holder: str,
+                      timeout: Optional[float] = None) -> Lease:
+        """Wait in line for the lease; raises asyncio.TimeoutError after timeout"""
+        lease = self.try_acquire(document_id, paragraph_id, holder)
+        if lease is not None:
+            return lease
+
+        key = (document_id, paragraph_id)
+        entry = self.entries.setdefault(key, _LockEntry())
+        future = asyncio.get_running_loop().create_future()
+        entry.waiters.append((holder, future))
+        deadline = self.clock() + timeout if timeout is not None else None
+        try:
+            while True:
+                # Wake up when the current lease would expire, to take over
+                # from a holder that stopped heartbeating
+                now = self.clock()
+                wait = entry.lease.expires_at - now if entry.lease is not None else None
+                if deadline is not None:
+                    wait = deadline - now if wait is None else min(wait, deadline - now)
+                if wait is not None:
+                    wait = max(wait, 0.0)
+                try:
+                    return await asyncio.wait_for(asyncio.shield(future), wait)
+                except asyncio.TimeoutError:
+                    self._live_lease(key)
+                    if future.done():
+                        return future.result()
+                    if deadline is not None and self.clock() >= deadline:
+                        raise
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Granted just as we gave up: pass it on
+                self.release(document_id, paragraph_id, future.result().token)
+            else:
+                future.cancel()
+                self._forget_waiter(key, future)
+            raise
+
+    def heartbeat(self, document_id: str, paragraph_id: str, token: str) -> bool:
+        """Extend a lease; False means it was lost and edits must stop"""
+        lease = self._live_lease((document_id, paragraph_id))
+        if lease is None or lease.token != token:
+            return False
+        lease.expires_at = self.clock() + self.lease_ttl
+        return True
+
+    def release(self, document_id: str, paragraph_id: str, token: str) -> bool:
+        key = (document_id, paragraph_id)
+        entry = self.entries.get(key)
+        if entry is None or entry.lease is None or entry.lease.token != token:
+            return False
+        self._hand_over(key, entry)
+        return True
+
+    def _live_lease(self, key: LockKey) -> Optional[Lease]:
+        entry = self.entries.get(key)
+        if entry is None or entry.lease is None:
+            return None
+        if entry.lease.expired(self.clock()):
+            logger.info(f"Lease on paragraph {key[1]} of {key[0]} held by "
+                        f"{entry.lease.holder} expired")
+            self.expirations += 1
+            self._hand_over(key, entry)
+        return entry.lease
+
+    def _hand_over(self, key: LockKey, entry: _LockEntry):
+        entry.lease = None
+        while entry.waiters:
+            holder, future = entry.waiters.popleft()
+            if not future.done():
+                entry.lease = Lease(key[0], key[1], holder, self.lease_ttl, self.clock)
+                future.set_result(entry.lease)
+                return
+        del self.entries[key]
+
+    def _forget_waiter(self, key: LockKey, future: asyncio.Future):
+        entry = self.entries.get(key)
+        if entry is None:
+            return
+        entry.waiters = deque(w for w in entry.waiters if w[1] is not future)
+        if entry.lease is None and not entry.waiters:
+            del self.entries[key]
+
+    def sweep(self):
+        """Drop expired leases nobody has looked at since"""
+        now = self.clock()
+        for key, entry in list(self.entries.items()):
+            if entry.lease is not None and entry.lease.expired(now):
+                self._live_lease(key)
+
+    def __len__(self) -> int:
+        return len(self.entries)
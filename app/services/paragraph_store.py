@@ -0,0 +1,119 @@
+"""Compact paragraph text with delta-encoded revision history"""
+from typing import Any, Dict, Iterator, List, Optional
+from app.services.redline_diff import common_prefix_length, common_suffix_length
+
+# A full copy of the text is kept every KEYFRAME_INTERVAL revisions so
+# rebuilding an old version never replays more than that many deltas
+KEYFRAME_INTERVAL = 32
+
+
+class TextPool:
+    """Deduplicates identical text blobs so each is stored once"""
+
+    __slots__ = ("blobs",)
+
+    def __init__(self):
+        self.blobs: Dict[str, str] = {}
+
+    def intern(self, text: str) -> str:
+        return self.blobs.setdefault(text, text)
+
+    def __len__(self) -> int:
+        return len(self.blobs)
+
+
+def encode_delta(previous: str, new: str) -> tuple:
+    """(prefix, suffix, inserted): new == previous[:prefix] + inserted + previous[len-suffix:]"""
+    prefix = common_prefix_length(previous, new)
+    suffix = common_suffix_length(previous, new, min(len(previous), len(new)) - prefix)
+    return prefix, suffix, new[prefix:len(new) - suffix]
+
+
+def apply_delta(previous: str, prefix: int, suffix: int, inserted: str) -> str:
+    return previous[:prefix] + inserted + previous[len(previous) - suffix:]
+
+
+class Revision:
+    __slots__ = ("user_id", "timestamp", "base", "prefix", "suffix", "inserted", "keyframe")
+
+    def __init__(self, user_id: str, timestamp: str, base: Optional[str], prefix: int, suffix: int,
+                 inserted: str, keyframe: Optional[str] = None):
+        self.user_id = user_id
+        self.timestamp = timestamp
+        self.base = base  # what the client said it changed; None if the previous version
+        self.prefix = prefix
+        self.suffix = suffix
+        self.inserted = inserted
+        self.keyframe = keyframe
+
+
+class Paragraph:
+    """One paragraph: its original, current text and revision deltas.
+
+    Version 0 is the original; version n is the text after the n-th
+    revision and is rebuilt on demand from the nearest keyframe.
+    """
+
+    __slots__ = ("original", "current", "revisions", "pool", "appendix")
+
+    def __init__(self, original: str, pool: TextPool):
+        self.pool = pool
+        self.original = pool.intern(original)
+        self.current = self.original
+        self.revisions: List[Revision] = []
+        self.appendix: Optional[str] = None  # rendered appendix section, built on demand
+
+    def apply(self, new: str, user_id: str, timestamp: str, base: str):
+        """Record a new version of the text"""
+        # Only long-lived blobs go through the pool; superseded current
+        # texts must stay collectable
+        previous = self.current
+        prefix, suffix, inserted = encode_delta(previous, new)
+        keyframe = None
+        if (len(self.revisions) + 1) % KEYFRAME_INTERVAL == 0:
+            keyframe = new = self.pool.intern(new)
+        self.revisions.append(Revision(
+            self.pool.intern(user_id), self.pool.intern(timestamp),
+            None if base == previous else self.pool.intern(base),
+            prefix, suffix, inserted, keyframe
+        ))
+        self.current = new
+
+    @property
+    def version(self) -> int:
+        return len(self.revisions)
+
+    def text_at(self, version: int) -> str:
+        """Rebuild the text as it was at the given version"""
+        if version < 0 or version > len(self.revisions):
+            raise IndexError(f"Paragraph has no version {version}")
+        if version == len(self.revisions):
+            return self.current
+
+        start, text = 0, self.original
+        for index in range(version - 1, -1, -1):
+            if self.revisions[index].keyframe is not None:
+                start, text = index + 1, self.revisions[index].keyframe
+                break
+        for revision in self.revisions[start:version]:
+            text = apply_delta(text, revision.prefix, revision.suffix, revision.inserted)
+        return text
+
+    def deltas_since(self, version: int) -> List[tuple]:
+        """(prefix, suffix, inserted) for every revision after version"""
+        return [(r.prefix, r.suffix, r.inserted) for r in self.revisions[version:]]
+
+    def history(self) -> Iterator[Dict[str, Any]]:
+        """Revisions as history entries, rebuilding each version's text once"""
+        text = self.original
+        for revision in self.revisions:
+            previous = text
+            text = revision.keyframe or apply_delta(
+                text, revision.prefix, revision.suffix, revision.inserted
+            )
+            yield {
+                "user_id": revision.user_id,
+                "timestamp": revision.timestamp,
+                "change": text,
+                "original": previous if revision.base is None else revision.base
+            }
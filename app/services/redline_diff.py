@@ -0,0 +1,183 @@
+"""Word- and character-level diffs for redline rendering"""
+import re
+from difflib import SequenceMatcher
+from functools import lru_cache
+from html import escape
+from typing import Any, Dict, List, Sequence, Tuple
+from app.config import settings
+
+EQUAL = "equal"
+INSERT = "insert"
+DELETE = "delete"
+
+DiffSpan = Tuple[str, str]  # (op, text)
+
+TOKEN = re.compile(r"\w+|\s+|[^\w\s]")
+
+# Replaced words at least this similar are diffed character by character
+CHAR_DIFF_RATIO = 0.6
+
+
+def common_prefix_length(a: str, b: str) -> int:
+    # Binary search so the comparisons run as C slice compares, not a Python loop
+    low, high = 0, min(len(a), len(b))
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[low:mid] == b[low:mid]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def common_suffix_length(a: str, b: str, limit: int) -> int:
+    """Length of the shared suffix, looking at most ``limit`` characters back"""
+    low, high = 0, limit
+    la, lb = len(a), len(b)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if a[la - mid:la - low] == b[lb - mid:lb - low]:
+            low = mid
+        else:
+            high = mid - 1
+    return low
+
+
+def _splits_word(text: str, index: int) -> bool:
+    return (0 < index < len(text)
+            and (text[index - 1].isalnum() or text[index - 1] == "_")
+            and (text[index].isalnum() or text[index] == "_"))
+
+
+def diff_text(original: str, new: str, cache: bool = True) -> Tuple[DiffSpan, ...]:
+    """Minimal (op, text) spans turning original into new.
+
+    Joining the equal and delete spans gives back the original; joining
+    the equal and insert spans gives the new text. Results are cached per
+    (original, new) pair unless ``cache`` is false.
+    """
+    return _cached_diff(original, new) if cache else _diff_text(original, new)
+
+
+def _diff_text(original: str, new: str) -> Tuple[DiffSpan, ...]:
+    if original == new:
+        return ((EQUAL, original),) if original else ()
+
+    # Fast path: most edits touch a small part of a long paragraph, so only
+    # the middle between the shared prefix and suffix is diffed, after
+    # widening it to whole words
+    prefix = common_prefix_length(original, new)
+    suffix = common_suffix_length(original, new, min(len(original), len(new)) - prefix)
+    while prefix and (_splits_word(original, prefix) or _splits_word(new, prefix)):
+        prefix -= 1
+    while suffix and (_splits_word(original, len(original) - suffix)
+                      or _splits_word(new, len(new) - suffix)):
+        suffix -= 1
+
+    spans: List[DiffSpan] = []
+    if prefix:
+        spans.append((EQUAL, original[:prefix]))
+    spans.extend(_diff_words(original[prefix:len(original) - suffix],
+                             new[prefix:len(new) - suffix]))
+    if suffix:
+        spans.append((EQUAL, original[len(original) - suffix:]))
+    return tuple(_merge(spans))
+
+
+_cached_diff = lru_cache(maxsize=settings.DIFF_CACHE_SIZE)(_diff_text)
+
+
+def _diff_words(original: str, new: str) -> List[DiffSpan]:
+    old_tokens, new_tokens = TOKEN.findall(original), TOKEN.findall(new)
+    matcher = SequenceMatcher(None, old_tokens, new_tokens, autojunk=False)
+    spans: List[DiffSpan] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        removed, added = "".join(old_tokens[i1:i2]), "".join(new_tokens[j1:j2])
+        if tag == "equal":
+            spans.append((EQUAL, removed))
+        elif tag == "replace" and i2 - i1 == 1 and j2 - j1 == 1:
+            spans.extend(_diff_chars(removed, added))
+        else:
+            if removed:
+                spans.append((DELETE, removed))
+            if added:
+                spans.append((INSERT, added))
+    return spans
+
+
+def _diff_chars(original: str, new: str) -> List[DiffSpan]:
+    """Character spans for one replaced word, or the whole word if too different"""
+    matcher = SequenceMatcher(None, original, new, autojunk=False)
+    if matcher.ratio() < CHAR_DIFF_RATIO:
+        return [(DELETE, original), (INSERT, new)]
+    spans: List[DiffSpan] = []
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        if tag == "equal":
+            spans.append((EQUAL, original[i1:i2]))
+            continue
+        if i2 > i1:
+            spans.append((DELETE, original[i1:i2]))
+        if j2 > j1:
+            spans.append((INSERT, new[j1:j2]))
+    return spans
+
+
+def _merge(spans: Sequence[DiffSpan]) -> List[DiffSpan]:
+    merged: List[DiffSpan] = []
+    for op, text in spans:
+        if not text:
+            continue
+        if merged and merged[-1][0] == op:
+            merged[-1] = (op, merged[-1][1] + text)
+        else:
+            merged.append((op, text))
+    return merged
+
+
+def changed_spans(spans: Sequence[DiffSpan]) -> List[Dict[str, Any]]:
+    """Only the changes, at offsets into the original text: a delete gives
+    the length removed, an insert the text added. Clients already hold the
+    original, so nothing unchanged or deleted is sent again."""
+    changes = []
+    offset = 0
+    for op, text in spans:
+        if op == DELETE:
+            changes.append({"op": op, "offset": offset, "length": len(text)})
+        elif op == INSERT:
+            changes.append({"op": op, "offset": offset, "text": text})
+        if op != INSERT:
+            offset += len(text)
+    return changes
+
+
+def apply_changed_spans(original: str, changes: Sequence[Dict[str, Any]]) -> str:
+    """Rebuild the new text from the original and its changed spans"""
+    parts = []
+    position = 0
+    for change in changes:
+        parts.append(original[position:change["offset"]])
+        position = change["offset"]
+        if change["op"] == DELETE:
+            position += change["length"]
+        else:
+            parts.append(change["text"])
+    parts.append(original[position:])
+    return "".join(parts)
+
+
+def render_redline(spans: Sequence[DiffSpan]) -> str:
+    """Inline HTML: deletions struck out, insertions highlighted"""
+    parts = []
+    for op, text in spans:
+        if op == DELETE:
+            parts.append(f"<strike>{escape(text)}</strike>")
+        elif op == INSERT:
+            parts.append(f"<highlight>{escape(text)}</highlight>")
+        else:
+            parts.append(escape(text))
+    return "".join(parts)
+
+
+def cache_stats() -> Dict[str, int]:
+    info = _cached_diff.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "entries": info.currsize}
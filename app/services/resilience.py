@@ -0,0 +1,175 @@
+"""Retry, backoff, circuit breaking and model failover for upstream LLM calls"""
+import asyncio
+import logging
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+import groq
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+RETRY = "retry"
+FAILOVER = "failover"
+FATAL = "fatal"
+
+
+class UpstreamUnavailableError(Exception):
+    """No model could serve the request before the deadline"""
+
+
+def classify_error(error: Exception) -> str:
+    """Decide whether an upstream error is worth retrying, failing over, or neither"""
+    if isinstance(error, (groq.APIConnectionError, asyncio.TimeoutError)):
+        return RETRY
+    if isinstance(error, groq.APIStatusError):
+        if error.status_code in (408, 409, 429) or error.status_code >= 500:
+            return RETRY
+        if error.status_code == 404:
+            # Usually a decommissioned or unknown model
+            return FAILOVER
+    return FATAL
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    """Seconds requested by a 429/503 Retry-After header, if any"""
+    response = getattr(error, "response", None)
+    if response is None:
+        return None
+    value = response.headers.get("retry-after")
+    try:
+        return max(0.0, float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+class CircuitBreaker:
+    """Consecutive-failure breaker for one model.
+
+    Opens after ``threshold`` failures in a row; after ``cooldown`` seconds a
+    single probe call is let through and its outcome closes or re-opens it.
+    """
+
+    def __init__(self, threshold: int, cooldown: float):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.probing = False
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> bool:
+        state = self.state
+        if state == "closed":
+            return True
+        if state == "half_open" and not self.probing:
+            self.probing = True
+            return True
+        return False
+
+    def record_success(self):
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+
+    def record_failure(self):
+        self.failures += 1
+        if self.probing or self.failures >= self.threshold:
+            self.opened_at = time.monotonic()
+        self.probing = False
+
+
+class ResilientCaller:
+    """Run an upstream call with retries, backoff and model failover.
+
+    Models are tried in order. Each gets up to ``attempts`` tries with
+    full-jitter exponential backoff (or the server's Retry-After) between
+    them, unless its circuit breaker is open. Everything, including waits,
+    must finish within ``deadline`` seconds.
+    """
+
+    def __init__(self, models: Optional[List[str]] = None, attempts: Optional[int] = None,
+                 base_delay: Optional[float] = None, max_delay: Optional[float] = None,
+                 deadline: Optional[float] = None):
+        if models is None:
+            models = [settings.PRIMARY_MODEL]
+            if settings.USE_FALLBACK and settings.FALLBACK_MODEL != settings.PRIMARY_MODEL:
+                models.append(settings.FALLBACK_MODEL)
+        self.models = models
+        self.attempts = attempts or settings.RETRY_ATTEMPTS
+        self.base_delay = base_delay if base_delay is not None else settings.RETRY_DELAY
+        self.max_delay = max_delay if max_delay is not None else settings.RETRY_MAX_DELAY
+        self.deadline = deadline or settings.UPSTREAM_DEADLINE
+        self.breakers: Dict[str, CircuitBreaker] = {
+            model: CircuitBreaker(settings.CIRCUIT_BREAKER_THRESHOLD,
+                                  settings.CIRCUIT_BREAKER_COOLDOWN)
+            for model in models
+        }
+        self.retries = 0
+        self.failovers = 0
+
+    async def call(self, fn: Callable[[str], Awaitable[Any]]) -> Any:
+        """Call fn(model) until it succeeds, the models run out, or time is up"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.deadline
+        last_error: Optional[Exception] = None
+
+        for index, model in enumerate(self.models):
+            if index > 0:
+                self.failovers += 1
+                logger.warning(f"Failing over to model {model}")
+            breaker = self.breakers[model]
+
+            for attempt in range(self.attempts):
+                remaining = deadline - loop.time()
+                if remaining <= 0 or not breaker.allow():
+                    break
+                try:
+                    result = await asyncio.wait_for(fn(model), timeout=remaining)
+                    breaker.record_success()
+                    return result
+                except asyncio.CancelledError:
+                    # Let a cancelled half-open probe be retried by someone else
+                    breaker.probing = False
+                    raise
+                except Exception as e:
+                    kind = classify_error(e)
+                    if kind == FATAL:
+                        # The model answered, it just rejected this request
+                        breaker.record_success()
+                        raise
+                    breaker.record_failure()
+                    last_error = e
+                    logger.warning(f"Upstream call to {model} failed: {str(e)}")
+                    if kind == FAILOVER or attempt + 1 == self.attempts:
+                        break
+
+                    delay = self._backoff(attempt, e)
+                    if loop.time() + delay >= deadline:
+                        break
+                    self.retries += 1
+                    await asyncio.sleep(delay)
+
+        if last_error is not None:
+            raise last_error
+        raise UpstreamUnavailableError("No upstream model available")
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        requested = retry_after(error)
+        if requested is not None:
+            return requested
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "retries": self.retries,
+            "failovers": self.failovers,
+            "breakers": {model: breaker.state for model, breaker in self.breakers.items()}
+        }
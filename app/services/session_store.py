@@ -0,0 +1,265 @@
+"""Bounded per-document session state for the AI processor"""
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DOCUMENT = "default"
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate bytes held by a JSON-like value"""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(estimate_size(k) + estimate_size(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple)):
+        size += sum(estimate_size(item) for item in value)
+    return size
+
+
+class ParagraphState:
+    __slots__ = ("original", "preview", "highlight")
+
+    def __init__(self, original: str = "", preview: Optional[Dict[str, Any]] = None,
+                 highlight: Optional[Dict[str, Any]] = None):
+        self.original = original
+        self.preview = preview
+        self.highlight = highlight
+
+    def size(self) -> int:
+        return (sys.getsizeof(self) + estimate_size(self.original)
+                + estimate_size(self.preview) + estimate_size(self.highlight))
+
+
+class ChangeRecord:
+    __slots__ = ("paragraph_id", "original", "suggestion", "timestamp")
+
+    def __init__(self, paragraph_id: str, original: str, suggestion: str, timestamp: str):
+        self.paragraph_id = paragraph_id
+        self.original = original
+        self.suggestion = suggestion
+        self.timestamp = timestamp
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "paragraph_id": self.paragraph_id,
+            "original": self.original,
+            "suggestion": self.suggestion,
+            "timestamp": self.timestamp
+        }
+
+    def appendix_section(self) -> str:
+        return (f"\n## Paragraph {self.paragraph_id}\n"
+                f"Original: {self.original}\n"
+                f"Changed to: {self.suggestion}\n"
+                f"Timestamp: {self.timestamp}")
+
+    def size(self) -> int:
+        return (sys.getsizeof(self) + estimate_size(self.paragraph_id)
+                + estimate_size(self.original) + estimate_size(self.suggestion)
+                + estimate_size(self.timestamp))
+
+
+class DocumentSession:
+    """Paragraph originals, previews, highlights, changes, cursors and users
+    for one document. Mutate it through its methods so the owning store
+    can keep its memory accounting up to date."""
+
+    __slots__ = ("document_id", "paragraphs", "changes", "cursors", "users",
+                 "appendix", "last_used", "size", "_store")
+
+    def __init__(self, document_id: str, store: Optional["SessionStore"] = None):
+        self.document_id = document_id
+        self.paragraphs: Dict[str, ParagraphState] = {}
+        self.changes: List[ChangeRecord] = []
+        self.cursors: Dict[str, int] = {}
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.appendix: List[str] = []  # rendered sections for changes[:len(appendix)]
+        self.last_used = time.monotonic()
+        self.size = sys.getsizeof(self)
+        self._store = store
+
+    def _grow(self, delta: int):
+        self.size += delta
+        if self._store is not None:
+            self._store._grow(self, delta)
+
+    def _paragraph(self, paragraph_id: str) -> ParagraphState:
+        state = self.paragraphs.get(paragraph_id)
+        if state is None:
+            state = self.paragraphs[paragraph_id] = ParagraphState()
+            self._grow(state.size() + estimate_size(paragraph_id))
+        return state
+
+    def _update(self, paragraph_id: str, field: str, value: Any):
+        state = self._paragraph(paragraph_id)
+        before = state.size()
+        setattr(state, field, value)
+        self._grow(state.size() - before)
+
+    def original(self, paragraph_id: str) -> Optional[str]:
+        state = self.paragraphs.get(paragraph_id)
+        return state.original if state is not None and state.original else None
+
+    def remember_original(self, paragraph_id: str, text: str) -> str:
+        """Keep the first text seen for a paragraph and return it"""
+        current = self.original(paragraph_id)
+        if current is None:
+            self._update(paragraph_id, "original", text)
+            current = text
+        return current
+
+    def set_preview(self, paragraph_id: str, preview: Dict[str, Any]):
+        self._update(paragraph_id, "preview", preview)
+
+    def set_highlight(self, paragraph_id: str, highlight: Dict[str, Any]):
+        self._update(paragraph_id, "highlight", highlight)
+
+    def add_change(self, change: ChangeRecord):
+        self.changes.append(change)
+        self._grow(change.size())
+
+    def appendix_sections(self) -> List[str]:
+        """Rendered appendix sections, one per change; only new changes are rendered"""
+        for change in self.changes[len(self.appendix):]:
+            section = change.appendix_section()
+            self.appendix.append(section)
+            self._grow(estimate_size(section) + 8)
+        return self.appendix
+
+    def set_cursor(self, user_id: str, position: int):
+        if user_id not in self.cursors:
+            self._grow(estimate_size(user_id) + estimate_size(position))
+        self.cursors[user_id] = position
+
+    def add_user(self, user_id: str, info: Dict[str, Any]):
+        before = estimate_size(self.users.get(user_id)) if user_id in self.users else 0
+        self.users[user_id] = info
+        self._grow(estimate_size(user_id) + estimate_size(info) - before)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON-serializable copy of the session"""
+        return {
+            "document_id": self.document_id,
+            "paragraphs": {
+                paragraph_id: {
+                    "original": state.original,
+                    "preview": state.preview,
+                    "highlight": state.highlight
+                }
+                for paragraph_id, state in self.paragraphs.items()
+            },
+            "changes": [change.to_dict() for change in self.changes],
+            "cursors": dict(self.cursors),
+            "users": dict(self.users)
+        }
+
+
+class SessionStore:
+    """Per-document sessions under a memory budget.
+
+    Sessions are kept in least-recently-used order. When the estimated
+    size of all sessions goes over ``max_bytes`` the least recently used
+    ones are evicted, never the session being written to; sessions idle
+    for longer than ``idle_ttl`` seconds are dropped on access as well.
+    Evicted state can be kept elsewhere with ``snapshot``/``restore``.
+    """
+
+    def __init__(self, max_bytes: Optional[int] = None, idle_ttl: Optional[float] = None):
+        self.max_bytes = max_bytes or settings.SESSION_MEMORY_BUDGET_MB * 1024 * 1024
+        self.idle_ttl = idle_ttl or settings.SESSION_IDLE_TTL
+        self.sessions: "OrderedDict[str, DocumentSession]" = OrderedDict()
+        self.bytes_used = 0
+        self.evictions = 0
+
+    def get(self, document_id: str) -> DocumentSession:
+        """Return the session for a document, creating it if needed"""
+        now = time.monotonic()
+        self._expire(now)
+        session = self.sessions.get(document_id)
+        if session is None:
+            session = DocumentSession(document_id, self)
+            self.sessions[document_id] = session
+            self.bytes_used += session.size
+        else:
+            self.sessions.move_to_end(document_id)
+        session.last_used = now
+        return session
+
+    def peek(self, document_id: str) -> Optional[DocumentSession]:
+        """Return a session without creating it or refreshing its age"""
+        return self.sessions.get(document_id)
+
+    def discard(self, document_id: str) -> Optional[DocumentSession]:
+        session = self.sessions.pop(document_id, None)
+        if session is not None:
+            self.bytes_used -= session.size
+            session._store = None
+        return session
+
+    def snapshot(self, document_id: str) -> Optional[Dict[str, Any]]:
+        session = self.sessions.get(document_id)
+        return session.snapshot() if session is not None else None
+
+    def restore(self, snapshot: Dict[str, Any]) -> DocumentSession:
+        """Replace a document's session with one rebuilt from a snapshot"""
+        document_id = snapshot["document_id"]
+        self.discard(document_id)
+        session = self.get(document_id)
+        for paragraph_id, state in snapshot.get("paragraphs", {}).items():
+            if state.get("original"):
+                session.remember_original(paragraph_id, state["original"])
+            if state.get("preview") is not None:
+                session.set_preview(paragraph_id, state["preview"])
+            if state.get("highlight") is not None:
+                session.set_highlight(paragraph_id, state["highlight"])
+        for change in snapshot.get("changes", []):
+            session.add_change(ChangeRecord(
+                change["paragraph_id"], change["original"],
+                change["suggestion"], change["timestamp"]
+            ))
+        for user_id, position in snapshot.get("cursors", {}).items():
+            session.set_cursor(user_id, position)
+        for user_id, info in snapshot.get("users", {}).items():
+            session.add_user(user_id, info)
+        return session
+
+    def _grow(self, session: DocumentSession, delta: int):
+        self.bytes_used += delta
+        if delta > 0 and self.bytes_used > self.max_bytes:
+            self._evict(keep=session)
+
+    def _evict(self, keep: DocumentSession):
+        for document_id in list(self.sessions):
+            if self.bytes_used <= self.max_bytes:
+                return
+            if self.sessions[document_id] is keep:
+                continue
+            self.discard(document_id)
+            self.evictions += 1
+            logger.info(f"Evicted idle session for document {document_id}")
+        if self.bytes_used > self.max_bytes:
+            logger.warning(f"Session for document {keep.document_id} alone exceeds the memory budget")
+
+    def _expire(self, now: float):
+        while self.sessions:
+            document_id, session = next(iter(self.sessions.items()))
+            if now - session.last_used < self.idle_ttl:
+                return
+            self.discard(document_id)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self.sessions)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "documents": len(self.sessions),
+            "bytes_used": self.bytes_used,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions
+        }
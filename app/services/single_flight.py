@@ -0,0 +1,61 @@
+"""In-flight deduplication of identical upstream calls"""
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class _Flight:
+    __slots__ = ("task", "waiters")
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """Let concurrent identical requests share one upstream call.
+
+    The first caller for a key starts the call as a separate task and later
+    callers wait on the same task. A caller being cancelled only stops its
+    own wait; the call is cancelled once nobody is waiting for it anymore.
+    Errors are delivered to every waiter and the key is released, so the
+    next request starts a fresh call.
+    """
+
+    def __init__(self):
+        self.flights: Dict[Hashable, _Flight] = {}
+        self.started = 0
+        self.joined = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run fn for key, or join the call already running for it"""
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = _Flight(asyncio.create_task(fn()))
+            flight.task.add_done_callback(lambda task: self._finish(key, task))
+            self.started += 1
+        else:
+            self.joined += 1
+
+        flight.waiters += 1
+        try:
+            return await asyncio.shield(flight.task)
+        except asyncio.CancelledError:
+            if flight.waiters == 1 and not flight.task.done():
+                flight.task.cancel()
+            raise
+        finally:
+            flight.waiters -= 1
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self.flights.get(key) is not None and self.flights[key].task is task:
+            del self.flights[key]
+        # Mark the exception as retrieved when every waiter has gone away
+        if not task.cancelled() and task.exception() is not None:
+            logger.debug(f"Shared call for {key!r} failed: {task.exception()}")
+
+    def in_flight(self) -> int:
+        """Number of distinct upstream calls currently running"""
+        return len(self.flights)
@@ -0,0 +1,178 @@
+"""Micro-batching of paragraph suggestion requests into single LLM calls"""
+import asyncio
+import json
+import logging
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+BATCH_PROMPT = (
+    "Suggest improvements for each paragraph in the JSON list below. "
+    "Respond with only a JSON object that maps every paragraph id to a "
+    "list of suggestion strings.\n\n{paragraphs}"
+)
+
+
+def build_batch_prompt(paragraphs: Dict[str, str]) -> str:
+    """Pack paragraphs into one structured prompt"""
+    items = [{"id": paragraph_id, "text": text} for paragraph_id, text in paragraphs.items()]
+    return BATCH_PROMPT.format(paragraphs=json.dumps(items, ensure_ascii=False))
+
+
+def parse_batch_response(content: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Split a batched completion back into suggestions per paragraph id.
+
+    Only well-formed entries are returned; anything missing or malformed
+    is left out so the caller can fall back for those paragraphs.
+    """
+    start, end = content.find("{"), content.rfind("}")
+    if start == -1 or end <= start:
+        return {}
+    try:
+        parsed = json.loads(content[start:end + 1])
+    except ValueError:
+        return {}
+    if not isinstance(parsed, dict):
+        return {}
+
+    results = {}
+    for paragraph_id, suggestions in parsed.items():
+        if isinstance(suggestions, str):
+            suggestions = [suggestions]
+        if not isinstance(suggestions, list) or not all(isinstance(s, str) for s in suggestions):
+            continue
+        results[str(paragraph_id)] = [
+            {"text": s, "confidence": 0.9} for s in suggestions if s.strip()
+        ]
+    return results
+
+
+class _PendingParagraph:
+    __slots__ = ("paragraph_id", "text", "future")
+
+    def __init__(self, paragraph_id: str, text: str, future: asyncio.Future):
+        self.paragraph_id = paragraph_id
+        self.text = text
+        self.future = future
+
+
+class SuggestionBatcher:
+    """Collect paragraph requests over a short window and send them together.
+
+    A batch is flushed when it reaches ``max_batch_size`` paragraphs, when
+    the next paragraph would push the prompt past ``max_chars``, or
+    ``max_wait_ms`` after its first paragraph arrived. Paragraphs missing
+    from the batched answer (or all of them, if it cannot be parsed) fall
+    back to individual calls.
+
+    ``complete`` returns the completion and the model that wrote it.
+    ``on_batched`` is told the text, suggestions and model of every
+    paragraph answered by a batched call, so those can be cached apart
+    from the answers of individual calls.
+    """
+
+    def __init__(self, complete: Callable[[str], Awaitable[Tuple[str, str]]],
+                 fallback: Callable[[str], Awaitable[List[Dict[str, Any]]]],
+                 max_batch_size: Optional[int] = None,
+                 max_wait_ms: Optional[int] = None,
+                 max_chars: Optional[int] = None,
+                 on_batched: Optional[Callable[[str, List[Dict[str, Any]], str], None]] = None):
+        self.complete = complete
+        self.fallback = fallback
+        self.on_batched = on_batched
+        self.max_batch_size = max_batch_size or settings.SUGGESTION_BATCH_SIZE
+        self.max_wait = (max_wait_ms or settings.SUGGESTION_BATCH_WAIT_MS) / 1000
+        self.max_chars = max_chars or settings.SUGGESTION_BATCH_MAX_CHARS
+        self.pending: List[_PendingParagraph] = []
+        self.pending_ids: Set[str] = set()
+        self.pending_chars = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._batches: Set[asyncio.Task] = set()  # running batches, kept alive until done
+        self.batches_sent = 0
+        self.fallbacks = 0
+
+    async def submit(self, paragraph_id: str, text: str) -> List[Dict[str, Any]]:
+        """Queue a paragraph and wait for its suggestions"""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        # Ids must be unique within a prompt, and the prompt must fit the context
+        if paragraph_id in self.pending_ids or (
+                self.pending and self.pending_chars + len(text) > self.max_chars):
+            self._flush()
+
+        self.pending.append(_PendingParagraph(paragraph_id, text, future))
+        self.pending_ids.add(paragraph_id)
+        self.pending_chars += len(text)
+
+        if len(self.pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending = self.pending, []
+        self.pending_ids = set()
+        self.pending_chars = 0
+        if batch:
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batches.add(task)
+            task.add_done_callback(lambda task: self._batch_done(task, batch))
+
+    def _batch_done(self, task: asyncio.Task, batch: List[_PendingParagraph]):
+        """Forget a finished batch; if it died, fail the paragraphs still waiting"""
+        self._batches.discard(task)
+        if task.cancelled():
+            error: BaseException = asyncio.CancelledError()
+        elif task.exception() is not None:
+            error = task.exception()
+            logger.error(f"Suggestion batch failed: {str(error)}")
+        else:
+            return
+        for item in batch:
+            if not item.future.done():
+                item.future.set_exception(error)
+
+    async def _run_batch(self, batch: List[_PendingParagraph]):
+        batch = [item for item in batch if not item.future.done()]
+        parsed: Dict[str, List[Dict[str, Any]]] = {}
+        model = ""
+        if len(batch) > 1:
+            try:
+                self.batches_sent += 1
+                content, model = await self.complete(
+                    build_batch_prompt({item.paragraph_id: item.text for item in batch})
+                )
+                parsed = parse_batch_response(content)
+            except Exception as e:
+                logger.warning(f"Batched suggestion call failed, falling back: {str(e)}")
+
+        missing = []
+        for item in batch:
+            if item.future.done():
+                continue
+            if item.paragraph_id in parsed:
+                if self.on_batched is not None:
+                    self.on_batched(item.text, parsed[item.paragraph_id], model)
+                item.future.set_result(parsed[item.paragraph_id])
+            else:
+                missing.append(item)
+
+        if missing:
+            self.fallbacks += len(missing)
+            await asyncio.gather(*(self._fall_back(item) for item in missing))
+
+    async def _fall_back(self, item: _PendingParagraph):
+        try:
+            result = await self.fallback(item.text)
+        except Exception as e:
+            if not item.future.done():
+                item.future.set_exception(e)
+            return
+        if not item.future.done():
+            item.future.set_result(result)
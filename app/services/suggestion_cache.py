@@ -0,0 +1,147 @@
+"""Content-addressed cache for AI suggestions"""
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import time
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# How many writes between sweeps of expired rows from the disk tier
+DISK_SWEEP_EVERY = 256
+
+
+def normalize_text(text: str) -> str:
+    """Canonical form used for cache keys: NFC, collapsed whitespace"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def suggestion_cache_key(text: str, model: str, temperature: float, prompt_version: str) -> str:
+    """Hash of everything that determines a completion's content"""
+    material = json.dumps(
+        [normalize_text(text), model, round(temperature, 4), prompt_version],
+        ensure_ascii=False
+    )
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+class SuggestionCache:
+    """LRU + TTL cache of suggestion lists with an optional SQLite disk tier.
+
+    The memory tier is bounded by ``max_entries``; the disk tier, when a
+    path is configured, survives restarts and is bounded by the TTL.
+    Reads fall through to disk and promote hits back into memory.
+    """
+
+    def __init__(self, max_entries: Optional[int] = None, ttl: Optional[float] = None,
+                 path: Optional[str] = None):
+        self.max_entries = max_entries or settings.SUGGESTION_CACHE_SIZE
+        self.ttl = ttl or settings.SUGGESTION_CACHE_TTL
+        self.entries: "OrderedDict[str, Tuple[float, List[Dict[str, Any]]]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.disk_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self._writes = 0
+        self.conn: Optional[sqlite3.Connection] = None
+
+        path = path if path is not None else settings.SUGGESTION_CACHE_PATH
+        if path:
+            self._open_disk(path)
+
+    def _open_disk(self, path: str):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=5.0, isolation_level=None,
+                                    check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS suggestions (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                expires_at REAL NOT NULL
+            ) WITHOUT ROWID
+        """)
+        self._sweep_disk(time.time())
+
+    def get(self, key: str, count_miss: bool = True) -> Optional[List[Dict[str, Any]]]:
+        """Return cached suggestions, or None on a miss. A lookup that only
+        repeats one already counted as a miss passes ``count_miss=False``."""
+        now = time.time()
+        entry = self.entries.get(key)
+        if entry is not None:
+            expires_at, value = entry
+            if expires_at > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self.entries[key]
+            self.expirations += 1
+
+        if self.conn is not None:
+            row = self.conn.execute(
+                "SELECT value, expires_at FROM suggestions WHERE key = ? AND expires_at > ?",
+                (key, now)
+            ).fetchone()
+            if row is not None:
+                value = json.loads(row[0])
+                self._remember(key, row[1], value)
+                self.hits += 1
+                self.disk_hits += 1
+                return value
+
+        if count_miss:
+            self.misses += 1
+        return None
+
+    def set(self, key: str, value: List[Dict[str, Any]]):
+        """Store suggestions in memory and, if enabled, on disk"""
+        expires_at = time.time() + self.ttl
+        self._remember(key, expires_at, value)
+
+        if self.conn is not None:
+            try:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO suggestions (key, value, expires_at) VALUES (?, ?, ?)",
+                    (key, json.dumps(value, ensure_ascii=False), expires_at)
+                )
+                self._writes += 1
+                if self._writes % DISK_SWEEP_EVERY == 0:
+                    self._sweep_disk(time.time())
+            except sqlite3.Error as e:
+                logger.warning(f"Suggestion cache disk write failed: {str(e)}")
+
+    def _remember(self, key: str, expires_at: float, value: List[Dict[str, Any]]):
+        self.entries[key] = (expires_at, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def _sweep_disk(self, now: float):
+        self.conn.execute("DELETE FROM suggestions WHERE expires_at <= ?", (now,))
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "disk_hits": self.disk_hits,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_rate": self.hits / lookups if lookups else 0.0
+        }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
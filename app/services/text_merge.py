@@ -0,0 +1,91 @@
+"""Operational-transform merge of concurrent paragraph edits.
+
+An edit is a single replace operation ``(position, deleted, inserted)``
+against a known version of the paragraph: delete ``deleted`` characters
+at ``position`` and insert ``inserted`` there. On the wire it is the
+compact list ``[position, deleted, inserted]``.
+
+An edit made against an older version is transformed past every
+revision applied since, so edits to different parts of a paragraph all
+survive. Edits whose ranges overlap cannot be merged without guessing
+and are reported as conflicts instead of silently dropping one of them.
+"""
+from typing import List, Optional, Sequence, Tuple
+from app.services.redline_diff import common_prefix_length, common_suffix_length
+
+Op = Tuple[int, int, str]  # (position, deleted, inserted)
+
+
+class MergeConflict(Exception):
+    """A concurrent edit overlaps the text this edit changes"""
+
+
+def op_from_texts(base: str, new: str) -> Op:
+    """Smallest single replace turning base into new"""
+    prefix = common_prefix_length(base, new)
+    suffix = common_suffix_length(base, new, min(len(base), len(new)) - prefix)
+    return prefix, len(base) - prefix - suffix, new[prefix:len(new) - suffix]
+
+
+def apply_op(text: str, op: Op) -> str:
+    position, deleted, inserted = op
+    if position < 0 or deleted < 0 or position + deleted > len(text):
+        raise ValueError(f"Operation {list(op)} does not fit text of length {len(text)}")
+    return text[:position] + inserted + text[position + deleted:]
+
+
+def encode_op(op: Op) -> list:
+    return [op[0], op[1], op[2]]
+
+
+def decode_op(data: Sequence) -> Op:
+    position, deleted, inserted = data
+    return int(position), int(deleted), str(inserted)
+
+
+def is_noop(op: Op) -> bool:
+    return op[1] == 0 and not op[2]
+
+
+def transform(op: Op, applied: Op) -> Op:
+    """Rewrite op, made concurrently with applied, to apply after it"""
+    position, deleted, inserted = op
+    a_position, a_deleted, a_inserted = applied
+    if is_noop(op):
+        return op
+    if op == applied:
+        # Both sides made the same edit; it is already in the text
+        return position, 0, ""
+    if position >= a_position + a_deleted:
+        # Entirely after (two inserts at one spot: the earlier-applied goes first)
+        return position + len(a_inserted) - a_deleted, deleted, inserted
+    if position + deleted <= a_position:
+        return op
+    raise MergeConflict(f"Edit {encode_op(op)} overlaps concurrent edit {encode_op(applied)}")
+
+
+def rebase(op: Op, applied: List[Op]) -> Op:
+    """Transform op past a sequence of operations applied after its base"""
+    for other in applied:
+        op = transform(op, other)
+    return op
+
+
+def revision_ops(base_length: int, deltas: Sequence[Tuple[int, int, str]]) -> List[Op]:
+    """Ops for consecutive (prefix, suffix, inserted) deltas starting from
+    a text of base_length characters"""
+    ops = []
+    length = base_length
+    for prefix, suffix, inserted in deltas:
+        deleted = length - prefix - suffix
+        ops.append((prefix, deleted, inserted))
+        length += len(inserted) - deleted
+    return ops
+
+
+def merge_edit(base: str, op: Op, applied: List[Op]) -> Optional[Op]:
+    """The op to apply to the current text, or None when the edit is
+    already there. Raises MergeConflict when it cannot be merged."""
+    apply_op(base, op)  # validates op against the text it was made on
+    rebased = rebase(op, applied)
+    return None if is_noop(rebased) else rebased
@@ -0,0 +1,250 @@
+"""Speech-to-text for voice commands behind one interface.
+
+A backend turns 16 kHz mono PCM into text. ``LocalBackend`` runs a
+Whisper model on the CPU with faster-whisper and needs no network once
+the model is on disk; ``RemoteBackend`` sends the audio to the Groq
+transcription API. ``TranscriptionService`` keeps blocking work (audio
+conversion and local decoding) on a worker pool, off the event loop, and
+records the latency of every utterance.
+"""
+import asyncio
+import importlib.util
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Deque, Dict, Optional
+import numpy as np
+from app.config import settings
+from app.utils.audio import DEFAULT_AUDIO_FORMAT, AudioConverter, frame_size, wav_header
+
+logger = logging.getLogger(__name__)
+
+# Utterances kept for latency percentiles
+LATENCY_WINDOW = 1024
+
+
+class TranscriptionError(Exception):
+    """No transcript could be produced"""
+
+
+class Transcript:
+    __slots__ = ("text", "backend", "audio_seconds", "queued", "decode", "total")
+
+    def __init__(self, text: str, backend: str, audio_seconds: float,
+                 queued: float, decode: float, total: float):
+        self.text = text
+        self.backend = backend
+        self.audio_seconds = audio_seconds
+        self.queued = queued  # seconds waiting for a worker
+        self.decode = decode  # seconds converting and recognizing
+        self.total = total
+
+    @property
+    def real_time_factor(self) -> float:
+        return self.total / self.audio_seconds if self.audio_seconds else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "text": self.text,
+            "backend": self.backend,
+            "audio_seconds": round(self.audio_seconds, 3),
+            "latency_ms": {
+                "queued": round(self.queued * 1000, 1),
+                "decode": round(self.decode * 1000, 1),
+                "total": round(self.total * 1000, 1)
+            }
+        }
+
+
+def _float_samples(pcm: bytes, audio_format: Dict[str, Any]) -> np.ndarray:
+    """16 kHz mono float32 samples in [-1, 1], as Whisper models expect"""
+    converter = AudioConverter(audio_format, {**DEFAULT_AUDIO_FORMAT, "encoding": "float",
+                                              "bit_depth": 32})
+    frames = len(pcm) // frame_size(audio_format)
+    samples = np.empty(converter.capacity(frames) + converter.capacity(0), dtype=np.float32)
+    count = converter.to_float(pcm, samples)
+    count += converter.flush_float(samples[count:])
+    return samples[:count]
+
+
+class LocalBackend:
+    """Offline, CPU-only recognition with a faster-whisper (CTranslate2) model.
+
+    ``model`` is a model size such as "base.en", fetched once into the
+    local cache, or a path to a converted model for machines with no
+    network. It is loaded on first use in a worker thread, quantized to
+    int8. Several workers may decode at once.
+    """
+
+    name = "local"
+    blocking = True
+
+    def __init__(self, model: Optional[str] = None, workers: Optional[int] = None,
+                 cpu_threads: Optional[int] = None):
+        self.model_name = model or settings.TRANSCRIPTION_MODEL
+        self.workers = workers or settings.TRANSCRIPTION_WORKERS
+        self.cpu_threads = cpu_threads or settings.TRANSCRIPTION_CPU_THREADS
+        self._model = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def available() -> bool:
+        return importlib.util.find_spec("faster_whisper") is not None
+
+    def _load(self):
+        with self._lock:
+            if self._model is None:
+                try:
+                    from faster_whisper import WhisperModel
+                except ImportError:
+                    raise TranscriptionError("Local transcription needs the faster-whisper package")
+                logger.info(f"Loading transcription model {self.model_name}")
+                self._model = WhisperModel(
+                    self.model_name, device="cpu", compute_type="int8",
+                    cpu_threads=self.cpu_threads, num_workers=self.workers
+                )
+            return self._model
+
+    def transcribe(self, pcm: bytes, audio_format: Dict[str, Any], prompt: Optional[str] = None) -> str:
+        """Blocking; call from a worker thread"""
+        model = self._load()
+        segments, _ = model.transcribe(
+            _float_samples(pcm, audio_format),
+            language=settings.TRANSCRIPTION_LANGUAGE,
+            beam_size=1,  # commands are short; greedy decoding is much faster
+            initial_prompt=prompt,
+            condition_on_previous_text=False
+        )
+        # Decoding happens lazily, segment by segment
+        return "".join(segment.text for segment in segments).strip()
+
+
+class RemoteBackend:
+    """Recognition by the Groq transcription API"""
+
+    name = "remote"
+    blocking = False
+
+    def __init__(self, client=None, model: Optional[str] = None):
+        if client is None:
+            import groq
+            client = groq.AsyncGroq(api_key=settings.GROQ_API_KEY, base_url=settings.GROQ_BASE_URL)
+        self.client = client
+        self.model = model or settings.TRANSCRIPTION_REMOTE_MODEL
+
+    async def transcribe(self, pcm: bytes, audio_format: Dict[str, Any],
+                         prompt: Optional[str] = None) -> str:
+        response = await self.client.audio.transcriptions.create(
+            file=("utterance.wav", wav_header(audio_format, len(pcm)) + pcm),
+            model=self.model,
+            language=settings.TRANSCRIPTION_LANGUAGE,
+            prompt=prompt,
+            response_format="json"
+        )
+        return response.text.strip()
+
+
+def create_backend(name: Optional[str] = None, client=None):
+    """Backend for TRANSCRIPTION_BACKEND: "local", "remote" or "auto"
+    (local when faster-whisper is installed, otherwise remote)"""
+    name = name or settings.TRANSCRIPTION_BACKEND
+    if name == "auto":
+        name = "local" if LocalBackend.available() else "remote"
+    if name == "local":
+        return LocalBackend()
+    if name == "remote":
+        return RemoteBackend(client)
+    raise ValueError(f"Unknown transcription backend {name!r}")
+
+
+class TranscriptionService:
+    """Runs a backend for each utterance and keeps latency statistics.
+
+    Blocking backends run on a pool of ``workers`` threads. At most
+    ``max_pending`` utterances may be waiting or in progress; beyond that
+    new ones are refused at once rather than queued behind minutes of
+    audio.
+    """
+
+    def __init__(self, backend=None, workers: Optional[int] = None,
+                 max_pending: Optional[int] = None):
+        self.backend = backend if backend is not None else create_backend()
+        self.workers = workers or settings.TRANSCRIPTION_WORKERS
+        self.max_pending = max_pending or settings.TRANSCRIPTION_MAX_PENDING
+        self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="transcribe")
+        self.pending = 0
+        self.utterances = 0
+        self.errors = 0
+        self.rejected = 0
+        self.recent: Deque[Transcript] = deque(maxlen=LATENCY_WINDOW)
+
+    async def transcribe(self, pcm: bytes, audio_format: Optional[Dict[str, Any]] = None,
+                         prompt: Optional[str] = None) -> Transcript:
+        """Text of one utterance of PCM audio (16 kHz mono 16-bit by default)"""
+        audio_format = audio_format or DEFAULT_AUDIO_FORMAT
+        if self.pending >= self.max_pending:
+            self.rejected += 1
+            raise TranscriptionError("Too many utterances waiting to be transcribed")
+
+        self.pending += 1
+        submitted = time.perf_counter()
+        try:
+            if self.backend.blocking:
+                started, text = await asyncio.get_running_loop().run_in_executor(
+                    self.pool, self._run_blocking, pcm, audio_format, prompt
+                )
+            else:
+                started = submitted
+                text = await self.backend.transcribe(pcm, audio_format, prompt)
+        except TranscriptionError:
+            self.errors += 1
+            raise
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Transcription failed: {str(e)}")
+            raise TranscriptionError(str(e)) from e
+        finally:
+            self.pending -= 1
+
+        finished = time.perf_counter()
+        transcript = Transcript(
+            text, self.backend.name,
+            len(pcm) / (frame_size(audio_format) * audio_format["sample_rate"]),
+            started - submitted, finished - started, finished - submitted
+        )
+        self.utterances += 1
+        self.recent.append(transcript)
+        logger.info(f"Transcribed {transcript.audio_seconds:.1f}s of audio in "
+                    f"{transcript.total * 1000:.0f} ms ({self.backend.name})")
+        return transcript
+
+    def _run_blocking(self, pcm: bytes, audio_format: Dict[str, Any], prompt: Optional[str]):
+        return time.perf_counter(), self.backend.transcribe(pcm, audio_format, prompt)
+
+    def stats(self) -> Dict[str, Any]:
+        totals = sorted(transcript.total * 1000 for transcript in self.recent)
+        factors = sorted(transcript.real_time_factor for transcript in self.recent)
+        return {
+            "backend": self.backend.name,
+            "utterances": self.utterances,
+            "errors": self.errors,
+            "rejected": self.rejected,
+            "pending": self.pending,
+            "latency_ms": {
+                "p50": _percentile(totals, 0.5),
+                "p95": _percentile(totals, 0.95),
+                "max": totals[-1] if totals else None
+            },
+            "real_time_factor_p50": _percentile(factors, 0.5)
+        }
+
+    def close(self):
+        self.pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _percentile(ordered, fraction: float) -> Optional[float]:
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
@@ -1,62 +1,565 @@
-import wave
+import mmap
+import os
+import struct
 import numpy as np
-from typing import Dict, Any, Optional, Tuple
-import io
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+from app.utils.resample import Resampler, downmix, normalization_gain, quantize_int16
 
-def validate_audio_format(audio_data: bytes) -> bool:
+# Format assumed for raw PCM streams that arrive without a WAV header
+DEFAULT_AUDIO_FORMAT = {"sample_rate": 16000, "channels": 1, "bit_depth": 16, "encoding": "pcm"}
+
+WAVE_FORMAT_PCM = 0x0001
+WAVE_FORMAT_IEEE_FLOAT = 0x0003
+WAVE_FORMAT_EXTENSIBLE = 0xFFFE
+
+# Files at least this large are memory-mapped by open_wav rather than read
+MMAP_MIN_BYTES = 1024 * 1024
+
+# Dtype of the samples pcm_samples gives and their full-scale value, per
+# (encoding, bit depth). 8-bit PCM is unsigned and 24-bit PCM has no NumPy
+# type, so those two are unpacked into wider signed samples.
+SAMPLE_TYPES = {
+    ("pcm", 8): (np.dtype("<i2"), 128.0),
+    ("pcm", 16): (np.dtype("<i2"), 32768.0),
+    ("pcm", 24): (np.dtype("<i4"), 8388608.0),
+    ("pcm", 32): (np.dtype("<i4"), 2147483648.0),
+    ("float", 32): (np.dtype("<f4"), 1.0),
+    ("float", 64): (np.dtype("<f8"), 1.0),
+}
+
+# Output encodings convert_audio_format can produce
+TARGET_TYPES = {("pcm", 16): np.dtype("<i2"), ("float", 32): np.dtype("<f4")}
+
+# Volume normalization
+NORMALIZE_PEAK_TARGET = 0.89  # -1 dBFS
+NORMALIZE_RMS_TARGET = 0.1  # -20 dBFS
+NORMALIZE_MAX_GAIN = 10.0  # +20 dB; quiet recordings are not turned into loud noise
+CONVERT_CHUNK_FRAMES = 8192  # working buffer size for whole-file conversion
+
+# Voice activity detection
+VAD_FRAME_MS = 20
+VAD_ENERGY_FLOOR = 1e-4  # mean square relative to full scale (-40 dBFS); quieter is silence
+VAD_NOISE_FACTOR = 4.0  # speech is this much louder than the noise floor...
+VAD_PEAK_RATIO = 0.1  # ...or, in audio with no quiet part, within 10 dB of the loudest frame
+VAD_ZCR_THRESHOLD = 0.25  # quieter frames this noisy are unvoiced speech (s, f, sh)
+VAD_HANGOVER_MS = 200  # pauses shorter than this stay inside a segment
+VAD_MIN_SPEECH_MS = 60  # shorter bursts are clicks, not speech
+VAD_PADDING_MS = 100  # kept around each segment so word edges are not clipped
+
+class WavFile:
+    """A parsed WAV file. ``pcm`` is a view of the data chunk inside the
+    original buffer or file mapping, so nothing is copied; views taken of
+    it must be released before ``close``."""
+
+    __slots__ = ("format", "pcm", "info", "fact_frames", "_mapping")
+
+    def __init__(self, audio_format: Dict[str, Any], pcm: memoryview,
+                 info: Optional[Dict[str, str]] = None, fact_frames: Optional[int] = None,
+                 mapping: Optional[mmap.mmap] = None):
+        self.format = audio_format
+        self.pcm = pcm
+        self.info = info or {}  # LIST/INFO tags, e.g. {"ISFT": "Lavf58.76.100"}
+        self.fact_frames = fact_frames  # sample frames declared by a fact chunk
+        self._mapping = mapping
+
+    @property
+    def frames(self) -> int:
+        return len(self.pcm) // frame_size(self.format)
+
+    @property
+    def duration(self) -> float:
+        return self.frames / self.format["sample_rate"]
+
+    def properties(self) -> Dict[str, Any]:
+        return {**self.format, "duration": self.duration}
+
+    def close(self):
+        self.pcm.release()
+        if self._mapping is not None:
+            self._mapping.close()
+
+    def __enter__(self) -> "WavFile":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+AudioData = Union[bytes, bytearray, memoryview, WavFile]
+
+def validate_audio_format(audio_data: AudioData) -> bool:
     """Validate audio data format"""
+    if isinstance(audio_data, WavFile):
+        return True
     # Check for WAV header
     if len(audio_data) < 12:  # WAV header is at least 12 bytes
         return False
-        
-    try:
-        header = audio_data[:4].decode('ascii')
-        format_type = audio_data[8:12].decode('ascii')
-        return header == "RIFF" and format_type == "WAVE"
-    except:
+    view = memoryview(audio_data)
+    return view[:4] == b"RIFF" and view[8:12] == b"WAVE"
+
+def _chunks(view: memoryview, offset: int = 12) -> Iterator[Tuple[bytes, int, int]]:
+    """(id, body offset, declared size) of each chunk whose header is in view"""
+    while len(view) >= offset + 8:
+        chunk_id = bytes(view[offset:offset + 4])
+        size, = struct.unpack_from("<I", view, offset + 4)
+        yield chunk_id, offset + 8, size
+        offset += 8 + size + (size & 1)  # chunks are word aligned
+
+def _is_chunk_header(view: memoryview, offset: int) -> bool:
+    """Whether a chunk header that fits in view starts at offset"""
+    if len(view) < offset + 8:
         return False
+    size, = struct.unpack_from("<I", view, offset + 4)
+    return (all(0x20 <= byte <= 0x7e for byte in view[offset:offset + 4])
+            and offset + 8 + size <= len(view))
+
+def parse_wav(audio_data: AudioData) -> WavFile:
+    """
+    Parse a complete WAV file in a single pass without copying
+    Handles fact and LIST chunks, and data chunks whose declared size is
+    too large, or left at 0 with no chunk after it (files written while
+    still recording); those run to the end of the buffer.
+    Raises: ValueError if the data is not a usable WAV file
+    """
+    if isinstance(audio_data, WavFile):
+        return audio_data
+    view = memoryview(audio_data)
+    if not validate_audio_format(view):
+        raise ValueError("Not a WAV file")
+
+    audio_format = pcm = fact_frames = None
+    info: Dict[str, str] = {}
+    for chunk_id, start, size in _chunks(view):
+        end = start + size
+        if chunk_id == b"data":
+            if end > len(view) or (size == 0 and not _is_chunk_header(view, start)):
+                # Streaming writers fill the size in last, if ever
+                pcm = view[start:]
+                break
+            pcm = view[start:end]
+        elif end > len(view):
+            raise ValueError(f"Truncated {chunk_id.decode('latin-1')!r} chunk")
+        elif chunk_id == b"fmt ":
+            audio_format = _parse_fmt_chunk(view, start, size)
+        elif chunk_id == b"fact" and size >= 4:
+            fact_frames, = struct.unpack_from("<I", view, start)
+        elif chunk_id == b"LIST" and view[start:start + 4] == b"INFO":
+            info.update(_parse_info(view[:end], start + 4))
+
+    if audio_format is None:
+        raise ValueError("WAV file has no fmt chunk")
+    if pcm is None:
+        raise ValueError("WAV file has no data chunk")
+    return WavFile(audio_format, pcm, info, fact_frames)
+
+def _parse_info(view: memoryview, offset: int) -> Iterator[Tuple[str, str]]:
+    for chunk_id, start, size in _chunks(view, offset):
+        text = bytes(view[start:start + size]).split(b"\0", 1)[0]
+        yield chunk_id.decode("latin-1"), text.decode("utf-8", "replace")
+
+def open_wav(path: str) -> WavFile:
+    """Parse a WAV file on disk; large files are memory-mapped, not read"""
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < MMAP_MIN_BYTES:
+            return parse_wav(f.read())
+        mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    try:
+        wav = parse_wav(mapping)
+    except Exception:
+        mapping.close()
+        raise
+    wav._mapping = mapping
+    return wav
+
+def read_wav_header(data: bytes) -> Optional[Tuple[Dict[str, Any], int]]:
+    """
+    Parse the header at the start of a (possibly incomplete) WAV stream
+    Returns: (format, offset of the first PCM byte), or None while more
+        bytes are needed
+    Raises: ValueError if the data is not PCM or float WAV
+    """
+    if len(data) < 12:
+        return None
+    if not validate_audio_format(data):
+        raise ValueError("Not a WAV stream")
+
+    view = memoryview(data)
+    audio_format = None
+    for chunk_id, start, size in _chunks(view):
+        if chunk_id == b"data":
+            if audio_format is None:
+                raise ValueError("WAV data chunk before fmt chunk")
+            return audio_format, start
+        if len(view) < start + size:
+            return None
+        if chunk_id == b"fmt ":
+            audio_format = _parse_fmt_chunk(view, start, size)
+    return None
+
+def _parse_fmt_chunk(data: bytes, offset: int, size: int) -> Dict[str, Any]:
+    if size < 16:
+        raise ValueError("WAV fmt chunk too short")
+    tag, channels, sample_rate, _, _, bit_depth = struct.unpack_from("<HHIIHH", data, offset)
+    if not channels or not sample_rate or not bit_depth or bit_depth % 8:
+        raise ValueError(f"Invalid WAV format: {channels} channels, {sample_rate} Hz, {bit_depth} bit")
+    if tag == WAVE_FORMAT_EXTENSIBLE and size >= 40:
+        tag, = struct.unpack_from("<H", data, offset + 24)  # first field of the subformat GUID
+    if tag == WAVE_FORMAT_PCM:
+        encoding = "pcm"
+    elif tag == WAVE_FORMAT_IEEE_FLOAT:
+        encoding = "float"
+    else:
+        raise ValueError(f"Unsupported WAV encoding 0x{tag:04x}")
+    return {
+        "sample_rate": sample_rate,
+        "channels": channels,
+        "bit_depth": bit_depth,
+        "encoding": encoding
+    }
+
+def frame_size(audio_format: Dict[str, Any]) -> int:
+    """Bytes per sample frame (one sample for every channel)"""
+    return audio_format["channels"] * audio_format["bit_depth"] // 8
+
+def wav_header(audio_format: Dict[str, Any], data_length: int) -> bytes:
+    """Canonical 44-byte header for data_length bytes of audio"""
+    tag = WAVE_FORMAT_IEEE_FLOAT if audio_format["encoding"] == "float" else WAVE_FORMAT_PCM
+    block = frame_size(audio_format)
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF", 36 + data_length, b"WAVE", b"fmt ", 16, tag,
+        audio_format["channels"], audio_format["sample_rate"],
+        audio_format["sample_rate"] * block, block, audio_format["bit_depth"],
+        b"data", data_length
+    )
+
+def pcm_samples(pcm, audio_format: Dict[str, Any]) -> np.ndarray:
+    """
+    View PCM bytes as a (frames, channels) sample array without copying
+    8-bit and 24-bit PCM has no matching NumPy view, so it is unpacked into
+    a new signed array instead.
+    A trailing partial frame is ignored.
+    """
+    sample_type = (audio_format["encoding"], audio_format["bit_depth"])
+    try:
+        dtype, _ = SAMPLE_TYPES[sample_type]
+    except KeyError:
+        raise ValueError(f"Unsupported sample format {audio_format}")
+    count = len(pcm) // frame_size(audio_format) * audio_format["channels"]
+    if sample_type == ("pcm", 8):
+        # Unsigned, with silence at 128
+        samples = np.frombuffer(pcm, dtype=np.uint8, count=count).astype(dtype)
+        samples -= 128
+    elif sample_type == ("pcm", 24):
+        # Each sample goes in the top three bytes of an int32; the
+        # arithmetic shift back down extends its sign
+        widened = np.zeros((count, 4), dtype=np.uint8)
+        widened[:, 1:] = np.frombuffer(pcm, dtype=np.uint8, count=count * 3).reshape(-1, 3)
+        samples = widened.view(dtype).reshape(-1) >> 8
+    else:
+        samples = np.frombuffer(pcm, dtype=dtype, count=count)
+    return samples.reshape(-1, audio_format["channels"])
 
-def convert_audio_format(audio_data: bytes, target_format: Dict[str, Any]) -> bytes:
+def frame_features(samples: np.ndarray, frame_length: int,
+                   full_scale: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-frame energy and zero-crossing rate of (frames, channels) samples
+    Returns: (mean square relative to full scale over all channels,
+        fraction of sign changes in the first channel), one value per
+        whole frame of frame_length samples
+    """
+    count = samples.shape[0] // frame_length
+    # Both are reshaped views of the input; nothing is converted up front
+    frames = samples[:count * frame_length].reshape(count, -1)
+    first = samples[:count * frame_length, 0].reshape(count, frame_length)
+    energy = np.einsum("ij,ij->i", frames, frames, dtype=np.float64, casting="unsafe")
+    energy /= frames.shape[1] * full_scale * full_scale
+    signs = np.signbit(first)
+    crossings = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1)
+    return energy, crossings / max(frame_length - 1, 1)
+
+def detect_voice(samples: np.ndarray, sample_rate: int, full_scale: float = 1.0,
+                 frame_ms: int = VAD_FRAME_MS) -> np.ndarray:
+    """
+    Flag frame_ms frames that contain speech
+    Returns: bool array, one entry per whole frame
+    """
+    frame_length = max(2, sample_rate * frame_ms // 1000)
+    energy, zcr = frame_features(samples, frame_length, full_scale)
+    if not len(energy):
+        return np.zeros(0, dtype=bool)
+
+    # Threshold against the noise floor (the quietest tenth of the frames)
+    noise = np.percentile(energy, 10)
+    threshold = max(VAD_ENERGY_FLOOR, min(noise * VAD_NOISE_FACTOR, energy.max() * VAD_PEAK_RATIO))
+    speech = (energy >= threshold) | ((energy >= threshold / 4) & (zcr >= VAD_ZCR_THRESHOLD))
+
+    starts, ends = _runs(speech)
+    if len(starts) > 1:
+        # Bridge short pauses, then drop bursts too short to be speech
+        keep = starts[1:] - ends[:-1] >= max(1, VAD_HANGOVER_MS // frame_ms)
+        starts = starts[np.concatenate(([True], keep))]
+        ends = ends[np.concatenate((keep, [True]))]
+    long_enough = ends - starts >= max(1, VAD_MIN_SPEECH_MS // frame_ms)
+    speech[:] = False
+    for start, end in zip(starts[long_enough], ends[long_enough]):
+        speech[start:end] = True
+    return speech
+
+def _runs(mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Start and end (exclusive) indices of the runs of True in mask"""
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], mask.view(np.int8), [0]))))
+    return edges[::2], edges[1::2]
+
+def voice_segments(pcm, audio_format: Dict[str, Any],
+                   padding_ms: int = VAD_PADDING_MS) -> List[Tuple[int, int]]:
+    """
+    Find the spoken parts of PCM audio
+    Returns: (start, end) byte offsets into pcm of each segment, padded by
+        padding_ms on both sides
+    """
+    samples = pcm_samples(pcm, audio_format)
+    _, full_scale = SAMPLE_TYPES[(audio_format["encoding"], audio_format["bit_depth"])]
+    rate = audio_format["sample_rate"]
+    speech = detect_voice(samples, rate, full_scale)
+    frame_length = max(2, rate * VAD_FRAME_MS // 1000)
+    padding = rate * padding_ms // 1000
+    block = frame_size(audio_format)
+
+    segments = []
+    for start, end in zip(*_runs(speech)):
+        start = max(0, int(start) * frame_length - padding)
+        end = min(samples.shape[0], int(end) * frame_length + padding)
+        if segments and start <= segments[-1][1] // block:
+            segments[-1] = (segments[-1][0], end * block)  # padding made them touch
+        else:
+            segments.append((start * block, end * block))
+    return segments
+
+def trim_silence(pcm, audio_format: Dict[str, Any]) -> memoryview:
+    """Zero-copy view of pcm from the start of the first spoken segment to
+    the end of the last; empty if nothing was said"""
+    view = memoryview(pcm)
+    segments = voice_segments(view, audio_format)
+    if not segments:
+        return view[:0]
+    return view[segments[0][0]:segments[-1][1]]
+
+class Endpointer:
+    """Spots the end of an utterance while audio is still arriving.
+
+    Incoming audio is cut into VAD_FRAME_MS frames and each is judged
+    speech or silence against the quietest and loudest frames heard so
+    far, with the thresholds detect_voice uses. The
+    utterance has ended once some speech was heard and it has been
+    followed by silence_ms of silence.
+    """
+
+    def __init__(self, audio_format: Dict[str, Any], silence_ms: int):
+        _, self.full_scale = SAMPLE_TYPES[(audio_format["encoding"], audio_format["bit_depth"])]
+        self.audio_format = audio_format
+        self.frame_length = max(2, audio_format["sample_rate"] * VAD_FRAME_MS // 1000)
+        self.frame_bytes = self.frame_length * frame_size(audio_format)
+        self.min_speech = max(1, VAD_MIN_SPEECH_MS // VAD_FRAME_MS)
+        self.min_silence = max(1, silence_ms // VAD_FRAME_MS)
+        self.noise: Optional[float] = None
+        self.peak = 0.0
+        self.speech_frames = 0
+        self.silent_frames = 0
+
+    @property
+    def ended(self) -> bool:
+        return self.speech_frames >= self.min_speech and self.silent_frames >= self.min_silence
+
+    def feed(self, pcm) -> bool:
+        """Judge whole frames of pcm, which must start on a frame boundary;
+        returns whether the utterance has ended"""
+        samples = pcm_samples(pcm, self.audio_format)
+        energy, zcr = frame_features(samples, self.frame_length, self.full_scale)
+        if not len(energy):
+            return self.ended
+        quietest = float(energy.min())
+        self.noise = quietest if self.noise is None else min(self.noise, quietest)
+        self.peak = max(self.peak, float(energy.max()))
+        threshold = max(VAD_ENERGY_FLOOR,
+                        min(self.noise * VAD_NOISE_FACTOR, self.peak * VAD_PEAK_RATIO))
+        speech = (energy >= threshold) | ((energy >= threshold / 4) & (zcr >= VAD_ZCR_THRESHOLD))
+
+        spoken = np.flatnonzero(speech)
+        if len(spoken):
+            self.speech_frames += len(spoken)
+            self.silent_frames = len(speech) - 1 - int(spoken[-1])
+        else:
+            self.silent_frames += len(speech)
+        return self.ended
+
+class AudioConverter:
+    """Down-mix, resample and re-encode PCM into a target format, chunk by chunk.
+
+    Output is always mono. Working buffers are allocated up front for
+    ``max_chunk_frames`` input frames and only grow if a larger chunk
+    arrives. With ``normalize`` ("peak" or "rms") streamed audio is scaled
+    by a gain based on the levels seen so far; convert_audio_format
+    normalizes whole files against their overall level instead.
+    """
+
+    def __init__(self, source_format: Dict[str, Any],
+                 target_format: Optional[Dict[str, Any]] = None,
+                 normalize: Optional[str] = None,
+                 max_chunk_frames: int = CONVERT_CHUNK_FRAMES):
+        target = {**DEFAULT_AUDIO_FORMAT, **(target_format or {})}
+        self.source = source_format
+        self.target = {key: target[key] for key in DEFAULT_AUDIO_FORMAT}
+        if self.target["channels"] != 1:
+            raise ValueError("Only mono output is supported")
+        try:
+            self.dtype = TARGET_TYPES[(self.target["encoding"], self.target["bit_depth"])]
+        except KeyError:
+            raise ValueError(f"Unsupported target format {self.target}")
+        try:
+            _, self.full_scale = SAMPLE_TYPES[(source_format["encoding"], source_format["bit_depth"])]
+        except KeyError:
+            raise ValueError(f"Unsupported sample format {source_format}")
+        if normalize not in (None, "peak", "rms"):
+            raise ValueError(f"Unknown normalization {normalize!r}")
+
+        self.normalize = normalize
+        self.max_chunk = max_chunk_frames
+        self.resampler = None
+        if source_format["sample_rate"] != self.target["sample_rate"]:
+            self.resampler = Resampler(source_format["sample_rate"],
+                                       self.target["sample_rate"], max_chunk_frames)
+        self._mono = np.empty(max_chunk_frames, dtype=np.float32)
+        self._float = np.empty(0, dtype=np.float32)
+        self._encoded = np.empty(0, dtype=self.dtype)
+        self._reserve(max_chunk_frames)
+        self._peak = 0.0
+        self._energy = 0.0
+        self._count = 0
+
+    def output_length(self, frames: int) -> int:
+        """Samples a whole signal of frames frames converts to"""
+        return self.resampler.output_length(frames) if self.resampler else frames
+
+    def capacity(self, frames: int) -> int:
+        """Room to_float (or flush_float) needs in out for frames input frames"""
+        return self.resampler.capacity(frames) if self.resampler else frames
+
+    def _reserve(self, frames: int):
+        size = self.capacity(frames)
+        if len(self._float) < size:
+            self._float = np.empty(size, dtype=np.float32)
+            self._encoded = np.empty(size, dtype=self.dtype)
+
+    def to_float(self, pcm, out: np.ndarray) -> int:
+        """Mono float32 samples at the target rate into out; returns how many"""
+        samples = pcm_samples(pcm, self.source)
+        written = 0
+        for start in range(0, samples.shape[0], self.max_chunk):
+            mono = downmix(samples[start:start + self.max_chunk], self.full_scale, self._mono)
+            if self.resampler is None:
+                out[written:written + len(mono)] = mono
+                written += len(mono)
+            else:
+                written += self.resampler.process(mono, out[written:])
+        return written
+
+    def flush_float(self, out: np.ndarray) -> int:
+        """Samples held back by the resampling filter, at the end of a stream"""
+        return self.resampler.flush(out) if self.resampler is not None else 0
+
+    def encode(self, samples: np.ndarray, gain: float = 1.0,
+               out: Optional[np.ndarray] = None) -> np.ndarray:
+        """Apply gain and convert to the target encoding; samples is used as scratch"""
+        if out is None:
+            out = self._encoded
+        if self.dtype == np.int16:
+            return quantize_int16(samples, out, gain)
+        view = out[:len(samples)]
+        np.multiply(samples, gain, out=view)
+        return view
+
+    def process(self, pcm) -> memoryview:
+        """Convert the next chunk; the result is only valid until the next call"""
+        self._reserve(len(pcm) // frame_size(self.source))
+        count = self.to_float(pcm, self._float)
+        return self._finish_chunk(count)
+
+    def flush(self) -> memoryview:
+        """The last samples of a stream"""
+        return self._finish_chunk(self.flush_float(self._float))
+
+    def _finish_chunk(self, count: int) -> memoryview:
+        samples = self._float[:count]
+        return memoryview(self.encode(samples, self._running_gain(samples))).cast("B")
+
+    def _running_gain(self, samples: np.ndarray) -> float:
+        if self.normalize is None or not len(samples):
+            return 1.0
+        self._peak = max(self._peak, float(np.max(np.abs(samples))))
+        self._energy += float(np.dot(samples, samples))
+        self._count += len(samples)
+        if self._peak == 0.0:
+            return 1.0
+        if self.normalize == "peak":
+            gain = NORMALIZE_PEAK_TARGET / self._peak
+        else:
+            gain = NORMALIZE_RMS_TARGET / np.sqrt(self._energy / self._count)
+        return min(gain, 1.0 / self._peak, NORMALIZE_MAX_GAIN)
+
+def convert_audio_format(audio_data: AudioData, target_format: Dict[str, Any]) -> bytes:
     """
     Convert audio to required format and normalize volume
     Args:
-        audio_data: Raw audio bytes
-        target_format: Dict with format specifications
-    Returns: Converted audio bytes
+        audio_data: WAV bytes, or an already parsed WavFile; anything else
+            is returned unchanged
+        target_format: Dict with format specifications: "sample_rate",
+            "bit_depth" and "encoding" (defaults 16000, 16, "pcm"; output
+            is always mono), "normalize" ("peak" by default, "rms" or None)
+            and "trim_silence" (default True) to drop silence before and
+            after speech
+    Returns: Converted WAV bytes
     """
     try:
-        # Convert format
-        # Normalize volume
-        # Handle noise reduction
-        return audio_data
+        if not validate_audio_format(audio_data):
+            return bytes(audio_data)
+        wav = parse_wav(audio_data)
+        pcm = wav.pcm
+        if target_format.get("trim_silence", True):
+            pcm = trim_silence(pcm, wav.format)
+
+        # Normalization needs the level of the whole file, so everything is
+        # resampled to float first, then scaled and encoded in one pass
+        normalize = target_format.get("normalize", "peak")
+        converter = AudioConverter(wav.format, target_format)
+        frames = len(pcm) // frame_size(wav.format)
+        samples = np.empty(converter.capacity(frames) + converter.capacity(0), dtype=np.float32)
+        count = converter.to_float(pcm, samples)
+        count += converter.flush_float(samples[count:])
+        target = NORMALIZE_RMS_TARGET if normalize == "rms" else NORMALIZE_PEAK_TARGET
+        gain = normalization_gain(samples[:count], normalize, target, NORMALIZE_MAX_GAIN)
+
+        header = wav_header(converter.target, count * converter.dtype.itemsize)
+        output = bytearray(len(header) + count * converter.dtype.itemsize)
+        output[:len(header)] = header
+        converter.encode(samples[:count], gain,
+                         out=np.frombuffer(output, dtype=converter.dtype, offset=len(header)))
+        return bytes(output)
     except Exception as e:
         raise ValueError(f"Audio conversion failed: {str(e)}")
 
-def get_audio_duration(audio_data: bytes) -> float:
+def get_audio_duration(audio_data: AudioData) -> float:
     """Calculate audio duration from WAV data"""
     try:
-        # Create in-memory file-like object
-        audio_io = io.BytesIO(audio_data)
-        with wave.open(audio_io, 'rb') as wav:
-            frames = wav.getnframes()
-            rate = wav.getframerate()
-            duration = frames / float(rate)
-            return duration
-    except:
+        return parse_wav(audio_data).duration
+    except ValueError:
         return 0.0
 
-def get_audio_properties(audio_data: bytes) -> Dict[str, Any]:
+def get_audio_properties(audio_data: AudioData) -> Dict[str, Any]:
     """
     Get audio properties (sample rate, channels, etc.)
     Returns: Dict with audio properties
     """
     try:
-        # Properties extraction logic
-        return {
-            "sample_rate": 16000,
-            "channels": 1,
-            "bit_depth": 16,
-            "duration": get_audio_duration(audio_data)
-        }
+        return parse_wav(audio_data).properties()
     except Exception as e:
-        raise ValueError(f"Could not get audio properties: {str(e)}") 
\ No newline at end of file
+        raise ValueError(f"Could not get audio properties: {str(e)}")
@@ -0,0 +1,140 @@
+"""Vectorized resampling, down-mixing and quantization of float32 audio"""
+from math import ceil, gcd
+from typing import Optional
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+RESAMPLE_ZERO_CROSSINGS = 16  # sinc lobes on each side of the filter centre
+RESAMPLE_ROLLOFF = 0.95  # cutoff as a fraction of the lower Nyquist frequency
+RESAMPLE_KAISER_BETA = 8.6  # about 80 dB of stopband attenuation
+
+
+class Resampler:
+    """Streaming polyphase windowed-sinc sample-rate converter for mono float32.
+
+    The ratio is reduced to ``up / down`` and one Kaiser-windowed sinc
+    lowpass is split into ``up`` phases, so each output sample is a single
+    dot product of ``taps`` input samples with the phase it falls on. The
+    last ``taps - 1`` input samples are carried between chunks, and all
+    working memory is allocated once for chunks of up to ``max_chunk``
+    samples; larger chunks are processed in pieces.
+    """
+
+    def __init__(self, from_rate: int, to_rate: int, max_chunk: int = 8192):
+        divisor = gcd(from_rate, to_rate)
+        self.up = to_rate // divisor
+        self.down = from_rate // divisor
+        self.max_chunk = max_chunk
+
+        # Prototype lowpass at the upsampled rate, cutting off below the
+        # lower of the two Nyquist frequencies
+        cutoff = RESAMPLE_ROLLOFF * 0.5 / max(self.up, self.down)  # cycles per upsampled sample
+        half = ceil(RESAMPLE_ZERO_CROSSINGS / (2 * cutoff))
+        self.taps = ceil(2 * half / self.up)
+        length = self.up * self.taps
+        self.delay = (length - 1) // 2  # group delay in upsampled samples
+        # Centred on a whole sample so outputs line up exactly with the input
+        n = np.arange(length) - self.delay
+        prototype = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, RESAMPLE_KAISER_BETA)
+        prototype *= self.up  # zero-stuffing divides the level by up
+        # phases[p, c] weights input window column c for outputs on phase p;
+        # columns run oldest to newest, so taps are reversed
+        self.phases = prototype.reshape(self.taps, self.up).T[:, ::-1].astype(np.float32)
+
+        self.position = self.delay  # upsampled time of the next output sample
+        self.consumed = 0  # input samples seen
+        self.emitted = 0  # output samples produced
+        self.max_out = max_chunk * self.up // self.down + 2
+        self._input = np.zeros(self.taps - 1 + max_chunk, dtype=np.float32)
+        self._windows = np.empty((self.max_out, self.taps), dtype=np.float32)
+        self._weights = np.empty((self.max_out, self.taps), dtype=np.float32)
+
+    def output_length(self, input_length: int) -> int:
+        """Samples a whole signal of input_length samples resamples to"""
+        return ceil(input_length * self.up / self.down)
+
+    def capacity(self, input_length: int) -> int:
+        """Room process (or flush) may need in out for a chunk of input_length"""
+        input_length = max(input_length, self.delay // self.up + 2)
+        return self.output_length(input_length) + input_length // self.max_chunk + 2
+
+    def process(self, chunk: np.ndarray, out: np.ndarray) -> int:
+        """Resample the next chunk into out, which needs capacity(len(chunk))
+        samples; returns how many were written"""
+        written = 0
+        for start in range(0, len(chunk), self.max_chunk):
+            written += self._process(chunk[start:start + self.max_chunk], out[written:])
+        return written
+
+    def _process(self, chunk: np.ndarray, out: np.ndarray) -> int:
+        history = self.taps - 1
+        size = len(chunk)
+        self._input[history:history + size] = chunk
+
+        # Outputs whose newest input sample is now available
+        last = (self.consumed + size) * self.up - 1
+        count = max(0, (last - self.position) // self.down + 1)
+        times = self.position + self.down * np.arange(count)
+        # Window row r covers input samples r .. r + taps - 1 of the
+        # buffer, which starts taps - 1 samples before the chunk
+        rows = times // self.up - self.consumed
+        windows = sliding_window_view(self._input[:history + size], self.taps)
+        np.take(windows, rows, axis=0, out=self._windows[:count])
+        np.take(self.phases, times % self.up, axis=0, out=self._weights[:count])
+        np.einsum("ij,ij->i", self._windows[:count], self._weights[:count], out=out[:count])
+
+        self.position += count * self.down
+        self.consumed += size
+        self.emitted += count
+        self._input[:history] = self._input[size:size + history]
+        return count
+
+    def flush(self, out: np.ndarray) -> int:
+        """Emit the samples still held back by the filter delay"""
+        remaining = self.output_length(self.consumed) - self.emitted
+        if remaining <= 0:
+            return 0
+        padding = np.zeros(self.delay // self.up + 2, dtype=np.float32)
+        written = min(self.process(padding, out), remaining)
+        self.emitted = self.output_length(self.consumed)
+        return written
+
+
+def downmix(samples: np.ndarray, full_scale: float, out: np.ndarray) -> np.ndarray:
+    """Average (frames, channels) samples into mono float32 in [-1, 1]"""
+    view = out[:samples.shape[0]]
+    if samples.shape[1] == 1:
+        np.multiply(samples[:, 0], 1.0 / full_scale, out=view, casting="unsafe")
+    else:
+        np.sum(samples, axis=1, dtype=np.float32, out=view)
+        view *= 1.0 / (full_scale * samples.shape[1])
+    return view
+
+
+def normalization_gain(samples: np.ndarray, mode: Optional[str], target: float,
+                       max_gain: float) -> float:
+    """Gain bringing the peak or RMS level of samples to target, never
+    clipping and never amplifying by more than max_gain"""
+    if mode is None or not len(samples):
+        return 1.0
+    peak = float(np.max(np.abs(samples)))
+    if peak == 0.0:
+        return 1.0
+    if mode == "peak":
+        level = peak
+    elif mode == "rms":
+        level = float(np.sqrt(np.dot(samples, samples) / len(samples)))
+    else:
+        raise ValueError(f"Unknown normalization {mode!r}")
+    return min(target / level, 1.0 / peak, max_gain)
+
+
+def quantize_int16(samples: np.ndarray, out: np.ndarray, gain: float = 1.0) -> np.ndarray:
+    """Scale float samples in [-1, 1] into int16, rounding and clipping.
+    samples is used as scratch space."""
+    samples *= 32767.0 * gain
+    np.rint(samples, out=samples)
+    np.clip(samples, -32768, 32767, out=samples)
+    view = out[:len(samples)]
+    np.copyto(view, samples, casting="unsafe")
+    return view
@@ -0,0 +1,52 @@
+"""Real-time factor of converting browser audio to 16 kHz mono int16"""
+import time
+import numpy as np
+from app.utils.audio import AudioConverter, convert_audio_format, wav_header
+
+SECONDS = 60
+CHUNK_MS = 100
+SOURCES = [
+    {"sample_rate": 48000, "channels": 2, "bit_depth": 32, "encoding": "float"},
+    {"sample_rate": 44100, "channels": 2, "bit_depth": 16, "encoding": "pcm"},
+    {"sample_rate": 16000, "channels": 1, "bit_depth": 16, "encoding": "pcm"},
+]
+
+
+def source_audio(audio_format) -> bytes:
+    rng = np.random.default_rng(42)
+    shape = (audio_format["sample_rate"] * SECONDS, audio_format["channels"])
+    signal = rng.normal(0, 0.2, shape).clip(-1, 1)
+    if audio_format["encoding"] == "float":
+        return signal.astype("<f4").tobytes()
+    return (signal * 32767).astype("<i2").tobytes()
+
+
+def report(label: str, elapsed: float, source: bytes, output: int):
+    print(f"{label:<46} RTF {elapsed / SECONDS:.4f}  "
+          f"({SECONDS / elapsed:6.0f}x real time)  {len(source) / output:4.1f}x fewer bytes")
+
+
+def main():
+    for audio_format in SOURCES:
+        pcm = source_audio(audio_format)
+        name = (f"{audio_format['sample_rate'] / 1000:g} kHz {audio_format['channels']}ch "
+                f"{audio_format['encoding']}{audio_format['bit_depth']}")
+
+        converter = AudioConverter(audio_format, normalize="peak")
+        chunk = audio_format["sample_rate"] * CHUNK_MS // 1000 * audio_format["channels"] \
+            * audio_format["bit_depth"] // 8
+        output = 0
+        began = time.perf_counter()
+        for start in range(0, len(pcm), chunk):
+            output += len(converter.process(pcm[start:start + chunk]))
+        output += len(converter.flush())
+        report(f"{name}, streamed in {CHUNK_MS} ms chunks", time.perf_counter() - began, pcm, output)
+
+        wav = wav_header(audio_format, len(pcm)) + pcm
+        began = time.perf_counter()
+        converted = convert_audio_format(wav, {"trim_silence": False})
+        report(f"{name}, whole file", time.perf_counter() - began, pcm, len(converted))
+
+
+if __name__ == "__main__":
+    main()
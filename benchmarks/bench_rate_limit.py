@@ -0,0 +1,48 @@
+"""Per-check cost of SlidingWindowLimiter with many distinct clients"""
+import os
+import random
+import tempfile
+import time
+from app.middleware.rate_limit import SlidingWindowLimiter
+from app.middleware.rate_limit_store import SQLiteRateLimitStore
+
+CLIENTS = 100_000
+CHECKS = 1_000_000
+
+
+def bench(label: str, limiter: SlidingWindowLimiter, keys, start: float, step: float):
+    now = start
+    began = time.perf_counter()
+    for key in keys:
+        limiter.hit(key, now)
+        now += step
+    elapsed = time.perf_counter() - began
+    print(f"{label:<32} {elapsed / len(keys) * 1e9:8.0f} ns/check  "
+          f"{len(limiter):>7} keys tracked")
+
+
+def main():
+    clients = [f"10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}" for i in range(CLIENTS)]
+
+    limiter = SlidingWindowLimiter(limit=100, interval=60, max_keys=CLIENTS)
+    bench("warm-up (first sight)", limiter, clients, 0.0, 1e-6)
+
+    steady = [random.choice(clients) for _ in range(CHECKS)]
+    bench("steady state, 100k clients", limiter, steady, 1.0, 1e-6)
+
+    # Calls spread over ten minutes so most keys go idle and are evicted
+    churn = [f"churn-{i}" for i in range(CHECKS)]
+    limiter = SlidingWindowLimiter(limit=100, interval=60, max_keys=CLIENTS)
+    bench("churn, 1M one-off clients", limiter, churn, 0.0, 600 / CHECKS)
+
+    # Shared store used by multi-worker deployments
+    with tempfile.TemporaryDirectory() as tmp:
+        store = SQLiteRateLimitStore(os.path.join(tmp, "limits.db"))
+        limiter = SlidingWindowLimiter(limit=100, interval=60, store=store)
+        bench("sqlite warm-up (first sight)", limiter, clients, 0.0, 1e-6)
+        bench("sqlite steady, 100k clients", limiter, steady[:CLIENTS], 1.0, 1e-6)
+        store.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+"""Throughput of voice activity detection and silence trimming"""
+import os
+import tempfile
+import time
+import numpy as np
+from app.utils.audio import read_wav_header, trim_silence, voice_segments
+from tests.data.generate_sample_audio import create_sample_wav
+
+SAMPLE_RATE = 16000
+REPEATS = 60  # one minute of audio
+ROUNDS = 20
+
+
+def sample_utterances() -> bytes:
+    """The fixture tone as speech, with noisy pauses of varying length between"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "sample.wav")
+        create_sample_wav(path, duration=0.6, sample_rate=SAMPLE_RATE)
+        with open(path, "rb") as f:
+            data = f.read()
+    audio_format, offset = read_wav_header(data)
+    tone = np.frombuffer(data, dtype="<i2", offset=offset) // 2
+    rng = np.random.default_rng(42)
+    parts = []
+    for _ in range(REPEATS):
+        parts.append(rng.normal(0, 40, int(SAMPLE_RATE * rng.uniform(0.1, 0.8))).astype("<i2"))
+        parts.append(tone)
+    return audio_format, np.concatenate(parts).tobytes()
+
+
+def bench(label: str, fn, samples: int):
+    fn()  # warm up
+    began = time.perf_counter()
+    for _ in range(ROUNDS):
+        fn()
+    elapsed = (time.perf_counter() - began) / ROUNDS
+    print(f"{label:<24} {samples / elapsed / 1e6:8.1f} M samples/s  "
+          f"{elapsed * 1e3:7.2f} ms per {samples / SAMPLE_RATE:.0f} s of audio")
+
+
+def main():
+    audio_format, pcm = sample_utterances()
+    samples = len(pcm) // 2
+    segments = voice_segments(pcm, audio_format)
+    speech = sum(end - start for start, end in segments) // 2
+    print(f"{len(segments)} segments, {speech / samples:.0%} of the audio kept")
+    bench("voice_segments", lambda: voice_segments(pcm, audio_format), samples)
+    bench("trim_silence", lambda: trim_silence(pcm, audio_format), samples)
+
+
+if __name__ == "__main__":
+    main()
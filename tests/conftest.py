@@ -23,7 +23,7 @@ def client():
 @pytest.fixture
 def mock_groq():
     """Fixture for mocked Groq client"""
-    with patch('groq.Client') as mock:
+    with patch('groq.AsyncGroq') as mock:
         yield mock
 
 @pytest.fixture
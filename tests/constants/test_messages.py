@@ -7,15 +7,29 @@ class MessageType(Enum):
     COMMAND_INSERT = "insert_text"
     COMMAND_REPLACE = "replace_text"
     COMMAND_UNDO = "undo_change"
+    COMMAND_ACCEPT_ALL = "accept_all"
     
     # Error messages
     ERROR_INVALID_COMMAND = "invalid_command"
     ERROR_NO_SELECTION = "no_selection"
     ERROR_PROCESSING = "processing_error"
+    ERROR_RATE_LIMIT = "rate_limit"
+    ERROR_VOICE_COOLDOWN = "voice_cooldown"
+    ERROR_API_LIMIT = "api_limit"
+    ERROR_WEBSOCKET_LIMIT = "websocket_limit"
+    ERROR_PARAGRAPH_LOCKED = "paragraph_locked"
+    ERROR_EDIT_CONFLICT = "edit_conflict"
+    ERROR_INVALID_AUDIO = "invalid_audio"
+    ERROR_DOC_NOT_FOUND = "doc_not_found"
+    ERROR_INVALID_DOC_TYPE = "invalid_doc_type"
     
     # Success messages
     SUCCESS_CHANGE = "change_applied"
     SUCCESS_UNDO = "change_undone"
+    SUCCESS_PROCESS = "suggestions_ready"
+    APPENDIX_GENERATED = "appendix_generated"
+    DOC_INITIALIZED = "doc_initialized"
+    CHANGES_APPLIED = "changes_applied"
 
 # Mapping of message types to their output strings
 MESSAGE_OUTPUTS: Dict[MessageType, str] = {
@@ -23,13 +37,27 @@ MESSAGE_OUTPUTS: Dict[MessageType, str] = {
     MessageType.COMMAND_INSERT: "Inserting text at cursor position",
     MessageType.COMMAND_REPLACE: "Replacing selected text with: {new_text}",
     MessageType.COMMAND_UNDO: "Undoing last change",
+    MessageType.COMMAND_ACCEPT_ALL: "Accepting all changes and moving to final",
     
     MessageType.ERROR_INVALID_COMMAND: "Invalid command: {command}",
     MessageType.ERROR_NO_SELECTION: "No text selected",
     MessageType.ERROR_PROCESSING: "Error processing command: {error}",
+    MessageType.ERROR_RATE_LIMIT: "Too many requests, please slow down",
+    MessageType.ERROR_VOICE_COOLDOWN: "Too many voice commands, please wait a moment",
+    MessageType.ERROR_API_LIMIT: "Suggestion limit reached, please wait a moment",
+    MessageType.ERROR_WEBSOCKET_LIMIT: "Too many messages, please slow down",
+    MessageType.ERROR_PARAGRAPH_LOCKED: "Paragraph is being edited by {user}",
+    MessageType.ERROR_EDIT_CONFLICT: "Paragraph changed while you were editing, please reapply your edit",
+    MessageType.ERROR_INVALID_AUDIO: "Could not read audio: {error}",
+    MessageType.ERROR_DOC_NOT_FOUND: "Document not found",
+    MessageType.ERROR_INVALID_DOC_TYPE: "Unsupported document type: {type}",
     
     MessageType.SUCCESS_CHANGE: "Successfully applied {change_type}",
-    MessageType.SUCCESS_UNDO: "Successfully undid last change"
+    MessageType.SUCCESS_UNDO: "Successfully undid last change",
+    MessageType.SUCCESS_PROCESS: "Suggestions ready",
+    MessageType.APPENDIX_GENERATED: "Change history appendix generated",
+    MessageType.DOC_INITIALIZED: "Document ready for redlining",
+    MessageType.CHANGES_APPLIED: "Changes applied"
 }
 
 def get_message(message_type: MessageType, **kwargs) -> str:
@@ -0,0 +1,157 @@
+"""Local stand-in for the Groq chat completions API, for offline tests"""
+import asyncio
+import json
+import re
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+
+def default_reply(request: Dict[str, Any]) -> str:
+    """Echo the prompt back as two suggestion lines"""
+    prompt = request["messages"][-1]["content"]
+    return f"Suggestion one for: {prompt}\nSuggestion two for: {prompt}"
+
+
+class FakeGroqServer:
+    """Minimal HTTP/1.1 server speaking the OpenAI-compatible chat API.
+
+    Supports keep-alive so connection pooling can be observed through
+    ``connections``; every parsed request body is kept in ``requests``.
+    Requests with ``stream`` set are answered as server-sent events, one
+    word per chunk with ``token_delay`` seconds between chunks.
+
+    Failures can be injected with ``fail_next`` (answer the next requests
+    with an error status) and ``unavailable_models`` (answer 404 for them).
+    """
+
+    def __init__(self, reply: Callable[[Dict[str, Any]], str] = default_reply,
+                 delay: float = 0.0, token_delay: float = 0.0):
+        self.reply = reply
+        self.delay = delay
+        self.token_delay = token_delay
+        self.requests: List[Dict[str, Any]] = []
+        self.connections = 0
+        self.failures: List[Tuple[int, Dict[str, str]]] = []
+        self.unavailable_models: Set[str] = set()
+        self.server: Optional[asyncio.AbstractServer] = None
+        self.base_url = ""
+
+    async def start(self) -> str:
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.base_url = f"http://127.0.0.1:{port}"
+        return self.base_url
+
+    async def stop(self):
+        if self.server:
+            self.server.close()
+            await self.server.wait_closed()
+            self.server = None
+
+    def fail_next(self, status: int, count: int = 1, headers: Optional[Dict[str, str]] = None):
+        """Answer the next ``count`` completion requests with ``status``"""
+        self.failures.extend([(status, headers or {})] * count)
+
+    async def __aenter__(self) -> "FakeGroqServer":
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.stop()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.connections += 1
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = (await reader.readline()).decode().strip()
+                    if not line:
+                        break
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get("content-length", 0)))
+                await self._respond(request_line.decode(), body, writer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _respond(self, request_line: str, body: bytes, writer: asyncio.StreamWriter):
+        if "/chat/completions" not in request_line:
+            self._write(writer, 404, {"error": {"message": "not found"}})
+            return
+
+        request = json.loads(body)
+        self.requests.append(request)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+
+        if request["model"] in self.unavailable_models:
+            self._write(writer, 404, {"error": {"message": "model not found"}})
+            await writer.drain()
+            return
+        if self.failures:
+            status, headers = self.failures.pop(0)
+            self._write(writer, status, {"error": {"message": "injected failure"}}, headers)
+            await writer.drain()
+            return
+
+        if request.get("stream"):
+            await self._stream(request, writer)
+            return
+
+        self._write(writer, 200, {
+            "id": f"chatcmpl-{len(self.requests)}",
+            "object": "chat.completion",
+            "created": 0,
+            "model": request["model"],
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": self.reply(request)},
+                "finish_reason": "stop"
+            }],
+            "usage": {"prompt_tokens": 1, "completion_tokens": 1, "total_tokens": 2}
+        })
+        await writer.drain()
+
+    async def _stream(self, request: Dict[str, Any], writer: asyncio.StreamWriter):
+        writer.write(("HTTP/1.1 200 OK\r\n"
+                      "Content-Type: text/event-stream\r\n"
+                      "Transfer-Encoding: chunked\r\n"
+                      "Connection: keep-alive\r\n\r\n").encode())
+        tokens = re.findall(r"\S+\s*|\s+", self.reply(request))
+        for token in tokens + [None]:
+            chunk = {
+                "id": f"chatcmpl-{len(self.requests)}",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": request["model"],
+                "choices": [{
+                    "index": 0,
+                    "delta": {"content": token} if token is not None else {},
+                    "finish_reason": None if token is not None else "stop"
+                }]
+            }
+            self._write_chunk(writer, f"data: {json.dumps(chunk)}\n\n")
+            await writer.drain()
+            if self.token_delay and token is not None:
+                await asyncio.sleep(self.token_delay)
+        self._write_chunk(writer, "data: [DONE]\n\n")
+        writer.write(b"0\r\n\r\n")
+        await writer.drain()
+
+    def _write_chunk(self, writer: asyncio.StreamWriter, data: str):
+        encoded = data.encode()
+        writer.write(f"{len(encoded):x}\r\n".encode() + encoded + b"\r\n")
+
+    def _write(self, writer: asyncio.StreamWriter, status: int, payload: Dict[str, Any],
+               headers: Optional[Dict[str, str]] = None):
+        body = json.dumps(payload).encode()
+        head = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", "Content-Type: application/json",
+                f"Content-Length: {len(body)}", "Connection: keep-alive"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
@@ -0,0 +1,127 @@
+"""The FastAPI app end to end through TestClient, with no upstream calls"""
+import pytest
+from unittest.mock import patch
+from fastapi.testclient import TestClient
+from app.services.redline_diff import apply_changed_spans
+from app.services.resilience import UpstreamUnavailableError
+
+# MessageLoader cannot be constructed as shipped; give it the hook it expects
+with patch("tests.constants.message_loader.MessageLoader.load_translations", create=True):
+    from app import main
+
+
+@pytest.fixture
+def client():
+    with TestClient(main.app) as client:
+        yield client
+
+
+def test_failed_suggestion_keeps_socket_open(client, monkeypatch):
+    async def unavailable(attempt):
+        raise UpstreamUnavailableError("No upstream model available")
+
+    monkeypatch.setattr(main.ai_processor.resilience, "call", unavailable)
+
+    with client.websocket_connect("/ws/doc_failing?user_id=alice") as ws:
+        assert ws.receive_json()["type"] == "user_joined"
+        for paragraph_id in ("p1", "p2"):
+            ws.send_json({"type": "suggestion", "text": "Pay now.", "paragraph_id": paragraph_id})
+            frame = ws.receive_json()
+            assert frame["type"] == "error"
+            assert frame["paragraph_id"] == paragraph_id
+            assert "No upstream model available" in frame["error"]
+        assert main.manager.connection_count("doc_failing") == 1
+
+
+def test_broken_frame_gets_an_error_before_the_socket_closes(client):
+    with client.websocket_connect("/ws/doc_broken?user_id=alice") as ws:
+        assert ws.receive_json()["type"] == "user_joined"
+        ws.send_text("not json")
+        assert "error" in ws.receive_json()
+    assert main.manager.connection_count("doc_broken") == 0
+
+
+def test_apply_changes_merges_concurrent_edits(client):
+    base = "Pay within 30 days of receipt."
+    first = client.post("/apply-changes/doc_merge", json={
+        "paragraph_id": "p1", "user_id": "alice", "original": base,
+        "new": "Pay within 30 days of invoice receipt.", "base_version": 0
+    })
+    # Bob edited the same version, in a different place
+    second = client.post("/apply-changes/doc_merge", json={
+        "paragraph_id": "p1", "user_id": "bob", "original": base,
+        "op": [0, 3, "Remit"], "base_version": 0
+    })
+
+    assert first.status_code == second.status_code == 200
+    assert first.json()["version"] == 1
+    assert second.json()["version"] == 2
+    paragraph = main.document_editor.documents["doc_merge"]["paragraphs"]["p1"]
+    assert paragraph.current == "Remit within 30 days of invoice receipt."
+    # The redline goes out as changed spans against the original, not HTML
+    assert "html" not in second.json()
+    assert apply_changed_spans(base, second.json()["changes"]) == paragraph.current
+
+
+def test_unmergeable_edit_is_a_conflict(client):
+    edit = {"paragraph_id": "p1", "user_id": "alice", "original": "Net 30."}
+    client.post("/apply-changes/doc_conflict", json={**edit, "new": "Net 45."})
+
+    # Made on a version the server has never seen
+    response = client.post("/apply-changes/doc_conflict",
+                           json={**edit, "new": "Net 60.", "base_version": 7})
+
+    assert response.status_code == 409
+    assert response.json()["detail"]["text"] == "Net 45."
+    assert response.json()["detail"]["version"] == 1
+
+
+def test_apply_changes_requires_paragraph_and_user(client):
+    response = client.post("/apply-changes/doc_merge", json={"new": "Text."})
+
+    assert response.status_code == 422
+
+
+def test_lease_expiring_mid_edit_lets_others_in(client, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(main.document_editor.locks, "clock", lambda: now[0])
+    edit = {"paragraph_id": "p1", "original": "Net 30.", "new": "Net 45."}
+
+    with client.websocket_connect("/ws/doc_lease?user_id=alice") as ws:
+        assert ws.receive_json()["type"] == "user_joined"
+        ws.send_json({"type": "lock", "paragraph_id": "p1"})
+        reply = ws.receive_json()
+        assert reply["type"] == "lock" and reply["lease"]["holder"] == "alice"
+        token = reply["lease"]["token"]
+
+        # Held while alice heartbeats
+        blocked = client.post("/apply-changes/doc_lease", json={**edit, "user_id": "bob"})
+        assert blocked.status_code == 423
+        assert blocked.json()["detail"]["holder"] == "alice"
+        # The refused edit is not broadcast: the next frame is the heartbeat reply
+        ws.send_json({"type": "heartbeat", "paragraph_id": "p1", "token": token})
+        assert ws.receive_json() == {"type": "heartbeat", "paragraph_id": "p1", "held": True}
+
+        # Alice goes quiet mid-edit and loses the lease
+        now[0] += main.document_editor.locks.lease_ttl
+        ws.send_json({"type": "heartbeat", "paragraph_id": "p1", "token": token})
+        assert ws.receive_json()["held"] is False
+        applied = client.post("/apply-changes/doc_lease", json={**edit, "user_id": "bob"})
+        assert applied.json()["version"] == 1
+        assert ws.receive_json()["changes"]["version"] == 1
+
+        ws.send_json({"type": "unlock", "paragraph_id": "p1", "token": token})
+        assert ws.receive_json()["released"] is False
+
+
+def test_disconnecting_releases_the_sockets_leases(client):
+    edit = {"paragraph_id": "p1", "original": "Net 30.", "new": "Net 45.", "user_id": "bob"}
+
+    with client.websocket_connect("/ws/doc_left?user_id=alice") as ws:
+        assert ws.receive_json()["type"] == "user_joined"
+        ws.send_json({"type": "lock", "paragraph_id": "p1"})
+        assert ws.receive_json()["lease"]["holder"] == "alice"
+    # Alice's tab closed without unlocking
+
+    assert main.document_editor.locks.holder("doc_left", "p1") is None
+    assert client.post("/apply-changes/doc_left", json=edit).json()["version"] == 1
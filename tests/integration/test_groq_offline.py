@@ -0,0 +1,256 @@
+"""AIProcessor against the local fake Groq server, no network needed"""
+import asyncio
+import json
+import pytest
+import pytest_asyncio
+from unittest.mock import patch
+from app.config import settings
+from app.services.ai_processor import AIProcessor, BATCH_PROMPT_VERSION, PROMPT_VERSION
+from app.services.concurrency_limiter import AdaptiveLimiter, BACKGROUND, INTERACTIVE
+from app.services.redline_diff import apply_changed_spans
+from tests.data.fake_groq_server import FakeGroqServer
+
+
+@pytest_asyncio.fixture
+async def fake_groq():
+    async with FakeGroqServer() as server:
+        yield server
+
+
+@pytest_asyncio.fixture
+async def processor(fake_groq, monkeypatch):
+    monkeypatch.setattr(settings, "GROQ_BASE_URL", fake_groq.base_url)
+    with patch("app.services.ai_processor.MessageLoader"):
+        processor = AIProcessor()
+    yield processor
+    await processor.close()
+
+
+@pytest.mark.asyncio
+async def test_suggestions_round_trip(processor, fake_groq):
+    suggestions = await processor._get_groq_suggestions("The party shall pay.")
+
+    assert [s["text"] for s in suggestions] == [
+        "Suggestion one for: Suggest improvements for: The party shall pay.",
+        "Suggestion two for: Suggest improvements for: The party shall pay.",
+    ]
+    assert fake_groq.requests[0]["max_tokens"] == 2048
+
+
+@pytest.mark.asyncio
+async def test_connections_are_pooled_and_kept_alive(processor, fake_groq):
+    for i in range(5):
+        await processor._get_groq_suggestions(f"Clause {i}")
+
+    assert len(fake_groq.requests) == 5
+    assert fake_groq.connections == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrency_is_capped(processor, fake_groq, monkeypatch):
+    fake_groq.delay = 0.05
+    processor.upstream_limiter = AdaptiveLimiter(min_limit=2, max_limit=2, initial_limit=2)
+    in_flight, peak = 0, 0
+    create = processor.client.chat.completions.create
+
+    async def tracking_create(**kwargs):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        try:
+            return await create(**kwargs)
+        finally:
+            in_flight -= 1
+
+    monkeypatch.setattr(processor.client.chat.completions, "create", tracking_create)
+    await asyncio.gather(*(processor._get_groq_suggestions(f"Clause {i}") for i in range(6)))
+
+    assert peak == 2
+    assert len(fake_groq.requests) == 6
+
+
+@pytest.mark.asyncio
+async def test_streaming_publishes_partial_frames(processor, fake_groq, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_FLUSH_INTERVAL_MS", 0)
+    fake_groq.token_delay = 0.001
+    frames = []
+
+    async def publish(frame):
+        frames.append(frame)
+
+    result = await processor.process_suggestion("doc_1", "Pay now.", "p1", publish=publish)
+
+    assert fake_groq.requests[0]["stream"] is True
+    assert len(frames) > 2
+    assert all(frame["type"] == "suggestion_partial" for frame in frames)
+    # Only the changed spans are sent, never the whole text again
+    assert all(frame["preview"] == {"partial": True, "changes": frame["preview"]["changes"]}
+               and "text" not in frame for frame in frames)
+    texts = [apply_changed_spans("Pay now.", frame["preview"]["changes"]) for frame in frames]
+    assert [len(text) for text in texts] == sorted(len(text) for text in texts)
+    assert result["type"] == "suggestions"
+    assert [s["text"] for s in result["suggestions"]] == texts[-1].split("\n")
+
+
+@pytest.mark.asyncio
+async def test_streaming_can_be_disabled(processor, fake_groq, monkeypatch):
+    monkeypatch.setattr(settings, "STREAM_SUGGESTIONS", False)
+    frames = []
+
+    async def publish(frame):
+        frames.append(frame)
+
+    result = await processor.process_suggestion("doc_1", "Pay now.", "p1", publish=publish)
+
+    assert frames == []
+    assert "stream" not in fake_groq.requests[0]
+    assert len(result["suggestions"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_repeated_text_is_served_from_cache(processor, fake_groq):
+    first = await processor._get_groq_suggestions("The party shall pay.")
+    second = await processor._get_groq_suggestions("The party  shall pay.")
+
+    assert first == second
+    assert len(fake_groq.requests) == 1
+    assert processor.suggestion_cache.stats()["hits"] == 1
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_requests_share_one_call(processor, fake_groq):
+    fake_groq.delay = 0.05
+
+    results = await asyncio.gather(
+        *(processor._get_groq_suggestions("Same clause") for _ in range(4))
+    )
+
+    assert all(result == results[0] for result in results)
+    assert len(fake_groq.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_whole_document_review_is_batched(processor, fake_groq):
+    def reply(request):
+        prompt = request["messages"][-1]["content"]
+        items = json.loads(prompt[prompt.index("["):])
+        return json.dumps({item["id"]: [item["text"].upper()] for item in items})
+
+    fake_groq.reply = reply
+    paragraphs = {f"p{i}": f"clause {i}" for i in range(12)}
+
+    result = await processor.suggest_document("doc_1", paragraphs)
+
+    assert result["errors"] == {}
+    assert result["suggestions"]["p7"] == [{"text": "CLAUSE 7", "confidence": 0.9}]
+    assert len(fake_groq.requests) == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_call_honours_retry_after(processor, fake_groq):
+    fake_groq.fail_next(429, headers={"retry-after": "0"})
+
+    suggestions = await processor._get_groq_suggestions("Retry me.")
+
+    assert suggestions
+    assert len(fake_groq.requests) == 2
+    assert processor.resilience.retries == 1
+
+
+@pytest.mark.asyncio
+async def test_unavailable_primary_fails_over(processor, fake_groq):
+    fake_groq.unavailable_models.add(settings.PRIMARY_MODEL)
+
+    suggestions = await processor._get_groq_suggestions("Fail over.")
+
+    assert suggestions
+    assert [r["model"] for r in fake_groq.requests] == [
+        settings.PRIMARY_MODEL, settings.FALLBACK_MODEL
+    ]
+
+
+@pytest.mark.asyncio
+async def test_originals_are_kept_per_document(processor, fake_groq):
+    await processor.process_suggestion("doc_1", "First document.", "p1")
+    result = await processor.process_suggestion("doc_2", "Second document.", "p1")
+
+    assert result["original_text"] == "Second document."
+    assert processor.snapshot_session("doc_1")["paragraphs"]["p1"]["original"] == "First document."
+
+
+@pytest.mark.asyncio
+async def test_accept_all_streams_the_appendix(processor, monkeypatch):
+    monkeypatch.setattr(settings, "APPENDIX_CHUNK_CHARS", 64)
+    for i in range(5):
+        await processor.apply_suggestion(f"p{i}", f"Better clause {i}.", document_id="doc_1")
+    frames = []
+
+    async def publish(frame):
+        frames.append(frame)
+
+    result = await processor.accept_all_changes("doc_1", publish=publish)
+
+    assert len(frames) > 1
+    assert all(frame["type"] == "appendix_chunk" for frame in frames)
+    assert "".join(frame["text"] for frame in frames) == result["appendix"]
+    assert result["appendix"] == processor._generate_change_appendix("doc_1")
+    assert result["appendix"].startswith("# Document Change History\n\n## Paragraph p0\n")
+
+
+@pytest.mark.asyncio
+async def test_batch_fallback_is_cached_under_its_own_prompt(processor, fake_groq):
+    def reply(request):
+        prompt = request["messages"][-1]["content"]
+        if "[" not in prompt:
+            return "Single answer"
+        # The batched answer leaves out p1, which falls back to a single call
+        return json.dumps({"p0": ["Batched answer"]})
+
+    fake_groq.reply = reply
+    await processor.suggest_document("doc_1", {"p0": "clause 0", "p1": "clause 1"})
+    cache = processor.suggestion_cache
+    # One miss per paragraph, however many keys were tried
+    assert cache.stats()["misses"] == 2
+
+    assert cache.get(processor._suggestion_key("clause 0", BATCH_PROMPT_VERSION)) == [
+        {"text": "Batched answer", "confidence": 0.9}]
+    assert cache.get(processor._suggestion_key("clause 1", BATCH_PROMPT_VERSION)) is None
+    assert cache.get(processor._suggestion_key("clause 1", PROMPT_VERSION)) == [
+        {"text": "Single answer", "confidence": 0.9}]
+
+
+@pytest.mark.asyncio
+async def test_interactive_request_does_not_wait_on_background_call(processor, fake_groq):
+    fake_groq.delay = 0.05
+    processor.upstream_limiter = AdaptiveLimiter(min_limit=1, max_limit=1, initial_limit=1)
+    finished = []
+
+    async def request(text, priority):
+        await processor._get_groq_suggestions(text, priority=priority)
+        finished.append(priority)
+
+    blocker = asyncio.create_task(processor._get_groq_suggestions("Other clause"))
+    await asyncio.sleep(0.01)
+    background = asyncio.create_task(request("Same clause", BACKGROUND))
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(request("Same clause", INTERACTIVE))
+    await asyncio.gather(blocker, background, interactive)
+
+    assert finished == [INTERACTIVE, BACKGROUND]
+    assert len(fake_groq.requests) == 3
+
+
+@pytest.mark.asyncio
+async def test_fallback_answers_are_not_served_once_primary_recovers(processor, fake_groq):
+    fake_groq.unavailable_models.add(settings.PRIMARY_MODEL)
+    await processor._get_groq_suggestions("Fail over.")
+    cache = processor.suggestion_cache
+
+    assert cache.get(processor._suggestion_key("Fail over.")) is None
+    assert cache.get(processor._suggestion_key("Fail over.", model=settings.FALLBACK_MODEL))
+
+    fake_groq.unavailable_models.clear()
+    await processor._get_groq_suggestions("Fail over.")
+
+    assert fake_groq.requests[-1]["model"] == settings.PRIMARY_MODEL
+    assert cache.get(processor._suggestion_key("Fail over."))
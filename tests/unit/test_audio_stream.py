@@ -0,0 +1,178 @@
+"""Tests for streaming voice audio ingestion"""
+import asyncio
+import io
+import wave
+import numpy as np
+import pytest
+from app.services.audio_stream import AudioRingBuffer, AudioStream, VoiceStreams
+
+
+def make_wav(pcm: bytes, sample_rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm)
+    return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_ring_buffer_wraps_around():
+    ring = AudioRingBuffer(8)
+    await ring.put(b"abcdef")
+    assert await ring.read(4) == b"abcd"
+    await ring.put(b"ghijkl")  # wraps past the end of the buffer
+    assert await ring.read(8) == b"efghijkl"
+    await ring.close()
+    assert await ring.read(4) == b""
+
+
+@pytest.mark.asyncio
+async def test_full_ring_buffer_pushes_back_on_the_writer():
+    ring = AudioRingBuffer(4)
+    writer = asyncio.create_task(ring.put(b"12345678"))
+    await asyncio.sleep(0.01)
+    assert not writer.done() and ring.size == 4
+
+    assert await ring.read(4) == b"1234"
+    await asyncio.wait_for(writer, 1)
+    assert await ring.read(4) == b"5678"
+
+
+@pytest.mark.asyncio
+async def test_wav_header_split_across_frames():
+    pcm = bytes(range(256)) * 40
+    data = make_wav(pcm)
+    stream = AudioStream(buffer_bytes=1024, chunk_ms=10)
+    for i in range(0, len(data), 7):
+        await stream.feed(data[i:i + 7])
+    await stream.finish()
+
+    assert stream.format["sample_rate"] == 16000
+    assert bytes(stream.pcm) == pcm
+
+
+@pytest.mark.asyncio
+async def test_raw_pcm_uses_announced_format_and_is_capped():
+    audio_format = {"sample_rate": 8000, "channels": 1, "bit_depth": 16, "encoding": "pcm"}
+    stream = AudioStream(audio_format, buffer_bytes=512, chunk_ms=20, max_seconds=0.5)
+    for _ in range(20):
+        await stream.feed(b"\x01\x00" * 400)  # 50 ms per frame
+    await stream.finish()
+
+    assert stream.duration == 0.5
+    assert stream.truncated
+    assert stream.received == 20 * 800
+
+
+@pytest.mark.asyncio
+async def test_voice_streams_are_per_user():
+    streams = VoiceStreams()
+    await streams.feed("doc", "alice", make_wav(b"\x01\x00" * 100))
+    await streams.feed("doc", "bob", make_wav(b"\x02\x00" * 50))
+
+    alice = await streams.finish("doc", "alice")
+    assert len(alice.pcm) == 200
+    assert await streams.finish("doc", "alice") is None
+    streams.abort("doc", "bob")
+    assert len(streams) == 0
+
+
+@pytest.mark.asyncio
+async def test_garbage_header_is_rejected():
+    streams = VoiceStreams()
+    with pytest.raises(ValueError):
+        await streams.feed("doc", "alice", b"RIFF\x00\x00\x00\x00AVI LIST")
+    assert len(streams) == 0
+
+
+@pytest.mark.asyncio
+async def test_browser_audio_is_converted_as_it_arrives():
+    # 48 kHz stereo float, as sent by the Web Audio API
+    audio_format = {"sample_rate": 48000, "channels": 2, "bit_depth": 32, "encoding": "float"}
+    stream = AudioStream(audio_format, buffer_bytes=4096, chunk_ms=20)
+    await stream.feed(bytes(48000 * 8))  # one second
+    await stream.finish()
+
+    assert stream.format == {"sample_rate": 16000, "channels": 1, "bit_depth": 16, "encoding": "pcm"}
+    assert len(stream.pcm) == 16000 * 2
+
+
+def tone(seconds: float, amplitude: int = 8000, rate: int = 16000) -> bytes:
+    samples = np.arange(int(seconds * rate))
+    return (amplitude * np.sin(2 * np.pi * 440 * samples / rate)).astype("<i2").tobytes()
+
+
+@pytest.mark.asyncio
+async def test_pause_ends_utterance_before_client_stops():
+    ended = asyncio.Event()
+
+    async def on_end(stream):
+        ended.set()
+
+    stream = AudioStream(buffer_bytes=4096, chunk_ms=20, endpoint_ms=300, on_end=on_end)
+    audio = bytes(3200) + tone(0.5) + bytes(32000)  # silence, speech, a long pause
+    sent = 0
+    for i in range(0, len(audio), 640):
+        await stream.feed(audio[i:i + 640])
+        sent += 640
+        await asyncio.sleep(0)
+        if ended.is_set():
+            break
+
+    assert ended.is_set() and stream.endpointed
+    assert sent < len(audio)  # the client was still streaming
+    speech = stream.speech()
+    assert 0.5 <= len(speech) / 32000 < 0.8
+    await stream.feed(tone(0.1))  # dropped
+    assert len(stream.pcm) < 16000 * 2 * 1.2
+    assert (await stream.finish()) is stream
+
+
+@pytest.mark.asyncio
+async def test_audio_after_a_pause_starts_the_next_utterance():
+    ended = []
+
+    async def on_end(document_id, user_id, stream):
+        ended.append(stream)
+
+    streams = VoiceStreams(on_end=on_end)
+    first = streams.start("doc", "alice")
+    first.endpoint_ms = 200
+    audio = tone(0.5) + bytes(16000)
+    for i in range(0, len(audio), 640):
+        await streams.feed("doc", "alice", audio[i:i + 640])
+        await asyncio.sleep(0)
+
+    assert ended == [first]
+    await streams.feed("doc", "alice", tone(0.1))
+    second = await streams.finish("doc", "alice")
+    assert second is not first and not second.endpointed
+
+
+@pytest.mark.asyncio
+async def test_abort_wakes_a_writer_blocked_on_a_stalled_consumer(monkeypatch):
+    async def stalled(self):
+        await asyncio.Event().wait()
+
+    monkeypatch.setattr(AudioStream, "_consume", stalled)
+    stream = AudioStream(buffer_bytes=1024, chunk_ms=10)
+    writer = asyncio.create_task(stream.feed(bytes(4096)))
+    await asyncio.sleep(0.01)
+    assert not writer.done()
+
+    stream.abort()
+    await asyncio.wait_for(writer, 1)
+
+
+@pytest.mark.asyncio
+async def test_consumer_failure_is_reported_to_the_writer(monkeypatch):
+    def broken(self, chunk):
+        raise RuntimeError("converter exploded")
+
+    monkeypatch.setattr(AudioStream, "process_chunk", broken)
+    stream = AudioStream(buffer_bytes=1024, chunk_ms=10)
+
+    with pytest.raises(ValueError, match="converter exploded"):
+        await asyncio.wait_for(stream.feed(bytes(4096)), 1)
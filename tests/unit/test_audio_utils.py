@@ -1,5 +1,12 @@
+import mmap
+import struct
+import numpy as np
 import pytest
-from app.utils.audio import validate_audio_format, get_audio_duration, get_audio_properties
+from app.utils.audio import (
+    validate_audio_format, get_audio_duration, get_audio_properties, read_wav_header,
+    convert_audio_format, trim_silence, voice_segments, wav_header, parse_wav, open_wav,
+    AudioConverter
+)
 from tests.constants.message_loader import MessageLoader
 
 def test_audio_validation(message_loader):
@@ -23,3 +30,130 @@ def test_audio_duration(test_messages, sample_audio_data):
     duration = get_audio_duration(sample_audio_data)
     assert duration > 0, test_messages["audio"]["no_audio_data"]
     assert duration < 60, test_messages["audio"]["invalid_duration"].format(seconds=60)
+
+def test_read_wav_header_waits_for_complete_header():
+    with open("tests/data/sample_audio.wav", "rb") as f:
+        data = f.read()
+    assert read_wav_header(data[:20]) is None
+    audio_format, offset = read_wav_header(data)
+    assert audio_format == {"sample_rate": 44100, "channels": 1, "bit_depth": 16, "encoding": "pcm"}
+    assert data[offset - 8:offset - 4] == b"data"
+
+PCM16 = {"sample_rate": 16000, "channels": 1, "bit_depth": 16, "encoding": "pcm"}
+
+def _speech_with_pauses(pause: float) -> bytes:
+    """Quiet noise, 1 s tone, a pause, 0.5 s tone, quiet noise"""
+    rate = PCM16["sample_rate"]
+    tone = (0.5 * np.sin(2 * np.pi * 220 * np.arange(rate) / rate) * 32767).astype("<i2")
+    noise = np.random.default_rng(0).normal(0, 30, rate // 2).astype("<i2")
+    return np.concatenate([noise, tone, noise[:int(rate * pause)], tone[:rate // 2], noise]).tobytes()
+
+def test_voice_segments_split_on_long_pauses_only():
+    seconds = lambda segments: [(start / 32000, end / 32000) for start, end in segments]
+    assert seconds(voice_segments(_speech_with_pauses(0.1), PCM16)) == [(0.4, 2.2)]
+    assert seconds(voice_segments(_speech_with_pauses(0.5), PCM16)) == [(0.4, 1.6), (1.9, 2.6)]
+
+def test_trim_silence_is_a_view():
+    pcm = _speech_with_pauses(0.1)
+    speech = trim_silence(pcm, PCM16)
+    assert speech.obj is pcm
+    assert len(speech) == int(1.8 * 32000)
+    assert len(trim_silence(bytes(32000), PCM16)) == 0
+
+def test_convert_audio_format_trims_wav():
+    pcm = _speech_with_pauses(0.1)
+    converted = convert_audio_format(wav_header(PCM16, len(pcm)) + pcm, {})
+    assert read_wav_header(converted) == (PCM16, 44)
+    assert len(converted) == 44 + int(1.8 * 32000)
+
+def _chunk(chunk_id: bytes, body: bytes) -> bytes:
+    return chunk_id + struct.pack("<I", len(body)) + body + b"\0" * (len(body) & 1)
+
+def test_parse_wav_skips_metadata_chunks_without_copying():
+    pcm = np.arange(1000, dtype="<i2").tobytes()
+    fmt = wav_header(PCM16, 0)[20:36]
+    info = _chunk(b"LIST", b"INFO" + _chunk(b"ISFT", b"recorder\0") + _chunk(b"INAM", b"memo\0"))
+    body = b"WAVE" + _chunk(b"fmt ", fmt) + _chunk(b"fact", struct.pack("<I", 1000)) + info
+    data = b"RIFF" + struct.pack("<I", len(body) + 8 + len(pcm)) + body + _chunk(b"data", pcm)
+
+    wav = parse_wav(data)
+    assert wav.format == PCM16
+    assert wav.info == {"ISFT": "recorder", "INAM": "memo"}
+    assert wav.fact_frames == 1000
+    assert wav.pcm.obj is data and wav.pcm == pcm
+    assert get_audio_properties(wav) == {**PCM16, "duration": 1000 / 16000}
+
+def test_parse_wav_clamps_unfinished_data_chunk():
+    pcm = bytes(3200)
+    data = bytearray(wav_header(PCM16, len(pcm)) + pcm)
+    struct.pack_into("<I", data, 40, 0xFFFFFFFF)  # size never filled in by the recorder
+    assert get_audio_duration(bytes(data)) == 0.1
+    with pytest.raises(ValueError):
+        parse_wav(bytes(data[:30]))
+
+def test_parse_wav_reads_data_chunk_left_at_size_zero():
+    pcm = bytes(3200)
+    data = bytearray(wav_header(PCM16, len(pcm)) + pcm)
+    struct.pack_into("<I", data, 40, 0)  # streaming writer never came back to it
+    assert parse_wav(bytes(data)).pcm == pcm
+    assert get_audio_duration(bytes(data)) == 0.1
+    assert parse_wav(wav_header(PCM16, 0)).pcm == b""
+
+def test_parse_wav_keeps_empty_data_chunk_followed_by_metadata():
+    name = b"INAM" + struct.pack("<I", 6) + b"Draft\0"
+    info = b"LIST" + struct.pack("<I", 4 + len(name)) + b"INFO" + name
+    wav = parse_wav(wav_header(PCM16, 0) + info)
+    assert wav.pcm == b""
+    assert wav.info == {"INAM": "Draft"}
+
+def test_open_wav_maps_large_files(tmp_path, monkeypatch):
+    monkeypatch.setattr("app.utils.audio.MMAP_MIN_BYTES", 0)
+    pcm = _speech_with_pauses(0.1)
+    path = tmp_path / "speech.wav"
+    path.write_bytes(wav_header(PCM16, len(pcm)) + pcm)
+    with open_wav(str(path)) as wav:
+        assert isinstance(wav.pcm.obj, mmap.mmap)
+        assert wav.pcm == pcm
+        assert len(trim_silence(wav.pcm, wav.format)) == int(1.8 * 32000)
+
+def test_convert_audio_format_downmixes_resamples_and_normalizes():
+    rate = 48000
+    left = 0.3 * np.sin(2 * np.pi * 440 * np.arange(rate) / rate)
+    stereo = np.stack([left, left], axis=1).astype("<f4")
+    source = {"sample_rate": rate, "channels": 2, "bit_depth": 32, "encoding": "float"}
+    data = wav_header(source, stereo.nbytes) + stereo.tobytes()
+
+    converted = parse_wav(convert_audio_format(data, {"trim_silence": False}))
+    assert converted.properties() == {**PCM16, "duration": 1.0}
+    assert np.abs(np.frombuffer(converted.pcm, dtype="<i2")).max() == pytest.approx(0.89 * 32767, rel=1e-3)
+
+    # Streaming the same audio chunk by chunk gives the same samples
+    converter = AudioConverter(source, normalize=None, max_chunk_frames=4800)
+    pcm = stereo.tobytes()
+    streamed = b"".join(bytes(converter.process(pcm[i:i + 4800 * 8])) for i in range(0, len(pcm), 4800 * 8))
+    streamed += bytes(converter.flush())
+    assert streamed == parse_wav(convert_audio_format(data, {"trim_silence": False, "normalize": None})).pcm
+
+@pytest.mark.parametrize("bit_depth", [8, 24])
+def test_8_and_24_bit_pcm_is_converted(bit_depth):
+    tone = 0.5 * np.sin(2 * np.pi * 440 * np.arange(16000) / 16000)
+    signal = np.concatenate([np.zeros(8000), tone, np.zeros(8000)])
+    if bit_depth == 8:
+        pcm = np.round(signal * 127 + 128).astype("u1").tobytes()  # unsigned
+    else:
+        samples = np.round(signal * 8388607).astype("<i4")
+        pcm = samples.view("u1").reshape(-1, 4)[:, :3].tobytes()  # packed in 3 bytes
+    data = wav_header({**PCM16, "bit_depth": bit_depth}, len(pcm)) + pcm
+
+    converted = parse_wav(convert_audio_format(data, {"normalize": None}))
+    samples = np.frombuffer(converted.pcm, dtype="<i2") / 32768
+    assert converted.format == PCM16
+    # Silence trimmed from both ends, the tone kept at its level
+    assert 1.0 <= converted.duration < 1.5
+    assert np.abs(samples).max() == pytest.approx(0.5, abs=0.01)
+    assert abs(samples.mean()) < 0.01
+
+def test_convert_audio_format_rejects_unsupported_targets():
+    pcm = bytes(3200)
+    with pytest.raises(ValueError):
+        convert_audio_format(wav_header(PCM16, len(pcm)) + pcm, {"channels": 2})
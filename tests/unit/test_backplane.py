@@ -0,0 +1,75 @@
+import asyncio
+import multiprocessing
+import pytest
+from app.services.backplane import (
+    InProcessBackplane,
+    UnixSocketBackplane,
+    create_backplane,
+)
+
+
+def _publish_from_worker(path: str):
+    """Run in a separate process: join the hub and publish one frame"""
+    async def main():
+        backplane = UnixSocketBackplane(path)
+        await backplane.start(lambda document_id, payload: None)
+        await backplane.publish("doc_1", '{"type":"document_update"}')
+        await asyncio.sleep(0.2)
+        await backplane.stop()
+    asyncio.run(main())
+
+
+@pytest.mark.asyncio
+async def test_in_process_backplane_delivers_locally():
+    received = []
+    backplane = InProcessBackplane()
+    await backplane.start(lambda document_id, payload: received.append((document_id, payload)))
+
+    await backplane.publish("doc_1", "{}")
+
+    assert received == [("doc_1", "{}")]
+
+
+def test_create_backplane_rejects_unknown_kind():
+    assert isinstance(create_backplane("memory"), InProcessBackplane)
+    with pytest.raises(ValueError):
+        create_backplane("carrier-pigeon")
+
+
+@pytest.mark.asyncio
+async def test_unix_backplane_relays_between_workers(tmp_path):
+    path = str(tmp_path / "bp.sock")
+    first_received, second_received = [], []
+    first, second = UnixSocketBackplane(path), UnixSocketBackplane(path)
+    await first.start(lambda d, p: first_received.append((d, p)))
+    await second.start(lambda d, p: second_received.append((d, p)))
+    assert first.is_hub and not second.is_hub
+
+    await second.publish("doc_1", '{"n":1}')
+    await asyncio.sleep(0.05)
+
+    assert first_received == [("doc_1", '{"n":1}')]
+    assert second_received == [("doc_1", '{"n":1}')]
+    await second.stop()
+    await first.stop()
+
+
+@pytest.mark.asyncio
+async def test_unix_backplane_receives_from_other_process(tmp_path):
+    path = str(tmp_path / "bp.sock")
+    received = []
+    backplane = UnixSocketBackplane(path)
+    await backplane.start(lambda d, p: received.append((d, p)))
+
+    worker = multiprocessing.get_context("spawn").Process(
+        target=_publish_from_worker, args=(path,)
+    )
+    worker.start()
+    for _ in range(100):
+        if received:
+            break
+        await asyncio.sleep(0.05)
+    await asyncio.get_running_loop().run_in_executor(None, worker.join, 10)
+
+    assert received == [("doc_1", '{"type":"document_update"}')]
+    await backplane.stop()
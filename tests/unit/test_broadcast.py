@@ -0,0 +1,85 @@
+import asyncio
+import json
+import pytest
+from app.services.broadcast import BroadcastEngine
+
+
+class FakeWebSocket:
+    """Records sent payloads; optionally blocks forever on send"""
+
+    def __init__(self, stuck: bool = False):
+        self.stuck = stuck
+        self.sent = []
+        self.closed = False
+
+    async def send_text(self, payload: str):
+        if self.stuck:
+            await asyncio.Event().wait()
+        self.sent.append(json.loads(payload))
+
+    async def close(self, code: int = 1000):
+        self.closed = True
+
+
+@pytest.mark.asyncio
+async def test_broadcast_reaches_every_socket():
+    engine = BroadcastEngine(queue_size=4, send_timeout=0.5)
+    sockets = [FakeWebSocket() for _ in range(3)]
+    for ws in sockets:
+        engine.register(ws)
+
+    delivered = engine.broadcast(sockets, {"type": "document_update"})
+    await asyncio.sleep(0.01)
+
+    assert delivered == 3
+    assert all(ws.sent == [{"type": "document_update"}] for ws in sockets)
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_slow_socket_does_not_delay_others_and_is_dropped():
+    dropped = []
+    engine = BroadcastEngine(queue_size=4, send_timeout=0.05, on_drop=dropped.append)
+    fast, slow = FakeWebSocket(), FakeWebSocket(stuck=True)
+    engine.register(fast)
+    engine.register(slow)
+
+    engine.broadcast([fast, slow], {"type": "cursor"})
+    await asyncio.sleep(0.01)
+    assert fast.sent == [{"type": "cursor"}]
+
+    await asyncio.sleep(0.1)
+    assert dropped == [slow]
+    assert slow not in engine.channels
+    assert slow.closed
+    await engine.close()
+
+
+@pytest.mark.asyncio
+async def test_full_queue_drops_socket():
+    dropped = []
+    engine = BroadcastEngine(queue_size=1, send_timeout=5, on_drop=dropped.append)
+    slow = FakeWebSocket(stuck=True)
+    engine.register(slow)
+
+    for _ in range(3):
+        engine.broadcast([slow], {"type": "cursor"})
+
+    assert dropped == [slow]
+    await engine.close()
+    assert slow.closed
+
+
+@pytest.mark.asyncio
+async def test_flush_waits_for_queued_messages():
+    engine = BroadcastEngine(queue_size=4, send_timeout=0.05)
+    ws, stuck = FakeWebSocket(), FakeWebSocket(stuck=True)
+    engine.register(ws)
+    engine.register(stuck)
+    engine.broadcast([ws, stuck], {"type": "error"})
+
+    assert await engine.flush(ws)
+    assert ws.sent == [{"type": "error"}]
+    # A send that never finishes gives up after the send timeout
+    assert not await engine.flush(stuck)
+    await engine.close()
@@ -0,0 +1,133 @@
+"""Tests for the adaptive upstream concurrency limiter"""
+import asyncio
+import httpx
+import groq
+import pytest
+from app.services.concurrency_limiter import (
+    AdaptiveLimiter, INTERACTIVE, BACKGROUND, BATCH_KIND, STREAM_KIND
+)
+
+
+def limiter(**kwargs):
+    options = dict(min_limit=1, max_limit=10, initial_limit=2,
+                   latency_tolerance=2.0, backoff_ratio=0.5)
+    options.update(kwargs)
+    return AdaptiveLimiter(**options)
+
+
+@pytest.mark.asyncio
+async def test_interactive_lane_goes_first():
+    lim = limiter(initial_limit=1, max_limit=1)
+    order = []
+
+    async def call(name, priority):
+        async with lim.slot(priority):
+            order.append(name)
+            await asyncio.sleep(0)
+
+    await lim.acquire()
+    tasks = [asyncio.create_task(call("background", BACKGROUND)),
+             asyncio.create_task(call("interactive", INTERACTIVE))]
+    await asyncio.sleep(0)
+    assert lim.queue_depth(BACKGROUND) == 1 and lim.queue_depth(INTERACTIVE) == 1
+
+    lim.release()
+    await asyncio.gather(*tasks)
+    assert order == ["interactive", "background"]
+    assert lim.in_flight == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_leaves_the_queue():
+    lim = limiter(initial_limit=1, max_limit=1)
+    await lim.acquire()
+    waiter = asyncio.create_task(lim.acquire(BACKGROUND))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    assert lim.queue_depth() == 0
+    lim.release()
+    assert lim.in_flight == 0
+
+
+def test_additive_increase_when_saturated():
+    lim = limiter(initial_limit=2)
+    lim.in_flight = 2
+    for _ in range(4):
+        lim.on_success(0.1)
+    assert lim.capacity == 3
+
+
+def test_no_increase_when_underused():
+    lim = limiter(initial_limit=2)
+    lim.in_flight = 1
+    for _ in range(10):
+        lim.on_success(0.1)
+    assert lim.capacity == 2
+
+
+def test_slow_response_backs_off():
+    lim = limiter(initial_limit=8)
+    lim.on_success(0.1)
+    lim.on_success(0.5)
+    assert lim.capacity == 4
+
+
+def test_slow_kinds_of_call_have_their_own_baseline():
+    lim = limiter(initial_limit=8, max_limit=8)
+    lim.in_flight = 8
+    for _ in range(3):
+        lim.on_success(0.1)
+        lim.on_success(3.0, kind=BATCH_KIND)
+        lim.on_success(1.5, kind=STREAM_KIND)
+    assert lim.capacity == 8
+    assert lim.decreases == 0
+    assert lim.stats()["min_latency"] == {"single": 0.1, "batch": 3.0, "stream": 1.5}
+
+    # Still slow compared with other batches
+    lim.on_success(9.0, kind=BATCH_KIND)
+    assert lim.capacity == 4
+
+
+def test_overload_backs_off_once_per_burst():
+    lim = limiter(initial_limit=8)
+    started = 1.0
+    lim.on_overload(started)
+    lim.on_overload(started)  # started before the first decrease took effect
+    assert lim.capacity == 4
+    assert lim.decreases == 1
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_slot_reduces_limit():
+    lim = limiter(initial_limit=8)
+    request = httpx.Request("POST", "http://test/chat/completions")
+    error = groq.RateLimitError("slow down", response=httpx.Response(429, request=request),
+                                body=None)
+
+    with pytest.raises(groq.RateLimitError):
+        async with lim.slot(INTERACTIVE):
+            raise error
+
+    assert lim.capacity == 4
+    assert lim.stats()["limit"] == 4
+    assert lim.in_flight == 0
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("error", [
+    groq.APITimeoutError(request=httpx.Request("POST", "http://test/chat/completions")),
+    httpx.ReadTimeout("timed out"),
+    asyncio.TimeoutError(),
+])
+async def test_timed_out_slot_reduces_limit(error):
+    lim = limiter(initial_limit=8)
+
+    with pytest.raises(type(error)):
+        async with lim.slot(INTERACTIVE):
+            raise error
+
+    assert lim.capacity == 4
+    assert lim.in_flight == 0
@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+from app.services.connection_manager import ConnectionManager
+
+
+class FakeWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, payload: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+@pytest.fixture
+def manager():
+    return ConnectionManager()
+
+
+@pytest.mark.asyncio
+async def test_connect_indexes_socket(manager):
+    ws = FakeWebSocket()
+    await manager.connect(ws, "doc_1", "alice")
+
+    assert manager.get_connection(ws) == ("doc_1", "alice")
+    assert manager.connection_count("doc_1") == 1
+    assert manager.user_count("doc_1") == 1
+    assert manager.user_cursors["doc_1"] == {"alice": 0}
+
+
+@pytest.mark.asyncio
+async def test_user_keeps_cursor_per_document(manager):
+    await manager.connect(FakeWebSocket(), "doc_1", "alice")
+    await manager.connect(FakeWebSocket(), "doc_2", "alice")
+
+    manager.update_cursor("doc_1", "alice", 10)
+    manager.update_cursor("doc_2", "alice", 20)
+
+    assert manager.user_cursors["doc_1"]["alice"] == 10
+    assert manager.user_cursors["doc_2"]["alice"] == 20
+    assert manager.user_documents["alice"] == {"doc_1", "doc_2"}
+
+
+@pytest.mark.asyncio
+async def test_disconnect_cleans_up_empty_documents(manager):
+    first, second = FakeWebSocket(), FakeWebSocket()
+    await manager.connect(first, "doc_1", "alice")
+    await manager.connect(second, "doc_1", "alice")
+
+    manager.disconnect(first)
+    assert manager.connection_count("doc_1") == 1
+    assert manager.user_count("doc_1") == 1
+
+    manager.disconnect(second)
+    manager.disconnect(second)
+    assert manager.connection_count("doc_1") == 0
+    assert "doc_1" not in manager.document_sessions
+    assert "doc_1" not in manager.user_cursors
+    assert "alice" not in manager.user_documents
+
+
+@pytest.mark.asyncio
+async def test_send_to_socket_is_queued_for_that_socket_only(manager):
+    class SlowWebSocket(FakeWebSocket):
+        def __init__(self):
+            self.sent = []
+
+        async def send_text(self, payload: str):
+            await asyncio.sleep(0.01)
+            self.sent.append(payload)
+
+    alice, bob = SlowWebSocket(), SlowWebSocket()
+    await manager.connect(alice, "doc_1", "alice")
+    await manager.connect(bob, "doc_1", "bob")
+    await asyncio.sleep(0.05)
+    alice.sent.clear()
+    bob.sent.clear()
+
+    # Returns without waiting for the slow send
+    assert manager.send_to_socket(alice, {"type": "error"})
+    assert alice.sent == []
+
+    await asyncio.sleep(0.05)
+    assert alice.sent == ['{"type":"error"}']
+    assert bob.sent == []
@@ -0,0 +1,41 @@
+import asyncio
+import pytest
+from app.services.cursor_coalescer import CursorCoalescer
+
+
+@pytest.fixture
+def published():
+    return []
+
+
+@pytest.fixture
+def coalescer(published):
+    async def publish(document_id, message):
+        published.append((document_id, message))
+    return CursorCoalescer(publish, interval_ms=10)
+
+
+@pytest.mark.asyncio
+async def test_keeps_latest_position_per_user(coalescer, published):
+    for position in range(5):
+        coalescer.update("doc_1", "alice", position)
+    coalescer.update("doc_1", "bob", 7)
+
+    await asyncio.sleep(0.03)
+
+    assert published == [("doc_1", {
+        "type": "cursors",
+        "document_id": "doc_1",
+        "cursors": {"alice": 4, "bob": 7}
+    })]
+
+
+@pytest.mark.asyncio
+async def test_one_frame_per_document(coalescer, published):
+    coalescer.update("doc_1", "alice", 1)
+    coalescer.update("doc_2", "bob", 2)
+
+    await coalescer.close()
+
+    assert sorted(doc for doc, _ in published) == ["doc_1", "doc_2"]
+    assert coalescer.pending == {}
@@ -1,11 +1,22 @@
 import pytest
+from unittest.mock import patch
 from app.services.document_editor import DocumentEditor
+from app.services.paragraph_store import TextPool
 from tests.constants.test_messages import MessageType
 
 @pytest.fixture
 def document_editor():
     return DocumentEditor()
 
+@pytest.fixture
+def editor():
+    """Editor with an empty document called doc"""
+    with patch("app.services.document_editor.MessageLoader"):
+        editor = DocumentEditor()
+    editor.documents["doc"] = {"type": "google_docs", "paragraphs": {}, "pool": TextPool(),
+                               "users": [], "changes": []}
+    return editor
+
 def test_document_creation(test_messages, document_editor):
     doc_id = "test_doc"
     content = "Test content"
@@ -46,4 +57,58 @@ def test_document_changes():
     
     # Test undo
     result = editor.undo_change()
-    assert result["message"] == "Successfully undid last change" 
\ No newline at end of file
+    assert result["message"] == "Successfully undid last change" 
+
+@pytest.mark.asyncio
+async def test_appendix_is_built_incrementally(editor):
+    await editor.apply_changes("doc", "p1", {"original": "Pay now.", "new": "Pay today."}, "alice")
+    await editor.apply_changes("doc", "p2", {"original": "Net 30.", "new": "Net 45."}, "bob")
+    first = "".join(editor.iter_appendix("doc"))
+    cached_p2 = editor.documents["doc"]["paragraphs"]["p2"].appendix
+
+    await editor.apply_changes("doc", "p1", {"original": "Pay today.", "new": "Pay Friday."}, "bob")
+    appendix = (await editor.generate_appendix("doc"))["appendix"]
+
+    assert editor.documents["doc"]["paragraphs"]["p2"].appendix is cached_p2
+    assert appendix == (
+        "# Document Change History\n\n"
+        "\n## Paragraph p1\nOriginal: Pay now.\n"
+        "Changed to: Pay today. (by user alice at current_time)\n"
+        "Changed to: Pay Friday. (by user bob at current_time)\n"
+        "\n## Paragraph p2\nOriginal: Net 30.\n"
+        "Changed to: Net 45. (by user bob at current_time)"
+    )
+    assert first != appendix
+
+
+@pytest.mark.asyncio
+async def test_paragraph_lease_blocks_other_editors(editor):
+    lease = (await editor.lock_paragraph("doc", "p1", "alice"))["lease"]
+
+    assert "error" in await editor.lock_paragraph("doc", "p1", "bob", timeout=0)
+    await editor.apply_changes("doc", "p1", {"original": "A.", "new": "B."}, "bob")
+    assert "p1" not in editor.documents["doc"]["paragraphs"]
+
+    assert editor.unlock_paragraph("doc", "p1", lease["token"])
+    await editor.apply_changes("doc", "p1", {"original": "A.", "new": "B."}, "bob")
+    assert editor.documents["doc"]["paragraphs"]["p1"].current == "B."
+
+
+@pytest.mark.asyncio
+async def test_concurrent_edits_are_merged(editor):
+    base = "Pay within 30 days of receipt."
+    await editor.apply_changes(
+        "doc", "p1", {"original": base, "new": "Pay within 30 days of invoice receipt.",
+                      "base_version": 0}, "alice")
+
+    # Bob edited version 0 too, in a different place
+    await editor.apply_changes("doc", "p1", {"op": [0, 3, "Remit"], "base_version": 0}, "bob")
+    paragraph = editor.documents["doc"]["paragraphs"]["p1"]
+    assert paragraph.version == 2
+    assert paragraph.current == "Remit within 30 days of invoice receipt."
+
+    # Carol changed the same words as Bob: reported, not silently overwritten
+    result = await editor.apply_changes(
+        "doc", "p1", {"new": "Paid within 30 days of receipt.", "base_version": 0}, "carol")
+    assert result["conflict"] and result["version"] == 2
+    assert paragraph.current == "Remit within 30 days of invoice receipt."
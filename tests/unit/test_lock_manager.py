@@ -0,0 +1,95 @@
+"""Tests for per-paragraph edit leases"""
+import asyncio
+import pytest
+from app.services.lock_manager import ParagraphLockManager
+
+
+def test_same_paragraph_id_in_different_documents_is_independent():
+    locks = ParagraphLockManager(lease_ttl=30)
+    assert locks.try_acquire("doc_a", "p1", "alice")
+    assert locks.try_acquire("doc_b", "p1", "bob")
+    assert locks.try_acquire("doc_a", "p2", "bob")
+    assert locks.try_acquire("doc_a", "p1", "bob") is None
+
+
+def test_holder_can_renew_and_release():
+    locks = ParagraphLockManager(lease_ttl=30)
+    lease = locks.try_acquire("doc", "p1", "alice")
+    assert locks.try_acquire("doc", "p1", "alice") is lease
+    assert not locks.release("doc", "p1", "wrong-token")
+    assert locks.release("doc", "p1", lease.token)
+    assert locks.holder("doc", "p1") is None
+    assert len(locks) == 0
+
+
+def test_lease_expires_without_heartbeat():
+    now = [100.0]
+    locks = ParagraphLockManager(lease_ttl=10, clock=lambda: now[0])
+    lease = locks.try_acquire("doc", "p1", "alice")
+
+    now[0] = 105.0
+    assert locks.heartbeat("doc", "p1", lease.token)
+    now[0] = 114.0
+    assert locks.holder("doc", "p1") == "alice"
+    now[0] = 115.0
+    assert locks.holder("doc", "p1") is None
+    assert not locks.heartbeat("doc", "p1", lease.token)
+    assert locks.expirations == 1
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_arrival_order():
+    locks = ParagraphLockManager(lease_ttl=30)
+    first = await locks.acquire("doc", "p1", "alice")
+    order = []
+
+    async def edit(user):
+        lease = await locks.acquire("doc", "p1", user)
+        order.append(user)
+        locks.release("doc", "p1", lease.token)
+
+    tasks = [asyncio.create_task(edit(user)) for user in ("bob", "carol", "dave")]
+    await asyncio.sleep(0)
+    # A newcomer cannot jump the queue while the lease changes hands
+    locks.release("doc", "p1", first.token)
+    assert locks.try_acquire("doc", "p1", "mallory") is None
+
+    await asyncio.gather(*tasks)
+    assert order == ["bob", "carol", "dave"]
+    assert len(locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_waiter_takes_over_a_dead_holders_lease():
+    locks = ParagraphLockManager(lease_ttl=0.05)
+    locks.try_acquire("doc", "p1", "crashed")
+
+    lease = await asyncio.wait_for(locks.acquire("doc", "p1", "bob"), 1)
+    assert lease.holder == "bob"
+    assert locks.expirations == 1
+
+
+@pytest.mark.asyncio
+async def test_acquire_times_out_and_leaves_the_queue():
+    locks = ParagraphLockManager(lease_ttl=30)
+    holder = locks.try_acquire("doc", "p1", "alice")
+    with pytest.raises(asyncio.TimeoutError):
+        await locks.acquire("doc", "p1", "bob", timeout=0.01)
+
+    assert not locks.entries[("doc", "p1")].waiters
+    locks.release("doc", "p1", holder.token)
+    assert len(locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiter_does_not_keep_the_lease():
+    locks = ParagraphLockManager(lease_ttl=30)
+    holder = locks.try_acquire("doc", "p1", "alice")
+    waiter = asyncio.create_task(locks.acquire("doc", "p1", "bob"))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    locks.release("doc", "p1", holder.token)
+    assert locks.holder("doc", "p1") is None
@@ -0,0 +1,66 @@
+"""Tests for the compact, delta-encoded paragraph store"""
+import pytest
+from app.services.paragraph_store import (
+    Paragraph, TextPool, encode_delta, apply_delta, KEYFRAME_INTERVAL
+)
+
+
+@pytest.mark.parametrize("previous,new", [
+    ("The party shall pay.", "The party must pay."),
+    ("abc", "abc"),
+    ("", "new text"),
+    ("old text", ""),
+    ("aaaa", "aa"),
+    ("ab", "abab"),
+])
+def test_delta_round_trip(previous, new):
+    prefix, suffix, inserted = encode_delta(previous, new)
+    assert apply_delta(previous, prefix, suffix, inserted) == new
+    assert prefix + suffix <= min(len(previous), len(new))
+
+
+def test_delta_only_keeps_the_changed_span():
+    previous = "Clause one. " * 50 + "Payment is due in 30 days. " + "Clause two. " * 50
+    new = previous.replace("30 days", "45 days")
+    assert encode_delta(previous, new)[2] == "45"
+
+
+def test_every_version_can_be_rebuilt():
+    paragraph = Paragraph("v0", TextPool())
+    versions = ["v0"]
+    for i in range(1, KEYFRAME_INTERVAL * 2 + 5):
+        text = f"version {i} of the clause"
+        paragraph.apply(text, "alice", "t", versions[-1])
+        versions.append(text)
+
+    assert paragraph.version == len(versions) - 1
+    assert [paragraph.text_at(v) for v in range(len(versions))] == versions
+    with pytest.raises(IndexError):
+        paragraph.text_at(len(versions))
+
+
+def test_history_matches_applied_changes():
+    paragraph = Paragraph("Pay now.", TextPool())
+    paragraph.apply("Pay today.", "alice", "t1", "Pay now.")
+    paragraph.apply("Pay by Friday.", "bob", "t2", "something else")
+
+    assert list(paragraph.history()) == [
+        {"user_id": "alice", "timestamp": "t1", "change": "Pay today.", "original": "Pay now."},
+        {"user_id": "bob", "timestamp": "t2", "change": "Pay by Friday.",
+         "original": "something else"},
+    ]
+
+
+def test_pool_shares_identical_text():
+    pool = TextPool()
+    first = Paragraph("".join(["Standard ", "clause."]), pool)
+    second = Paragraph("".join(["Standard ", "clause."]), pool)
+    assert first.original is second.original
+    assert len(pool) == 1
+
+
+def test_records_use_slots():
+    paragraph = Paragraph("text", TextPool())
+    paragraph.apply("text!", "alice", "t", "text")
+    assert not hasattr(paragraph, "__dict__")
+    assert not hasattr(paragraph.revisions[0], "__dict__")
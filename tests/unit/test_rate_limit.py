@@ -0,0 +1,136 @@
+import asyncio
+import multiprocessing
+import sqlite3
+import pytest
+from unittest.mock import patch
+from app.middleware.rate_limit import RateLimiter, SlidingWindowLimiter
+from app.middleware.rate_limit_store import SQLiteRateLimitStore, create_rate_limit_store
+
+
+def _hammer_shared_store(path: str, checks: int, allowed):
+    """Run in a separate process: hit one shared key as fast as possible"""
+    limiter = SlidingWindowLimiter(limit=50, interval=3600, store=SQLiteRateLimitStore(path))
+    count = sum(limiter.hit("shared-client", now=10.0) for _ in range(checks))
+    with allowed.get_lock():
+        allowed.value += count
+
+
+def test_blocks_after_limit_within_window():
+    limiter = SlidingWindowLimiter(limit=3, interval=60)
+    assert all(limiter.hit("10.0.0.1", now=1.0 + i) for i in range(3))
+    assert not limiter.hit("10.0.0.1", now=5.0)
+    assert limiter.hit("10.0.0.2", now=5.0)
+
+
+def test_previous_window_is_weighted_by_overlap():
+    limiter = SlidingWindowLimiter(limit=4, interval=60)
+    for i in range(4):
+        limiter.hit("client", now=50.0 + i)
+
+    # 15s into the next window, 75% of the previous 4 calls still count
+    assert limiter.hit("client", now=75.0)
+    assert not limiter.hit("client", now=75.0)
+    # 45s in only 25% (one call) remains, leaving room for two more
+    assert limiter.hit("client", now=105.0)
+    assert limiter.hit("client", now=105.0)
+    assert not limiter.hit("client", now=105.0)
+
+
+def test_idle_keys_are_evicted():
+    limiter = SlidingWindowLimiter(limit=10, interval=60)
+    for i in range(5):
+        limiter.hit(f"idle-{i}", now=0.0)
+
+    limiter.hit("active", now=500.0)
+
+    assert len(limiter) == 1
+
+
+def test_memory_is_bounded_by_max_keys():
+    limiter = SlidingWindowLimiter(limit=10, interval=60, max_keys=100)
+    for i in range(1000):
+        limiter.hit(f"client-{i}", now=1.0)
+
+    assert len(limiter) <= 100
+
+
+@pytest.fixture
+def rate_limiter():
+    with patch("app.middleware.rate_limit.MessageLoader"):
+        yield RateLimiter()
+
+
+@pytest.mark.asyncio
+async def test_websocket_frames_are_limited_per_user_and_document(rate_limiter):
+    rate_limiter.groq_calls = SlidingWindowLimiter(limit=2, interval=60)
+
+    assert await rate_limiter.check_websocket_message("doc_1", "alice", "suggestion") is None
+    assert await rate_limiter.check_websocket_message("doc_1", "alice", "suggestion") is None
+    frame = await rate_limiter.check_websocket_message("doc_1", "alice", "suggestion")
+
+    assert frame["type"] == "error"
+    assert frame["status"] == 429
+    assert frame["message_type"] == "suggestion"
+    assert await rate_limiter.check_websocket_message("doc_1", "bob", "suggestion") is None
+    assert await rate_limiter.check_websocket_message("doc_2", "alice", "suggestion") is None
+
+
+@pytest.mark.asyncio
+async def test_cursor_frames_use_their_own_budget(rate_limiter):
+    rate_limiter.websocket_calls = SlidingWindowLimiter(limit=1, interval=60)
+
+    for _ in range(50):
+        assert await rate_limiter.check_websocket_message("doc_1", "alice", "cursor_move") is None
+    assert await rate_limiter.check_websocket_message("doc_1", "alice", "voice_command") is None
+    assert await rate_limiter.check_websocket_message("doc_1", "alice", "voice_command") is not None
+
+
+def test_sqlite_store_matches_memory_store(tmp_path):
+    store = SQLiteRateLimitStore(str(tmp_path / "limits.db"))
+    shared = SlidingWindowLimiter(limit=4, interval=60, store=store, bucket="api")
+    local = SlidingWindowLimiter(limit=4, interval=60)
+
+    for now in [50.0, 51.0, 52.0, 53.0, 54.0, 75.0, 75.0, 105.0, 105.0, 105.0, 300.0]:
+        assert shared.hit("client", now) == local.hit("client", now)
+    store.close()
+
+
+def test_sqlite_store_enforces_limit_across_processes(tmp_path):
+    path = str(tmp_path / "limits.db")
+    SQLiteRateLimitStore(path).close()
+    context = multiprocessing.get_context("spawn")
+    allowed = context.Value("i", 0)
+    workers = [
+        context.Process(target=_hammer_shared_store, args=(path, 40, allowed))
+        for _ in range(4)
+    ]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(30)
+
+    assert allowed.value == 50
+
+
+@pytest.mark.asyncio
+async def test_sqlite_store_waits_for_the_lock_off_the_event_loop(tmp_path):
+    path = str(tmp_path / "limits.db")
+    store = SQLiteRateLimitStore(path)
+    limiter = SlidingWindowLimiter(limit=4, interval=60, store=store, bucket="api")
+    # Another worker holds the write lock
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    check = asyncio.create_task(limiter.hit_async("client", now=50.0))
+    await asyncio.sleep(0.1)  # the loop keeps running meanwhile
+    assert not check.done()
+
+    other.execute("COMMIT")
+    assert await asyncio.wait_for(check, 5)
+    other.close()
+    store.close()
+
+
+def test_create_rate_limit_store_rejects_unknown_kind():
+    with pytest.raises(ValueError):
+        create_rate_limit_store("redis")
@@ -0,0 +1,79 @@
+"""Tests for the redline diff engine"""
+import pytest
+from app.services.redline_diff import (
+    diff_text, changed_spans, apply_changed_spans, render_redline, cache_stats,
+    EQUAL, INSERT, DELETE
+)
+
+
+def rebuild(spans):
+    original = "".join(text for op, text in spans if op != INSERT)
+    new = "".join(text for op, text in spans if op != DELETE)
+    return original, new
+
+
+@pytest.mark.parametrize("original,new", [
+    ("The party shall pay.", "The party must pay."),
+    ("", "Inserted clause."),
+    ("Removed clause.", ""),
+    ("same", "same"),
+    ("Pay within 30 days of notice.", "Pay within 45 days of written notice."),
+    ("colour and flavour", "color and flavor"),
+    ("a b c", "c b a"),
+])
+def test_spans_rebuild_both_texts(original, new):
+    assert rebuild(diff_text(original, new)) == (original, new)
+
+
+def test_changes_are_minimal_words():
+    spans = diff_text("The party shall pay the fee.", "The party must pay the fee.")
+    assert [s for s in spans if s[0] != EQUAL] == [(DELETE, "shall"), (INSERT, "must")]
+
+
+def test_similar_words_are_diffed_by_character():
+    spans = diff_text("The colour red.", "The color red.")
+    assert [s for s in spans if s[0] != EQUAL] == [(DELETE, "u")]
+
+
+def test_prefix_trimming_does_not_split_words():
+    # "pa" is shared but too little of the word to mark it up by character
+    assert diff_text("to pay now", "to paid now") == (
+        (EQUAL, "to "), (DELETE, "pay"), (INSERT, "paid"), (EQUAL, " now")
+    )
+    assert diff_text("a payment", "a refund") == (
+        (EQUAL, "a "), (DELETE, "payment"), (INSERT, "refund")
+    )
+
+
+def test_changed_spans_offsets_point_into_original():
+    original = "Pay within 30 days."
+    changes = changed_spans(diff_text(original, "Pay within 45 days."))
+    assert changes == [
+        {"op": DELETE, "offset": 11, "length": 2},
+        {"op": INSERT, "offset": 13, "text": "45"},
+    ]
+    assert original[11:13] == "30"
+    assert apply_changed_spans(original, changes) == "Pay within 45 days."
+
+
+def test_changed_spans_rebuild_the_new_text():
+    original = "The Supplier shall deliver the goods within 30 days."
+    for new in ("The Vendor must deliver all goods within 45 business days.",
+                "", "Deliver.", original + " Time is of the essence."):
+        assert apply_changed_spans(original, changed_spans(diff_text(original, new))) == new
+
+
+def test_render_escapes_and_marks_changes():
+    html = render_redline(diff_text("a < b", "a > b"))
+    assert html == "a <strike>&lt;</strike><highlight>&gt;</highlight> b"
+
+
+def test_diffs_are_cached_per_pair():
+    before = cache_stats()["hits"]
+    diff_text("cache me once", "cache me twice")
+    diff_text("cache me once", "cache me twice")
+    assert cache_stats()["hits"] == before + 1
+
+    before = cache_stats()
+    diff_text("streamed", "partial text", cache=False)
+    assert cache_stats() == before
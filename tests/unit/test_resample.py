@@ -0,0 +1,59 @@
+"""Tests for resampling, down-mixing and quantization"""
+import numpy as np
+import pytest
+from app.utils.resample import Resampler, downmix, normalization_gain, quantize_int16
+
+
+def resample(resampler: Resampler, signal: np.ndarray, chunk: int) -> np.ndarray:
+    out = np.empty(resampler.capacity(len(signal)) + resampler.capacity(0), dtype=np.float32)
+    written = 0
+    for start in range(0, len(signal), chunk):
+        written += resampler.process(signal[start:start + chunk], out[written:])
+    written += resampler.flush(out[written:])
+    return out[:written]
+
+
+def tone(frequency: float, rate: int, seconds: float = 1.0) -> np.ndarray:
+    return np.sin(2 * np.pi * frequency * np.arange(int(rate * seconds)) / rate).astype(np.float32)
+
+
+@pytest.mark.parametrize("from_rate", [44100, 48000, 22050, 8000])
+def test_tone_survives_resampling_to_16k(from_rate):
+    result = resample(Resampler(from_rate, 16000), tone(1000, from_rate), chunk=1234)
+    assert len(result) == 16000
+    # Away from the edges, where the filter sees padding
+    assert np.abs(result - tone(1000, 16000))[100:-100].max() < 2e-3
+
+
+def test_frequencies_above_the_new_nyquist_are_removed():
+    result = resample(Resampler(44100, 16000), tone(12000, 44100), chunk=4410)
+    assert np.sqrt(np.mean(result[100:-100] ** 2)) < 1e-3
+
+
+def test_chunk_size_does_not_change_the_result():
+    signal = np.random.default_rng(0).normal(0, 0.3, 48000).astype(np.float32)
+    whole = resample(Resampler(48000, 16000, max_chunk=1000), signal, chunk=48000)
+    streamed = resample(Resampler(48000, 16000, max_chunk=1000), signal, chunk=333)
+    np.testing.assert_allclose(whole, streamed, atol=1e-6)
+
+
+def test_downmix_averages_channels_into_preallocated_buffer():
+    stereo = np.array([[32767, -32767], [16384, 16384]], dtype=np.int16)
+    out = np.empty(8, dtype=np.float32)
+    mono = downmix(stereo, 32768.0, out)
+    assert np.shares_memory(mono, out)
+    np.testing.assert_allclose(mono, [0.0, 0.5])
+
+
+def test_quantize_rounds_and_clips():
+    out = np.empty(4, dtype=np.int16)
+    samples = np.array([0.5, -1.5, 2.0, 1e-5], dtype=np.float32)
+    assert list(quantize_int16(samples, out)) == [16384, -32768, 32767, 0]
+
+
+def test_normalization_never_clips_or_over_amplifies():
+    quiet = tone(440, 16000) * 0.01
+    assert normalization_gain(quiet, "peak", 0.89, 10.0) == 10.0
+    spiky = np.concatenate([np.full(100, 0.001, dtype=np.float32), [0.9]])
+    assert normalization_gain(spiky, "rms", 0.1, 10.0) == pytest.approx(1 / 0.9, rel=1e-6)
+    assert normalization_gain(tone(440, 16000) * 0.5, "peak", 0.89, 10.0) == pytest.approx(1.78, rel=1e-3)
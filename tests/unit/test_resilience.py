@@ -0,0 +1,118 @@
+"""Tests for upstream retry, backoff and failover"""
+import asyncio
+import httpx
+import groq
+import pytest
+from app.services.resilience import (
+    CircuitBreaker, ResilientCaller, UpstreamUnavailableError,
+    classify_error, retry_after, RETRY, FAILOVER, FATAL
+)
+
+
+def status_error(status, headers=None):
+    request = httpx.Request("POST", "http://test/chat/completions")
+    response = httpx.Response(status, headers=headers or {}, request=request)
+    return groq.APIStatusError("failed", response=response, body=None)
+
+
+def test_classify_error():
+    assert classify_error(status_error(429)) == RETRY
+    assert classify_error(status_error(503)) == RETRY
+    assert classify_error(asyncio.TimeoutError()) == RETRY
+    assert classify_error(status_error(404)) == FAILOVER
+    assert classify_error(status_error(400)) == FATAL
+    assert classify_error(ValueError("bad parse")) == FATAL
+
+
+def test_retry_after_header():
+    assert retry_after(status_error(429, {"retry-after": "2"})) == 2.0
+    assert retry_after(status_error(429, {"retry-after": "soon"})) is None
+    assert retry_after(status_error(429)) is None
+
+
+def test_circuit_breaker_opens_and_probes(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("app.services.resilience.time.monotonic", lambda: now[0])
+    breaker = CircuitBreaker(threshold=2, cooldown=10)
+
+    breaker.record_failure()
+    assert breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == "open" and not breaker.allow()
+
+    now[0] += 10
+    assert breaker.allow()  # the single probe
+    assert not breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_retries_then_succeeds():
+    caller = ResilientCaller(models=["a"], attempts=3, base_delay=0, max_delay=0, deadline=5)
+    errors = [status_error(503), status_error(429)]
+
+    async def fn(model):
+        if errors:
+            raise errors.pop(0)
+        return model
+
+    assert await caller.call(fn) == "a"
+    assert caller.retries == 2
+
+
+@pytest.mark.asyncio
+async def test_fails_over_on_unknown_model():
+    caller = ResilientCaller(models=["a", "b"], attempts=3, base_delay=0, max_delay=0, deadline=5)
+    seen = []
+
+    async def fn(model):
+        seen.append(model)
+        if model == "a":
+            raise status_error(404)
+        return model
+
+    assert await caller.call(fn) == "b"
+    assert seen == ["a", "b"]
+    assert caller.failovers == 1
+
+
+@pytest.mark.asyncio
+async def test_fatal_errors_are_not_retried():
+    caller = ResilientCaller(models=["a", "b"], attempts=3, base_delay=0, deadline=5)
+    calls = 0
+
+    async def fn(model):
+        nonlocal calls
+        calls += 1
+        raise status_error(400)
+
+    with pytest.raises(groq.APIStatusError):
+        await caller.call(fn)
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_deadline_bounds_total_time():
+    caller = ResilientCaller(models=["a"], attempts=10, base_delay=0, deadline=0.1)
+
+    async def fn(model):
+        await asyncio.sleep(1)
+
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    with pytest.raises(asyncio.TimeoutError):
+        await caller.call(fn)
+    assert loop.time() - start < 0.5
+
+
+@pytest.mark.asyncio
+async def test_open_breaker_skips_model():
+    caller = ResilientCaller(models=["a"], attempts=1, deadline=5)
+    caller.breakers["a"].opened_at = float("inf")
+
+    async def fn(model):
+        return model
+
+    with pytest.raises(UpstreamUnavailableError):
+        await caller.call(fn)
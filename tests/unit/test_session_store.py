@@ -0,0 +1,98 @@
+"""Tests for the bounded per-document session store"""
+import json
+import pytest
+from app.services.session_store import SessionStore, ChangeRecord, DocumentSession
+
+
+def test_documents_do_not_share_paragraph_state():
+    store = SessionStore(max_bytes=10 ** 6, idle_ttl=60)
+    store.get("doc_a").remember_original("p1", "Alpha")
+    store.get("doc_b").remember_original("p1", "Beta")
+
+    assert store.get("doc_a").original("p1") == "Alpha"
+    assert store.get("doc_b").original("p1") == "Beta"
+
+
+def test_first_original_is_kept():
+    session = SessionStore(max_bytes=10 ** 6, idle_ttl=60).get("doc")
+    assert session.remember_original("p1", "first") == "first"
+    assert session.remember_original("p1", "second") == "first"
+
+
+def test_accounting_tracks_growth_and_discard():
+    store = SessionStore(max_bytes=10 ** 6, idle_ttl=60)
+    session = store.get("doc")
+    before = store.bytes_used
+    session.add_change(ChangeRecord("p1", "old " * 100, "new " * 100, "now"))
+    assert store.bytes_used > before + 800
+
+    store.discard("doc")
+    assert store.bytes_used == 0
+
+
+def test_least_recently_used_document_is_evicted_over_budget():
+    store = SessionStore(max_bytes=4000, idle_ttl=60)
+    store.get("old").remember_original("p1", "x" * 1000)
+    store.get("recent").remember_original("p1", "y" * 1000)
+    store.get("old")  # touch: "recent" is now the least recently used
+    store.get("new").remember_original("p1", "z" * 2000)
+
+    assert "recent" not in store.sessions
+    assert "old" in store.sessions and "new" in store.sessions
+    assert store.bytes_used <= store.max_bytes
+    assert store.evictions == 1
+
+
+def test_active_session_is_never_evicted():
+    store = SessionStore(max_bytes=1000, idle_ttl=60)
+    session = store.get("big")
+    session.remember_original("p1", "x" * 5000)
+    assert store.peek("big") is session
+
+
+def test_idle_sessions_expire(monkeypatch):
+    now = [0.0]
+    monkeypatch.setattr("app.services.session_store.time.monotonic", lambda: now[0])
+    store = SessionStore(max_bytes=10 ** 6, idle_ttl=60)
+    store.get("idle").remember_original("p1", "text")
+    now[0] = 61.0
+    store.get("other")
+
+    assert store.peek("idle") is None
+    assert len(store) == 1
+
+
+def test_snapshot_round_trip():
+    store = SessionStore(max_bytes=10 ** 6, idle_ttl=60)
+    session = store.get("doc")
+    session.remember_original("p1", "Original")
+    session.set_preview("p1", {"suggested": "Better", "partial": False})
+    session.set_highlight("p1", {"new": "<highlight>Better</highlight>"})
+    session.add_change(ChangeRecord("p1", "Original", "Better", "t0"))
+    session.set_cursor("alice", 4)
+    session.add_user("alice", {"cursor_position": 4})
+
+    snapshot = json.loads(json.dumps(store.snapshot("doc")))
+    other = SessionStore(max_bytes=10 ** 6, idle_ttl=60)
+    restored = other.restore(snapshot)
+
+    assert restored.snapshot() == snapshot
+    assert other.bytes_used == restored.size
+    assert isinstance(restored, DocumentSession)
+
+
+def test_records_use_slots():
+    assert not hasattr(ChangeRecord("p", "a", "b", "t"), "__dict__")
+    assert not hasattr(DocumentSession("doc"), "__dict__")
+
+
+def test_appendix_sections_render_only_new_changes():
+    store = SessionStore(max_bytes=10 ** 6, idle_ttl=60)
+    session = store.get("doc")
+    session.add_change(ChangeRecord("p1", "Old", "New", "t1"))
+    first = session.appendix_sections()[0]
+    session.add_change(ChangeRecord("p2", "Before", "After", "t2"))
+
+    sections = session.appendix_sections()
+    assert sections[0] is first
+    assert sections[1] == "\n## Paragraph p2\nOriginal: Before\nChanged to: After\nTimestamp: t2"
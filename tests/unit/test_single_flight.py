@@ -0,0 +1,73 @@
+import asyncio
+import pytest
+from app.services.single_flight import SingleFlight
+
+
+@pytest.fixture
+def flight():
+    return SingleFlight()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_identical_calls_share_one_upstream_call(flight):
+    calls = 0
+
+    async def upstream():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "result"
+
+    results = await asyncio.gather(*(flight.do("k", upstream) for _ in range(5)))
+
+    assert results == ["result"] * 5
+    assert calls == 1
+    assert (flight.started, flight.joined) == (1, 4)
+    assert flight.in_flight() == 0
+
+
+@pytest.mark.asyncio
+async def test_failure_reaches_every_waiter_and_releases_key(flight):
+    async def failing():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(
+        flight.do("k", failing), flight.do("k", failing), return_exceptions=True
+    )
+
+    assert all(isinstance(r, RuntimeError) for r in results)
+    assert await flight.do("k", lambda: asyncio.sleep(0, result="ok")) == "ok"
+
+
+@pytest.mark.asyncio
+async def test_one_waiter_cancelling_does_not_cancel_others(flight):
+    async def upstream():
+        await asyncio.sleep(0.05)
+        return "result"
+
+    leaving = asyncio.create_task(flight.do("k", upstream))
+    staying = asyncio.create_task(flight.do("k", upstream))
+    await asyncio.sleep(0.01)
+    leaving.cancel()
+
+    assert await staying == "result"
+    assert leaving.cancelled()
+
+
+@pytest.mark.asyncio
+async def test_call_is_cancelled_when_last_waiter_leaves(flight):
+    finished = False
+
+    async def upstream():
+        nonlocal finished
+        await asyncio.sleep(0.05)
+        finished = True
+
+    waiter = asyncio.create_task(flight.do("k", upstream))
+    await asyncio.sleep(0.01)
+    waiter.cancel()
+    await asyncio.sleep(0.08)
+
+    assert not finished
+    assert flight.in_flight() == 0
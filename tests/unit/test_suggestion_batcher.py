@@ -0,0 +1,103 @@
+import asyncio
+import json
+import pytest
+from app.services.suggestion_batcher import SuggestionBatcher, parse_batch_response
+
+
+def answer_all(prompt: str) -> str:
+    """Reply to a batch prompt with one suggestion per paragraph"""
+    items = json.loads(prompt[prompt.index("["):])
+    return json.dumps({item["id"]: [f"Better: {item['text']}"] for item in items})
+
+
+class FakeUpstream:
+    def __init__(self, reply=answer_all):
+        self.reply = reply
+        self.prompts = []
+        self.fallback_texts = []
+
+    async def complete(self, prompt: str):
+        self.prompts.append(prompt)
+        return self.reply(prompt), "model"
+
+    async def fallback(self, text: str):
+        self.fallback_texts.append(text)
+        return [{"text": f"Single: {text}", "confidence": 0.9}]
+
+
+def make_batcher(upstream, **kwargs):
+    options = {"max_batch_size": 10, "max_wait_ms": 10, "max_chars": 10000}
+    options.update(kwargs)
+    return SuggestionBatcher(upstream.complete, upstream.fallback, **options)
+
+
+@pytest.mark.asyncio
+async def test_paragraphs_share_one_call_and_are_split_back():
+    upstream = FakeUpstream()
+    batcher = make_batcher(upstream)
+
+    results = await asyncio.gather(*(batcher.submit(f"p{i}", f"Clause {i}") for i in range(5)))
+
+    assert len(upstream.prompts) == 1
+    assert [r[0]["text"] for r in results] == [f"Better: Clause {i}" for i in range(5)]
+
+
+@pytest.mark.asyncio
+async def test_batches_respect_size_and_prompt_budget():
+    upstream = FakeUpstream()
+    batcher = make_batcher(upstream, max_batch_size=3)
+    await asyncio.gather(*(batcher.submit(f"p{i}", "x" * 10) for i in range(7)))
+    # 3 + 3 batched, the lone seventh paragraph goes straight to a single call
+    assert len(upstream.prompts) == 2
+    assert len(upstream.fallback_texts) == 1
+
+    upstream = FakeUpstream()
+    batcher = make_batcher(upstream, max_chars=25)
+    await asyncio.gather(*(batcher.submit(f"p{i}", "x" * 10) for i in range(4)))
+    assert len(upstream.prompts) == 2
+
+
+@pytest.mark.asyncio
+async def test_unparseable_response_falls_back_per_paragraph():
+    upstream = FakeUpstream(reply=lambda prompt: "Sorry, I can't help with that.")
+    batcher = make_batcher(upstream)
+
+    results = await asyncio.gather(batcher.submit("p1", "One"), batcher.submit("p2", "Two"))
+
+    assert upstream.fallback_texts == ["One", "Two"]
+    assert [r[0]["text"] for r in results] == ["Single: One", "Single: Two"]
+
+
+@pytest.mark.asyncio
+async def test_only_missing_paragraphs_fall_back():
+    upstream = FakeUpstream(reply=lambda prompt: '{"p1": ["Better one"]}')
+    batcher = make_batcher(upstream)
+
+    first, second = await asyncio.gather(batcher.submit("p1", "One"), batcher.submit("p2", "Two"))
+
+    assert first[0]["text"] == "Better one"
+    assert second[0]["text"] == "Single: Two"
+    assert batcher.fallbacks == 1
+
+
+def test_parse_batch_response_ignores_malformed_entries():
+    content = 'Here you go: {"p1": ["a", "b"], "p2": 7, "p3": "c"}'
+
+    assert parse_batch_response(content) == {
+        "p1": [{"text": "a", "confidence": 0.9}, {"text": "b", "confidence": 0.9}],
+        "p3": [{"text": "c", "confidence": 0.9}],
+    }
+
+
+@pytest.mark.asyncio
+async def test_crashed_batch_fails_its_paragraphs():
+    def broken_hook(text, suggestions, model):
+        raise RuntimeError("cache unavailable")
+
+    batcher = make_batcher(FakeUpstream(), on_batched=broken_hook)
+    results = await asyncio.wait_for(asyncio.gather(
+        *(batcher.submit(f"p{i}", f"Clause {i}") for i in range(3)), return_exceptions=True
+    ), 1)
+
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert not batcher._batches
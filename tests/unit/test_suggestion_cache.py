@@ -0,0 +1,50 @@
+import pytest
+from unittest.mock import patch
+from app.services.suggestion_cache import SuggestionCache, suggestion_cache_key
+
+SUGGESTIONS = [{"text": "The Buyer shall pay within 30 days.", "confidence": 0.9}]
+
+
+def test_key_ignores_whitespace_but_not_parameters():
+    key = suggestion_cache_key("The  party\nshall pay. ", "mixtral", 0.7, "1")
+
+    assert key == suggestion_cache_key("The party shall pay.", "mixtral", 0.7, "1")
+    assert key != suggestion_cache_key("The party shall pay.", "llama", 0.7, "1")
+    assert key != suggestion_cache_key("The party shall pay.", "mixtral", 0.2, "1")
+    assert key != suggestion_cache_key("The party shall pay.", "mixtral", 0.7, "2")
+
+
+def test_hits_misses_and_lru_eviction():
+    cache = SuggestionCache(max_entries=2, ttl=60, path="")
+    cache.set("a", SUGGESTIONS)
+    cache.set("b", SUGGESTIONS)
+    assert cache.get("a") == SUGGESTIONS
+
+    cache.set("c", SUGGESTIONS)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == SUGGESTIONS
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["evictions"]) == (2, 1, 1)
+
+
+def test_entries_expire_after_ttl():
+    cache = SuggestionCache(max_entries=10, ttl=60, path="")
+    with patch("app.services.suggestion_cache.time.time", return_value=1000.0):
+        cache.set("a", SUGGESTIONS)
+    with patch("app.services.suggestion_cache.time.time", return_value=1061.0):
+        assert cache.get("a") is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_disk_tier_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.db")
+    cache = SuggestionCache(max_entries=10, ttl=60, path=path)
+    cache.set("a", SUGGESTIONS)
+    cache.close()
+
+    restarted = SuggestionCache(max_entries=10, ttl=60, path=path)
+
+    assert restarted.get("a") == SUGGESTIONS
+    assert restarted.stats()["disk_hits"] == 1
+    restarted.close()
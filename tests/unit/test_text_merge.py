@@ -0,0 +1,51 @@
+"""Tests for merging concurrent paragraph edits"""
+import pytest
+from app.services.text_merge import (
+    MergeConflict, apply_op, decode_op, encode_op, merge_edit, op_from_texts,
+    revision_ops, transform
+)
+
+
+def test_op_from_texts_is_minimal():
+    op = op_from_texts("The quick fox.", "The slow fox.")
+    assert op == (4, 5, "slow")
+    assert apply_op("The quick fox.", op) == "The slow fox."
+    assert decode_op(encode_op(op)) == op
+
+
+def test_edits_to_different_parts_both_survive():
+    base = "Alpha beta. Gamma delta."
+    theirs = op_from_texts(base, "Alpha BETA. Gamma delta.")
+    mine = op_from_texts(base, "Alpha beta. Gamma delta, epsilon.")
+    current = apply_op(base, theirs)
+    merged = merge_edit(base, mine, [theirs])
+    assert apply_op(current, merged) == "Alpha BETA. Gamma delta, epsilon."
+
+    # And the other way round: an edit after a growing insert is shifted
+    current = apply_op(base, mine)
+    merged = merge_edit(base, theirs, [mine])
+    assert apply_op(current, merged) == "Alpha BETA. Gamma delta, epsilon."
+
+
+def test_overlapping_edits_conflict():
+    base = "Pay within 30 days."
+    with pytest.raises(MergeConflict):
+        transform(op_from_texts(base, "Pay within 45 days."),
+                  op_from_texts(base, "Pay within 60 days."))
+
+
+def test_identical_concurrent_edits_apply_once():
+    base = "Net 30."
+    op = op_from_texts(base, "Net 45.")
+    assert merge_edit(base, op, [op]) is None
+
+
+def test_revision_ops_track_length():
+    # "abc" -> "abXc" -> "Xc": deltas are (prefix, suffix, inserted)
+    ops = revision_ops(3, [(2, 1, "X"), (0, 2, "")])
+    assert ops == [(2, 0, "X"), (0, 2, "")]
+
+
+def test_invalid_op_is_rejected():
+    with pytest.raises(ValueError):
+        merge_edit("short", (3, 10, ""), [])
@@ -0,0 +1,112 @@
+"""Tests for the transcription service and voice command path"""
+import asyncio
+import threading
+import time
+from unittest.mock import patch
+import numpy as np
+import pytest
+from app.services.transcription import (
+    LocalBackend, TranscriptionError, TranscriptionService, _float_samples
+)
+from app.utils.audio import wav_header
+
+PCM16 = {"sample_rate": 16000, "channels": 1, "bit_depth": 16, "encoding": "pcm"}
+
+
+class SlowBackend:
+    """Blocking backend that records the thread it ran on"""
+    name = "fake"
+    blocking = True
+
+    def __init__(self, delay: float = 0.05, text: str = "accept all, move to final"):
+        self.delay = delay
+        self.text = text
+        self.threads = []
+
+    def transcribe(self, pcm, audio_format, prompt=None):
+        self.threads.append(threading.current_thread())
+        time.sleep(self.delay)
+        return self.text
+
+
+class FailingRemote:
+    name = "remote"
+    blocking = False
+
+    async def transcribe(self, pcm, audio_format, prompt=None):
+        raise RuntimeError("upstream unavailable")
+
+
+@pytest.mark.asyncio
+async def test_blocking_backend_runs_off_the_event_loop():
+    backend = SlowBackend()
+    service = TranscriptionService(backend, workers=2)
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            ticks += 1
+            await asyncio.sleep(0.005)
+
+    task = asyncio.create_task(ticker())
+    transcripts = await asyncio.gather(*(service.transcribe(bytes(32000)) for _ in range(2)))
+    task.cancel()
+
+    assert threading.main_thread() not in backend.threads
+    assert ticks >= 5  # the loop kept running while both utterances decoded
+    assert transcripts[0].audio_seconds == 1.0
+    assert transcripts[0].decode >= 0.05
+    stats = service.stats()
+    assert stats["utterances"] == 2 and stats["latency_ms"]["p50"] >= 50
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_backlog_is_refused_and_errors_are_counted():
+    service = TranscriptionService(SlowBackend(delay=0.1), workers=1, max_pending=1)
+    first = asyncio.create_task(service.transcribe(bytes(3200)))
+    await asyncio.sleep(0)
+    with pytest.raises(TranscriptionError):
+        await service.transcribe(bytes(3200))
+    await first
+    assert service.stats()["rejected"] == 1
+    service.close()
+
+    service = TranscriptionService(FailingRemote())
+    with pytest.raises(TranscriptionError):
+        await service.transcribe(bytes(3200))
+    assert service.stats()["errors"] == 1
+    service.close()
+
+
+@pytest.mark.asyncio
+async def test_local_backend_without_faster_whisper_reports_an_error():
+    if LocalBackend.available():
+        pytest.skip("faster-whisper is installed")
+    service = TranscriptionService(LocalBackend(), workers=1)
+    with pytest.raises(TranscriptionError, match="faster-whisper"):
+        await service.transcribe(bytes(3200))
+    service.close()
+
+
+def test_samples_are_converted_for_the_model():
+    stereo = np.full((44100, 2), 16384, dtype="<i2")
+    samples = _float_samples(stereo.tobytes(), {**PCM16, "sample_rate": 44100, "channels": 2})
+    assert samples.dtype == np.float32 and len(samples) == 16000
+    assert samples[8000] == pytest.approx(0.5, abs=1e-3)
+
+
+@pytest.mark.asyncio
+async def test_voice_command_is_transcribed_and_run():
+    with patch("app.services.command_handler.MessageLoader"):
+        from app.services.command_handler import CommandHandler
+        handler = CommandHandler(TranscriptionService(SlowBackend(delay=0)))
+    pcm = bytes(16000)
+    result = await handler.handle_voice_command(wav_header(PCM16, len(pcm)) + pcm)
+
+    assert "message" in result
+    assert result["transcript"]["text"] == "accept all, move to final"
+    assert result["transcript"]["audio_seconds"] == 0.5
+    assert "redlining" in handler.command_prompt
+    handler.transcriber.close()